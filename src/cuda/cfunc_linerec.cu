@@ -15,7 +15,7 @@ void cfunc_linerec::free() {
   }
 }
 
-void cfunc_linerec::backprojection(size_t f_, size_t g_, size_t theta_, float phi, int sz, size_t stream_) {
+void cfunc_linerec::backprojection(size_t f_, size_t g_, size_t theta_, float phi, int sz, int x0, int y0, int nx, int ny, size_t stream_) {
     real* g = (real *)g_;    
     real* f = (real *)f_;
     float* theta = (float *)theta_;
@@ -23,8 +23,8 @@ void cfunc_linerec::backprojection(size_t f_, size_t g_, size_t theta_, float ph
     // set thread block, grid sizes will be computed before cuda kernel execution
     dim3 dimBlock(32,32,1);    
     dim3 GS3d0;  
-    GS3d0 = dim3(ceil(n / 32.0), ceil(n / 32.0), ncz);
-    backprojection_ker <<<GS3d0, dimBlock, 0, stream>>> (f, g, theta, phi, 4.0f/nproj, sz, ncz, n, nz, ncproj);
+    GS3d0 = dim3(ceil(nx / 32.0), ceil(ny / 32.0), ncz);
+    backprojection_ker <<<GS3d0, dimBlock, 0, stream>>> (f, g, theta, phi, 4.0f/nproj, sz, x0, y0, nx, ny, ncz, n, nz, ncproj);
 }                                            
 
 void cfunc_linerec::backprojection_try(size_t f_, size_t g_, size_t theta_, size_t sh_, float phi, int sz,  size_t stream_) {
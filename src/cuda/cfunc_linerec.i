@@ -19,7 +19,7 @@ public:
   %mutable;
   cfunc_linerec(size_t nproj, size_t nz, size_t n, size_t ncproj, size_t ncz);
   ~cfunc_linerec();
-  void backprojection(size_t f_, size_t g_, size_t theta, float phi, int sz, size_t stream_);  
+  void backprojection(size_t f_, size_t g_, size_t theta, float phi, int sz, int x0, int y0, int nx, int ny, size_t stream_);  
   void backprojection_try(size_t f_, size_t g_, size_t theta_,size_t sh_,  float phi, int sz, size_t stream_);
   void backprojection_try_lamino(size_t f_, size_t g_, size_t theta_, size_t phi_, int sz,  size_t stream_);
 };
@@ -1,12 +1,15 @@
 #include "defs.cuh"
 
-void __global__ backprojection_ker(real *f, real *data, float *theta, float phi, float c, int sz, int ncz, int n, int nz, int nproj)
+void __global__ backprojection_ker(real *f, real *data, float *theta, float phi, float c, int sz, int x0, int y0, int nx, int ny, int ncz, int n, int nz, int nproj)
 {
-    int tx = blockDim.x * blockIdx.x + threadIdx.x;
-    int ty = blockDim.y * blockIdx.y + threadIdx.y;
+    // only the region [y0,y0+ny)x[x0,x0+nx) of slices is computed, f has size [ncz,ny,nx]
+    int ix = blockDim.x * blockIdx.x + threadIdx.x;
+    int iy = blockDim.y * blockIdx.y + threadIdx.y;
     int tz = blockDim.z * blockIdx.z + threadIdx.z;
-    if (tx >= n || ty >= n || tz >= ncz)
+    if (ix >= nx || iy >= ny || tz >= ncz)
         return;
+    int tx = ix + x0;
+    int ty = n - 1 - (iy + y0);
     float u = 0;
     float v = 0;
     int ur = 0;
@@ -42,7 +45,7 @@ void __global__ backprojection_ker(real *f, real *data, float *theta, float phi,
                     data[ur+1+t*n+(vr+1)*n*nproj]*static_cast<real>((0+u)*(0+v));
         }
     }
-    f[tx + (n-ty-1) * n + tz * n * n] += static_cast<real>((float)f0*c);        
+    f[ix + iy * nx + tz * nx * ny] += static_cast<real>((float)f0*c);        
 }    
 
 void __global__ backprojection_try_ker(real *f, real *data, float *theta, float phi, float c, int sz, float* sh, int ncz, int n, int nz, int nproj)
@@ -50,12 +50,23 @@ except PackageNotFoundError:
 
 from tomocupy.config import *
 from tomocupy.logging import *
-from tomocupy.rec import *
-from tomocupy.rec_steps import *
-from tomocupy.find_center import *
 from tomocupy.utils import *
-from tomocupy.reconstruction import *
-from tomocupy.processing import *
-from tomocupy.dataio import *
 from tomocupy.global_vars import *
-from tomocupy.ai import *
+
+# modules using cupy, compiled extensions and I/O libraries are imported at
+# first access of their names, e.g. tomocupy.GPURec, to keep the CLI startup fast
+_lazy_modules = ['rec', 'rec_steps', 'rec_preview', 'find_center']
+
+
+def __getattr__(name):
+    import importlib.util
+    if name.startswith('_'):
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    if importlib.util.find_spec(f'{__name__}.{name}') is not None:
+        return importlib.import_module(f'{__name__}.{name}')
+    for module in _lazy_modules:
+        module = importlib.import_module(f'{__name__}.{module}')
+        if name in module.__all__:
+            globals()[name] = getattr(module, name)
+            return globals()[name]
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
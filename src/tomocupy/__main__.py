@@ -47,13 +47,11 @@ from datetime import datetime
 
 from tomocupy import logging
 from tomocupy import config
-from tomocupy import GPURec
-from tomocupy import FindCenter
-from tomocupy import GPURecSteps
+from tomocupy import utils
 from tomocupy.global_vars import args, params
 
-from tomocupy.dataio import reader
-from tomocupy.dataio import writer
+# modules using cupy, compiled extensions and I/O libraries are imported
+# only by the compute subcommands to keep the CLI startup fast
 
 __author__ = "Viktor Nikitin"
 __copyright__ = "Copyright (c) 2022, UChicago Argonne, LLC."
@@ -73,7 +71,16 @@ def run_status(args):
     config.log_values(args)
 
 
+def _reader():
+    from tomocupy.dataio import reader
+    if getattr(args, 'stream_mode', 'none') != 'none':
+        from tomocupy.dataio import stream_reader
+        return stream_reader.StreamReader()
+    return reader.Reader()
+
+
 def _find_center(cl_reader):
+    from tomocupy.find_center import FindCenter
     clrotthandle = FindCenter(cl_reader)
     args.rotation_axis = clrotthandle.find_center()
     params.center = args.rotation_axis
@@ -87,6 +94,7 @@ def _find_center(cl_reader):
 
 
 def _find_center_ai(cl_reader, img_cache, center_of_rotation_cache):
+    from tomocupy.find_center import FindCenter
     clrotthandle = FindCenter(cl_reader)
     args.rotation_axis = clrotthandle.find_center_ai(args, img_cache, center_of_rotation_cache, params.fnameout[:-6])
     params.center = args.rotation_axis
@@ -98,6 +106,7 @@ def _find_center_ai(cl_reader, img_cache, center_of_rotation_cache):
                                 * 2**args.binning + params.st_n)
 
 def _find_center_range_ai(cl_reader, img_cache, center_of_rotation_cache):
+    from tomocupy.find_center import FindCenter
     clrotthandle = FindCenter(cl_reader)
     center_lb, center_ub = clrotthandle.find_center_range_ai(args, img_cache, center_of_rotation_cache, params.fnameout[:-6])
     log.warning(f'center range refined to ({center_lb},{center_ub})')
@@ -132,6 +141,7 @@ def run_rec_presteps(args, cl_reader, cl_writer, save_test_results_ok = False):
         log.error(f"Error: reconstruction type is not 'try'. Detected {args.reconstruction_type} instead.")
         exit()
     cache_to_infer = args.reconstruction_type == 'try' and use_ai
+    from tomocupy.rec import GPURec
     clpthandle = GPURec(cl_reader, cl_writer, cache_to_infer=cache_to_infer)
 
     img_cache, center_of_rotation_cache, _ = clpthandle.recon_try()
@@ -149,13 +159,15 @@ def run_rec_presteps(args, cl_reader, cl_writer, save_test_results_ok = False):
     
     return results
 
-def run_rec(args, cl_reader, cl_writer, save_test_results_ok = False):
-    if not Path(args.file_name).is_file():
+def run_rec(args, cl_reader, cl_writer, save_test_results_ok = False, cache=None):
+    if args.stream_mode == 'none' and not Path(args.file_name).is_file():
         log.error("File Name does not exist: %s" % args.file_name)
         exit()
 
     t = time.time()
-    args.retrieve_phase_method = 'none'
+    if args.reconstruction_type != 'full':
+        # phase retrieval needs neighbouring rows, available only for full reconstruction
+        args.retrieve_phase_method = 'none'
     args.rotate_proj_angle = 0
     args.lamino_angle = 0
 
@@ -163,8 +175,15 @@ def run_rec(args, cl_reader, cl_writer, save_test_results_ok = False):
     if args.rotation_axis_auto == 'auto' and not use_ai:
         _find_center(cl_reader)
 
+    if args.reconstruction_type == 'preview':
+        from tomocupy.rec_preview import GPURecPreview
+        GPURecPreview(cl_reader, cl_writer).recon_preview()
+        log.warning(f'Reconstruction time {time.time()-t:.1e}s')
+        return {}
+
     cache_to_infer = args.reconstruction_type == 'try' and use_ai
-    clpthandle = GPURec(cl_reader, cl_writer, cache_to_infer=cache_to_infer)
+    from tomocupy.rec import GPURec
+    clpthandle = GPURec(cl_reader, cl_writer, cache_to_infer=cache_to_infer, cache=cache)
 
     if args.reconstruction_type == 'full':
         clpthandle.recon_all()
@@ -201,6 +220,7 @@ def run_recsteps_presteps(args, cl_reader, cl_writer, save_test_results_ok = Fal
         exit()
 
     cache_to_infer = use_ai
+    from tomocupy.rec_steps import GPURecSteps
     clpthandle = GPURecSteps(cl_reader, cl_writer, cache_to_infer=cache_to_infer)
 
     img_cache, center_of_rotation_cache, _ = clpthandle.recon_steps_all()
@@ -230,6 +250,7 @@ def run_recsteps(args, cl_reader, cl_writer, save_test_results_ok = False):
         _find_center(cl_reader)
 
     cache_to_infer = use_ai
+    from tomocupy.rec_steps import GPURecSteps
     clpthandle = GPURecSteps(cl_reader, cl_writer, cache_to_infer=cache_to_infer)
 
     if use_ai:
@@ -250,11 +271,24 @@ def run_recsteps(args, cl_reader, cl_writer, save_test_results_ok = False):
     return results
 
 
+def run_serve(args):
+    from tomocupy.serve import Server
+    from tomocupy.dataio import writer
+
+    def run_job(cache):
+        cl_reader = _reader()
+        cl_writer = writer.Writer()
+        return run_rec(args, cl_reader, cl_writer, save_test_results_ok=True, cache=cache)
+
+    Server(args.queue_dir, run_job, args.poll_interval).serve(args.max_jobs)
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--config', **config.SECTIONS['general']['config'])
     tomo_params = config.RECON_PARAMS
     tomo_steps_params = config.RECON_STEPS_PARAMS
+    serve_params = config.SERVE_PARAMS
     #
 
     cmd_parsers = [
@@ -266,6 +300,8 @@ def main():
          "Run tomographic reconstruction by splitting by chunks in z and angles (step-wise)"),
         ('status',      run_status,      tomo_steps_params,
          "Show the tomographic reconstruction status"),
+        ('serve',       run_serve,       serve_params,
+         "Run recon jobs from a queue directory keeping GPU objects between datasets"),
     ]
 
     subparsers = parser.add_subparsers(title="Commands", metavar='')
@@ -287,9 +323,6 @@ def main():
     except AttributeError:
         parser.print_help(sys.stderr)
         sys.exit(1)
-    # test cupy
-    import cupy as cp
-    c = cp.ones(1)
     # make sure logs directory exists
     if not os.path.exists(logs_home):
         os.makedirs(logs_home)
@@ -302,9 +335,20 @@ def main():
     log.info("Saving log at %s" % lfname)
 
     try:
-        if args._func == init:
+        if args._func in (init, run_status):
             args._func(args)
+        elif args._func == run_serve:
+            import cupy as cp
+            c = cp.ones(1)
+            utils.copy_pool.resize(args.max_copy_threads)
+            run_serve(args)
         else:
+            # test cupy
+            import cupy as cp
+            c = cp.ones(1)
+            from tomocupy.dataio import reader
+            from tomocupy.dataio import writer
+            utils.copy_pool.resize(args.max_copy_threads)
             save_test_results_ok = args.save_test_results
             if save_test_results_ok:
                 results_all = {}
@@ -344,7 +388,7 @@ def main():
             
             args.symmetric_center_search = False
             
-            cl_reader = reader.Reader()
+            cl_reader = _reader()
             cl_writer = writer.Writer()
             # shift_array / save_centers are only populated by
             # Reader.init_sizes_try; in full mode they don't exist yet.
@@ -363,6 +407,9 @@ def main():
 
             else:
                 args._func(args, cl_reader, cl_writer)
+            log.debug(f'Host copies: {utils.copy_pool.stats()}')
+            log.info(f'Pinned host memory high-water mark: {utils.pinned_arena.high_water/2**30:.2f} GB')
+            log.debug(f'Pinned host memory: {utils.pinned_arena.stats()}')
     except RuntimeError as e:
         log.error(str(e))
         sys.exit(1)
@@ -1,12 +1,64 @@
 import time
 import torch
+import torch.nn.functional as F
 import numpy as np
 from pathlib import Path
-from PIL import Image
 
 from tomocupy.ai.model_archs import _make_dinov2_model
 
-def load_images(img_cache_original, downsample_factors, use_8bits, preprocessed=False):
+# loaded models are kept for next calls in the same process (e.g. tomocupy serve)
+_models = {}
+
+
+def _load_model(model_cls, model_path, device, int8=False, compile=False, **kwargs):
+    key = (model_cls.__name__, str(model_path), str(device), int8, compile, repr(sorted(kwargs.items())))
+    if key not in _models:
+        model_ = _make_dinov2_model()
+        model = model_cls(model_, embed_dim=model_.embed_dim, **kwargs)
+        states = torch.load(model_path, map_location='cpu')['state_dict']
+        states = {(k.replace("module.", "") if "module." in k else k): v for k, v in states.items()}
+        msg = model.load_state_dict(states,strict=False)
+        _models[key] = _prepare_model(model, device, int8, compile)
+    return _models[key]
+
+def _prepare_model(model, device, int8=False, compile=False):
+    """Fold the patch embedding for grayscale inputs, optionally quantize to int8 (CPU) and compile the backbone"""
+    # inputs are grayscale, the 3-channel patch embedding is folded to 1 channel
+    model.model.patch_embed.to_single_channel()
+    model.eval()
+    model.to(device)
+    if int8:
+        if torch.device(device).type != 'cpu':
+            print("Int8 quantization is supported for CPU inference only, using float32 model.")
+        else:
+            # dynamic quantization of Linear layers in transformer blocks (Attention, Mlp),
+            # weights are int8, activations are quantized on the fly
+            from torch.ao.quantization import quantize_dynamic
+            quantize_dynamic(model.model.blocks, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+            if hasattr(model, 'aggregator'):
+                quantize_dynamic(model.aggregator.global_blocks, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    if compile:
+        model.model = torch.compile(model.model)
+    return model
+
+def _inference_device(args):
+    """Device for the center search models, CPU keeps GPU memory for reconstruction kernels"""
+    if args.infer_threads > 0:
+        torch.set_num_threads(args.infer_threads)
+    if args.infer_device == 'auto':
+        return torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
+    return torch.device(args.infer_device)
+
+def load_images(img_cache_original, downsample_factors, use_8bits, preprocessed=False, device=None):
+    """Normalize, downsample and requantize the stack of try reconstructions.
+
+    All slices are processed at once on the inference device, the bilinear
+    antialiased resize matches PIL's Image.BILINEAR used for training.
+    """
+    if device is None:
+        device = torch.device('cuda') if torch.cuda.is_available() else 'cpu'
+    imgs = torch.as_tensor(np.asarray(img_cache_original),
+                           dtype=torch.float32, device=device)
     imgs_cache = []
     for downsample_factor in downsample_factors:
         if downsample_factor > 1:
@@ -15,29 +67,19 @@ def load_images(img_cache_original, downsample_factors, use_8bits, preprocessed=
             print(f"Downsample factor is {downsample_factor}. No resizing applied.")
         if use_8bits:
             print("Requantizing using 8 bits.")
-        img_cache = []
-        
-        for img_ in img_cache_original:
-            if not preprocessed:
-                if downsample_factor>1:
-                    
-                    img_ = Image.fromarray(img_,mode='F')
-                    img_array = np.array(img_.resize((img_.size[0]//downsample_factor,img_.size[1]//downsample_factor),Image.BILINEAR),dtype=np.float32)
-                else:
-                    
-                    img_array = img_.copy().astype(np.float32)
-            
-                img_array = ((img_array - img_array.min()) / (img_array.max() - img_array.min() + 1e-8))
-
-                if use_8bits:
-                    
-                    img_array = (img_array * 255).astype(np.uint8)
-                    img_array = img_array.astype(np.float32) / 255.
-            else:
-                img_array = img_.copy().astype(np.float32)
-            img_cache.append(img_array[None,...])
-        img_cache = np.concatenate(img_cache,axis=0)
-        imgs_cache.append(img_cache)
+
+        img_cache = imgs
+        if not preprocessed:
+            if downsample_factor > 1:
+                row, col = imgs.shape[1:]
+                img_cache = F.interpolate(imgs[:, None], size=(row//downsample_factor, col//downsample_factor),
+                                          mode='bilinear', align_corners=False, antialias=True)[:, 0]
+            mmin = img_cache.amin(dim=(1, 2), keepdim=True)
+            mmax = img_cache.amax(dim=(1, 2), keepdim=True)
+            img_cache = (img_cache - mmin) / (mmax - mmin + 1e-8)
+            if use_8bits:
+                img_cache = (img_cache * 255).to(torch.uint8).to(torch.float32) / 255.
+        imgs_cache.append(img_cache.cpu().numpy())
     return imgs_cache
 
 def sample_patch_corner(mask,window_size,num_windows):
@@ -90,16 +132,10 @@ def bin_inference_pipeline(args, img_cache_original, center_of_rotation_cache, o
     assert num_frames==2, f"Error: bin inference requires 2 frames. num_frames is currently set to {num_frames}."
 
     np.random.seed(seed_number)
-    device = torch.device('cuda') if torch.cuda.is_available() else 'cpu'
-    model_ = _make_dinov2_model()
+    device = _inference_device(args)
+    model = _load_model(RangeClassificationModel, model_path, device, int8=args.infer_int8, compile=args.infer_compile, num_windows=nums_windows, multi_instances=multi_instances, num_frames=num_frames, multi_frames=multi_frames, aggregator_depth=aggregator_depth, aggregator_num_heads=aggregator_num_heads)
 
-    model = RangeClassificationModel(model_,embed_dim=model_.embed_dim,num_windows=nums_windows,multi_instances=multi_instances,num_frames=num_frames,multi_frames=multi_frames,aggregator_depth=aggregator_depth,aggregator_num_heads=aggregator_num_heads)
-    states = torch.load(model_path, map_location='cpu')['state_dict']
-    states = {(k.replace("module.", "") if "module." in k else k): v for k, v in states.items()}
-    msg = model.load_state_dict(states,strict=False)
-    model.to(device)
-
-    imgs_cache = load_images(img_cache_original, downsample_factors, use_8bits, preprocessed=preprocessed)
+    imgs_cache = load_images(img_cache_original, downsample_factors, use_8bits, preprocessed=preprocessed, device=device)
 
     patches_corners = []
     for img_cache,num_windows,sz in zip(imgs_cache,nums_windows,szs):
@@ -109,36 +145,37 @@ def bin_inference_pipeline(args, img_cache_original, center_of_rotation_cache, o
         patch_corners = sample_patch_corner(mask,sz,num_windows)
         patches_corners.append(patch_corners)
         
-    features = []
+    # pairs of slices with centers differing by the bin size
+    cors = np.array(center_of_rotation_cache)
+    pairs = []
     for idx in range(imgs_cache[0].shape[0]):
-        samples = []
-        cor = center_of_rotation_cache[idx]
-        if (cor + bin_size) <= np.array(center_of_rotation_cache).max():
-            diff = abs(np.array(center_of_rotation_cache)-(cor+bin_size))
-            idx2 = diff.argmin()
-        else:
+        if (cors[idx] + bin_size) > cors.max():
             break
-        for img_cache,patch_corners,sz in zip(imgs_cache,patches_corners,szs):
-            img_array = img_cache[idx]
-            imgs = []
-            for patch_corner in patch_corners:
-                img = img_array[patch_corner[0]:patch_corner[0]+sz,patch_corner[1]:patch_corner[1]+sz]
-                img = torch.from_numpy(img).to(device=device,dtype=torch.float32).unsqueeze(0).unsqueeze(0).unsqueeze(0)
-                imgs.append(img)
-            sample = {'images':torch.cat(imgs,dim=1)}
-            
-            img_array = img_cache[idx2]
-            imgs = []
-            for patch_corner in patch_corners:
-                img = img_array[patch_corner[0]:patch_corner[0]+sz,patch_corner[1]:patch_corner[1]+sz]
-                img = torch.from_numpy(img).to(device=device,dtype=torch.float32).unsqueeze(0).unsqueeze(0).unsqueeze(0)
-                imgs.append(img)
-            sample = {'images':torch.cat((sample['images'].unsqueeze(2),torch.cat(imgs,dim=1).unsqueeze(2)),dim=2)}
-                
-            samples.append(sample)    
-            
+        pairs.append((idx, abs(cors-(cors[idx]+bin_size)).argmin()))
+
+    # backbone patch tokens of each slice are computed once and shared by all pairs containing the slice,
+    # only the aggregator and head run per pair. Second slices of pairs do not decrease with the first ones,
+    # so tokens of slices before the current first slice are released.
+    tokens_cache = {}
+
+    def slice_tokens(idx):
+        if idx not in tokens_cache:
+            tokens = []
+            for img_cache,patch_corners,sz in zip(imgs_cache,patches_corners,szs):
+                img_array = img_cache[idx]
+                imgs = np.stack([img_array[pc[0]:pc[0]+sz,pc[1]:pc[1]+sz] for pc in patch_corners])
+                imgs = torch.from_numpy(imgs).to(device=device,dtype=torch.float32)[None,:,None]
+                tokens.append(model.patch_tokens(imgs)[0])
+            tokens_cache[idx] = tokens
+        return tokens_cache[idx]
+
+    features = []
+    for idx, idx2 in pairs:
+        for k in [k for k in tokens_cache if k < idx]:
+            del tokens_cache[k]
+        tokens = [torch.stack((t, t2), dim=1)[None] for t, t2 in zip(slice_tokens(idx), slice_tokens(idx2))]
         with torch.no_grad():
-            feature = model(samples)
+            feature = model.forward_tokens(tokens)
         features.append(feature)
     
     features_all = torch.cat(features,dim=0).detach().cpu().numpy()
@@ -169,19 +206,14 @@ def inference_pipeline(args, img_cache_original, center_of_rotation_cache, out_d
         multi_instances = False
     
     np.random.seed(seed_number)
-    device = torch.device('cuda') if torch.cuda.is_available() else 'cpu'
+    device = _inference_device(args)
 
-    model_ = _make_dinov2_model()
-    model = ClassificationModel(model_,embed_dim=model_.embed_dim,num_windows=nums_windows,multi_instances=multi_instances)
-    states = torch.load(model_path, map_location='cpu')['state_dict']
-    states = {(k.replace("module.", "") if "module." in k else k): v for k, v in states.items()}
-    msg = model.load_state_dict(states,strict=False)
-    model.to(device)
+    model = _load_model(ClassificationModel, model_path, device, int8=args.infer_int8, compile=args.infer_compile, num_windows=nums_windows, multi_instances=multi_instances)
 
     # print('starting model inference...')
     # t_start3 = time.time()
 
-    imgs_cache = load_images(img_cache_original, downsample_factors, use_8bits, preprocessed=preprocessed)
+    imgs_cache = load_images(img_cache_original, downsample_factors, use_8bits, preprocessed=preprocessed, device=device)
 
     if multi_instances:
         patches_corners = []
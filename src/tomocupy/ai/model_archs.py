@@ -167,6 +167,12 @@ class LayerScale(nn.Module):
     def forward(self, x: Tensor) -> Tensor:
         return x.mul_(self.gamma) if self.inplace else x * self.gamma
 
+def _channels(model, x):
+    """Grayscale images [b,1,h,w] repeated to the number of input channels of the backbone patch embedding"""
+    in_chans = model.patch_embed.in_chans
+    return x if x.shape[1] == in_chans else x.repeat(1,in_chans//x.shape[1],1,1)
+
+
 class PatchEmbed(nn.Module):
     """
     2D image to patch embedding: (B,C,H,W) -> (B,N,D)
@@ -225,6 +231,19 @@ class PatchEmbed(nn.Module):
             x = x.reshape(-1, H, W, self.embed_dim)  # B H W C
         return x
 
+    @torch.no_grad()
+    def to_single_channel(self) -> None:
+        """Sum projection weights over input channels, equivalent to repeating a grayscale image to all channels"""
+        if self.in_chans == 1:
+            return
+        proj = nn.Conv2d(1, self.embed_dim, kernel_size=self.patch_size, stride=self.patch_size,
+                         bias=self.proj.bias is not None).to(self.proj.weight)
+        proj.weight.copy_(self.proj.weight.sum(dim=1, keepdim=True))
+        if self.proj.bias is not None:
+            proj.bias.copy_(self.proj.bias)
+        self.proj = proj
+        self.in_chans = 1
+
     def flops(self) -> float:
         Ho, Wo = self.patches_resolution
         flops = Ho * Wo * self.embed_dim * self.in_chans * (self.patch_size[0] * self.patch_size[1])
@@ -753,9 +772,9 @@ class ClassificationModel(nn.Module):
             with torch.no_grad():
                 if not self.multi_instances:
                     assert self.num_windows[0] == 1
-                    features_all = self.model(images[:,0].repeat(1,3,1,1))
+                    features_all = self.model(_channels(self.model,images[:,0]))
                 else:
-                    features_all = self.model(rearrange(images,'b k c h w -> (b k) c h w').repeat(1,3,1,1))
+                    features_all = self.model(_channels(self.model,rearrange(images,'b k c h w -> (b k) c h w')))
                     features_all = rearrange(features_all,'(b k) c -> b k c', k=self.num_windows[0])
         elif len(self.num_windows) > 1:
             assert self.multi_instances
@@ -763,7 +782,7 @@ class ClassificationModel(nn.Module):
             for idx_,sample_ in enumerate(sample):
                 images = sample_['images']
                 with torch.no_grad():
-                    features_ = self.model(rearrange(images,'b k c h w -> (b k) c h w').repeat(1,3,1,1))
+                    features_ = self.model(_channels(self.model,rearrange(images,'b k c h w -> (b k) c h w')))
                     features_ = rearrange(features_,'(b k) c -> b k c', k=self.num_windows[idx_])
                 features_all.append(features_)
             features_all = torch.cat(features_all,dim=1)
@@ -841,22 +860,22 @@ class RangeClassificationModel(nn.Module):
                     if not self.multi_frames:
                         assert self.num_frames == 1
                         print("warning: only one frame input to the model which has been optimized for two-frame inputs")
-                        features_ = self.model(rearrange(images,'b k c h w -> (b k) c h w').repeat(1,3,1,1))
+                        features_ = self.model(_channels(self.model,rearrange(images,'b k c h w -> (b k) c h w')))
                         features_ = rearrange(features_,'(b k) c -> b k c', k=self.num_windows[idx_])
                     else:
                         
-                        features_ = self.model(rearrange(images,'b r s c h w -> (b r s) c h w').repeat(1,3,1,1),is_training=True)['x_norm_patchtokens']
+                        features_ = self.model(_channels(self.model,rearrange(images,'b r s c h w -> (b r s) c h w')),is_training=True)['x_norm_patchtokens']
                         img_h, img_w = images.shape[-2:]
                         features_ = rearrange(features_,'(b r s) (h w) c -> b r s h w c',r=self.num_windows[idx_],s=self.num_frames,h=img_h//self.model.patch_size,w=img_w//self.model.patch_size)
             else:
                 if not self.multi_frames:
                     assert self.num_frames == 1
                     print("warning: only one frame input to the model which has been optimized for two-frame inputs")
-                    features_ = self.model(rearrange(images,'b k c h w -> (b k) c h w').repeat(1,3,1,1),is_training=True)["x_norm_clstoken"]
+                    features_ = self.model(_channels(self.model,rearrange(images,'b k c h w -> (b k) c h w')),is_training=True)["x_norm_clstoken"]
                     features_ = rearrange(features_,'(b k) c -> b k c', k=self.num_windows[idx_])
                 else:
                     
-                    features_ = self.model(rearrange(images,'b r s c h w -> (b r s) c h w').repeat(1,3,1,1),is_training=True)['x_norm_patchtokens']
+                    features_ = self.model(_channels(self.model,rearrange(images,'b r s c h w -> (b r s) c h w')),is_training=True)['x_norm_patchtokens']
                     img_h, img_w = images.shape[-2:]
                     features_ = rearrange(features_,'(b r s) (h w) c -> b r s h w c',r=self.num_windows[idx_],s=self.num_frames,h=img_h//self.model.patch_size,w=img_w//self.model.patch_size)
             
@@ -866,8 +885,30 @@ class RangeClassificationModel(nn.Module):
             
             features_all.append(features_)
 
+        return self.classify(features_all)
+
+    def patch_tokens(self, images):
+        """Backbone patch tokens [b,k,h,w,c] of single frames [b,k,c,h,w], computed once per slice in range inference"""
+        self.model.eval()
+        with torch.no_grad():
+            features_ = self.model(_channels(self.model,rearrange(images,'b k c h w -> (b k) c h w')),is_training=True)['x_norm_patchtokens']
+        img_h, img_w = images.shape[-2:]
+        return rearrange(features_,'(b k) (h w) c -> b k h w c',k=images.shape[1],h=img_h//self.model.patch_size,w=img_w//self.model.patch_size)
+
+    def forward_tokens(self, tokens):
+        """Logits from backbone patch tokens [b,r,s,h,w,c] of frames, one tensor per window size"""
+        assert self.multi_frames
+        features_all = []
+        for features_ in tokens:
+            features_,_ = self.aggregator(features_)
+            features_all.append(features_[:,:,0])
+        return self.classify(features_all)
+
+    def classify(self, features_all):
+        """Attention pooling over windows and the classification head"""
+        n_sample = len(features_all)
         features_all = torch.cat(features_all,dim=1)
-        if (self.multi_instances or len(sample)>1):
+        if (self.multi_instances or n_sample>1):
             attn = self.fc(self.attention(features_all) * self.gate(features_all)) #features_ is b*k*c
             attn = torch.transpose(attn, 2, 1)  #attn is b*ATTENTION_BRANCHES*K after transposition
             attn = F.softmax(attn, dim=2)  # softmax over K
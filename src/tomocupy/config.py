@@ -44,7 +44,6 @@ import configparser
 import logging
 import warnings
 import inspect
-import h5py
 import numpy as np
 
 from copy import copy
@@ -156,6 +155,11 @@ SECTIONS['file-reading'] = {
         'type': str,
         'help': "Input file type",
         'choices': ['standard', 'double_fov']},
+    'double-fov-method': {
+        'default': 'pad',
+        'type': str,
+        'help': "Reconstruction of double_fov scans: pad sinograms with zeros to double width and use all 360 deg angles, or stitch projections at theta and theta+180 deg to a 180 deg sinogram of double width",
+        'choices': ['pad', 'stitch']},
     'binning': {
         'type': utils.positive_int,
         'default': 0,
@@ -252,8 +256,8 @@ SECTIONS['retrieve-phase'] = {
         'help': "Characteristic transverse length for Generalized Paganin"},
     'retrieve-phase-pad': {
         'type': utils.positive_int,
-        'default': 1,
-        'help': "Padding with extra slices in z for phase-retrieval filtering"},
+        'default': 8,
+        'help': "Padding with extra slices in z for phase-retrieval filtering (z halo taken from neighbouring chunks in recon, at most nsino-per-chunk)"},
     'FFratio': {
         'default': 100,
         'type': float,
@@ -304,6 +308,10 @@ SECTIONS['lamino'] = {
         'default': -1,
         'type': int,
         'help': "End slice for lamino reconstruction"},
+    'lamino-scratch-dir': {
+        'default': 'none',
+        'type': str,
+        'help': "Directory on a fast local disk for out-of-core Fourier-based laminography: intermediate volumes are kept in memory-mapped scratch files instead of RAM, none - keep in RAM"},
 }
 
 SECTIONS['reconstruction-types'] = {
@@ -311,12 +319,20 @@ SECTIONS['reconstruction-types'] = {
         'default': 'try',
         'type': str,
         'help': "Reconstruct full data set. ",
-        'choices': ['full', 'try']},
+        'choices': ['full', 'try', 'preview']},
     'reconstruction-algorithm': {
         'default': 'fourierrec',
         'type': str,
         'help': "Reconstruction algorithm",
         'choices': ['fourierrec', 'lprec', 'linerec']},
+    'slices': {
+        'default': 'none',
+        'type': str,
+        'help': "Reconstruct only the given detector rows in full mode, as a list, e.g. [100,500,900], or as start:end:step, e.g. 0:2048:40"},
+    'rec-roi': {
+        'default': 'none',
+        'type': str,
+        'help': "Reconstruct only a region of slices in full mode, given as x0,x1,y0,y1 in pixels of the unbinned reconstruction grid, e.g. 512,1536,0,2048"},
 }
 
 SECTIONS['reconstruction-steps-types'] = {
@@ -390,6 +406,10 @@ SECTIONS['reconstruction'] = {
         'type': int,
         'default': 8,
         'help': "Number of sinograms per chunk. Use lower numbers with computers with lower GPU memory.", },
+    'preview-subsets': {
+        'type': int,
+        'default': 8,
+        'help': "Number of interleaved angular subsets for preview reconstruction, slices are updated after each subset"},
     'rotation-axis-auto': {
         'default': 'manual',
         'type': str,
@@ -445,6 +465,14 @@ SECTIONS['reconstruction'] = {
         'type': int,
         'default': 4,
         'help': "Max number of threads for reading by chunks"},
+    'read-workers': {
+        'type': int,
+        'default': 0,
+        'help': "Number of processes for reading and decompressing chunked or compressed HDF5 data (0: read in threads)"},
+    'max-copy-threads': {
+        'type': int,
+        'default': 16,
+        'help': "Max number of threads for host memory copies"},
     'minus-log': {
         'default': 'True',
         'help': "Take -log or not"},
@@ -658,6 +686,32 @@ SECTIONS['inference'] = {
         'help': 'When set save the per-slice model predictions',
         'action': 'store_true'
     },
+    'infer-save-try': {
+        'default': False,
+        'help': 'When set also write try reconstructions as tiff files during the AI center search (slices are otherwise kept in memory only)',
+        'action': 'store_true'
+    },
+    'infer-device': {
+        'default': 'auto',
+        'type': str,
+        'help': "Device for the AI center search models, cpu keeps GPU memory for reconstruction",
+        'choices': ['auto', 'cuda', 'cpu']
+    },
+    'infer-int8': {
+        'default': False,
+        'help': 'When set quantize Linear layers of transformer blocks to int8 for CPU inference',
+        'action': 'store_true'
+    },
+    'infer-compile': {
+        'default': False,
+        'help': 'When set compile the backbone with torch.compile',
+        'action': 'store_true'
+    },
+    'infer-threads': {
+        'default': 0,
+        'type': int,
+        'help': "Number of intra-op threads for CPU inference, 0 for the torch default"
+    },
     'infer-batch-list': {
         'default': None,
         'type': str,
@@ -756,11 +810,49 @@ SECTIONS['bin-inference'] = {
     },
 }
 
+SECTIONS['stream'] = {
+    'stream-mode': {
+        'default': 'none',
+        'type': str,
+        'help': "Reconstruct projections while they are acquired: from a growing DXchange file written in the SWMR mode, or from a directory of frames (dark_<id>.tiff, flat_<id>.tiff, proj_<id>.tiff) given by --file-name",
+        'choices': ['none', 'swmr', 'frames']},
+    'stream-nproj': {
+        'default': 0,
+        'type': int,
+        'help': "Number of projections in the scan for streaming, 0 to take the maximum size of the SWMR dataset"},
+    'stream-poll-interval': {
+        'default': 0.1,
+        'type': float,
+        'help': "Time interval (s) for checking new projections when streaming"},
+    'stream-timeout': {
+        'default': 60.0,
+        'type': float,
+        'help': "Stop streaming if there are no new projections for the given time (s)"},
+}
+
+SECTIONS['serve'] = {
+    'queue-dir': {
+        'default': Path.home()/'tomocupy_queue',
+        'type': Path,
+        'help': "Directory with job files for tomocupy serve",
+        'metavar': 'PATH'},
+    'poll-interval': {
+        'default': 0.5,
+        'type': float,
+        'help': "Time interval (s) for checking new jobs in the queue directory"},
+    'max-jobs': {
+        'default': 0,
+        'type': int,
+        'help': "Stop the server after the given number of jobs, 0 for no limit"},
+}
+
 RECON_PARAMS = ('file-reading', 'remove-stripe',
-                'reconstruction', 'fw', 'ti', 'vo-all', 'lamino', 'reconstruction-types', 'beam-hardening', 'inference', 'output', 'bin-inference')
+                'reconstruction', 'retrieve-phase', 'fw', 'ti', 'vo-all', 'lamino', 'reconstruction-types', 'beam-hardening', 'inference', 'output', 'bin-inference', 'stream')
 RECON_STEPS_PARAMS = ('file-reading', 'remove-stripe', 'reconstruction',
                       'retrieve-phase', 'fw', 'ti', 'vo-all', 'lamino', 'reconstruction-steps-types', 'rotate-proj', 'beam-hardening', 'inference', 'output', 'bin-inference')
 
+SERVE_PARAMS = RECON_PARAMS + ('serve', )
+
 NICE_NAMES = ('General', 'File reading', 'Remove stripe',
               'Remove stripe FW', 'Remove stripe Titarenko', 'Remove stripe Vo', 'Retrieve phase', 'Reconstruction','Inference','Bin inference')
 
@@ -936,6 +1028,7 @@ def update_hdf_process(fname, args=None, sections=None):
         log.warning("  *** Not saving log data to the HDF file.")
 
     else:
+        import h5py
         with h5py.File(fname, 'r+') as hdf_file:
             # If the group we will write to already exists, remove it
             if hdf_file.get('/process/tomocupy-' + __version__):
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# *************************************************************************** #
+#                  Copyright © 2022, UChicago Argonne, LLC                    #
+#                           All Rights Reserved                               #
+#                         Software Name: Tomocupy                             #
+#                     By: Argonne National Laboratory                         #
+#                                                                             #
+#                           OPEN SOURCE LICENSE                               #
+#                                                                             #
+# Redistribution and use in source and binary forms, with or without          #
+# modification, are permitted provided that the following conditions are met: #
+#                                                                             #
+# 1. Redistributions of source code must retain the above copyright notice,   #
+#    this list of conditions and the following disclaimer.                    #
+# 2. Redistributions in binary form must reproduce the above copyright        #
+#    notice, this list of conditions and the following disclaimer in the      #
+#    documentation and/or other materials provided with the distribution.     #
+# 3. Neither the name of the copyright holder nor the names of its            #
+#    contributors may be used to endorse or promote products derived          #
+#    from this software without specific prior written permission.            #
+#                                                                             #
+#                                                                             #
+# *************************************************************************** #
+#                               DISCLAIMER                                    #
+#                                                                             #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS         #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT           #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS           #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,      #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED    #
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR      #
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF      #
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING        #
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS          #
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.                #
+# *************************************************************************** #
+
+from tomocupy import logging
+from tomocupy import utils
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, resource_tracker, shared_memory
+from threading import Lock, local
+import numpy as np
+import atexit
+import os
+
+__author__ = "Viktor Nikitin"
+__copyright__ = "Copyright (c) 2022, UChicago Argonne, LLC."
+__docformat__ = 'restructuredtext en'
+__all__ = ['ReadPool', 'read_pool']
+
+log = logging.getLogger(__name__)
+
+# state of a worker process: open files and attached shared memory slabs
+_files = {}
+_slabs = OrderedDict()
+
+
+def _attach(name):
+    """Attach a shared memory slab created by the main process"""
+
+    if name in _slabs:
+        _slabs.move_to_end(name)
+        return _slabs[name]
+    try:
+        shm = shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # python<3.13, the slab is owned (and tracked) by the main process
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            shm = shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
+    _slabs[name] = shm
+    # slabs of finished reads, or replaced by larger ones, are detached
+    while len(_slabs) > 32:
+        _slabs.popitem(last=False)[1].close()
+    return shm
+
+
+def _read_part(fname, name, ids, sel, slab, shape, dtype, st, end):
+    """Read dataset entries ids[st:end] with the selection sel to positions st:end of the shared slab"""
+
+    import h5py
+    if fname not in _files:
+        _files[fname] = h5py.File(fname, 'r')
+    res = np.ndarray(shape, dtype=dtype, buffer=_attach(slab).buf)
+    dset = _files[fname][name]
+    for p, st_id, end_id in utils.id_ranges(ids[st:end]):
+        dset.read_direct(res, (slice(st_id, end_id), *sel), np.s_[st+p:st+p+end_id-st_id])
+
+
+class ReadPool():
+    """Process-wide pool of processes reading HDF5 datasets
+
+    Reads and decompression of chunked or filtered datasets are done in worker processes
+    with their own h5py handles, so they are not serialized by the h5py global lock.
+    Each read is split by projections into one part per worker. Workers write decoded
+    data to a shared memory slab of the calling thread, arrays are not pickled.
+    """
+
+    def __init__(self, nworkers=0):
+        self.nworkers = nworkers
+        self.pool = None
+        self.lock = Lock()
+        self.local = local()
+        self.slabs = []
+        self.nslabs = 0
+        atexit.register(self.close)
+
+    def resize(self, nworkers):
+        """Change the number of worker processes (0 for reading in the calling threads)"""
+
+        with self.lock:
+            if nworkers != self.nworkers and self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+            self.nworkers = nworkers
+
+    def _slab(self, nbytes):
+        """Shared memory slab of the calling thread with at least nbytes"""
+
+        slab = getattr(self.local, 'slab', None)
+        if slab is None or slab.size < nbytes:
+            with self.lock:
+                self.nslabs += 1
+                name = f'tomocupy_{os.getpid()}_{self.nslabs}'
+            new = shared_memory.SharedMemory(name, create=True, size=max(nbytes, 1))
+            with self.lock:
+                self.slabs.append(new)
+                if slab is not None:
+                    self.slabs.remove(slab)
+                    self._free(slab)
+            self.local.slab = slab = new
+        return slab
+
+    def read(self, dset, ids, sel, dtype, copy=False):
+        """Read entries ids of the h5py dataset dset with the selection sel of other dimensions.
+        The result is a view of the calling thread's slab, valid until its next read, or a copy if copy=True"""
+
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.nworkers, mp_context=get_context('spawn'))
+            pool = self.pool
+        ids = np.asarray(ids)
+        shape = utils.ids_shape(dset.shape, ids, sel)
+        dtype = np.dtype(dtype)
+        slab = self._slab(int(np.prod(shape))*dtype.itemsize)
+        bounds = np.linspace(0, len(ids), min(self.nworkers, len(ids))+1).astype('int')
+        futures = [pool.submit(_read_part, dset.file.filename, dset.name, ids, sel, slab.name, shape, dtype, st, end)
+                   for st, end in zip(bounds[:-1], bounds[1:])]
+        for f in futures:
+            f.result()
+        res = np.ndarray(shape, dtype=dtype, buffer=slab.buf)
+        if copy:
+            res, view = np.empty_like(res), res
+            utils.copy(view, res)
+        return res
+
+    def close(self):
+        """Stop workers and free shared memory"""
+
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+            for slab in self.slabs:
+                self._free(slab)
+            self.slabs = []
+
+    def _free(self, slab):
+        try:
+            slab.close()
+        except BufferError:
+            # views of the slab are still referenced, memory is freed with them
+            pass
+        slab.unlink()
+
+
+# process-wide pool for reading
+read_pool = ReadPool()
@@ -41,6 +41,7 @@
 from tomocupy import logging
 from tomocupy import utils
 from tomocupy.global_vars import args, params
+from tomocupy.dataio.read_pool import read_pool
 from ast import literal_eval
 
 import numpy as np
@@ -73,6 +74,11 @@ class Reader():
         else:
             log.warning(f'Using flat fields from {args.flat_file_name}')
 
+        # memory maps of contiguous datasets
+        self.mmaps = {}
+        # processes for reading chunked or compressed datasets
+        read_pool.resize(args.read_workers)
+
         self.init_sizes()
         if args.reconstruction_type[:3] == 'try':
             self.init_sizes_try()
@@ -92,11 +98,16 @@ class Reader():
         ndark = sizes['ndark']
         dtype = sizes['dtype']
 
-        # adjust data type for input data
-        if args.binning > 0:
-            in_dtype = args.dtype
-        else:
+        # adjust data type for input data, uint8/uint16 data are binned to the mean
+        # in the input type (sums are restored by bin_scale) and converted to float on GPU
+        bin_scale = 1
+        if args.binning == 0:
             in_dtype = dtype
+        elif dtype in (np.uint8, np.uint16):
+            in_dtype = dtype
+            bin_scale = 4**args.binning
+        else:
+            in_dtype = args.dtype
 
         # adjust the last row and proj ids, so as first and last corrdinates in x
         if (args.end_row == -1):
@@ -181,6 +192,20 @@ class Reader():
             log.info(f'angles {theta}')
         nproj = len(theta)
 
+        # projections at theta and theta+pi are stitched for double_fov scans
+        stitch_ids = None
+        theta_rec = theta
+        if args.file_type == 'double_fov' and getattr(args, 'double_fov_method', 'pad') == 'stitch':
+            stitch_ids = self.stitch_pairs(theta)
+            theta_rec = theta[stitch_ids[0]]
+
+        # sparse slices, binned rows are packed into chunks
+        slices = None
+        nz_rows = nz
+        if getattr(args, 'slices', 'none') != 'none':
+            slices = self.parse_slices(nzi)
+            nz = len(slices)
+
         # calculate chunks
         nzchunk = int(np.ceil(nz/ncz))
         lzchunk = np.minimum(
@@ -193,8 +218,12 @@ class Reader():
         if not isinstance(tmp, list):
             tmp = [tmp]
 
-        params.id_slices = np.int32(np.array(tmp)*(nz*2**args.binning-1) /
+        params.id_slices = np.int32(np.array(tmp)*(nz_rows*2**args.binning-1) /
                                     2**args.binning)*2**args.binning
+        params.slices = slices
+        params.rec_roi = self.parse_rec_roi(n)
+        x0, x1, y0, y1 = params.rec_roi
+        params.shape_rec_slice = (y1-y0, x1-x0)
         params.n = n
         params.nz = nz
         params.ncz = ncz
@@ -208,12 +237,19 @@ class Reader():
         params.nflat = nflat
         params.ids_proj = ids_proj
         params.theta = theta
+        params.theta_rec = theta_rec
+        params.nproj_rec = len(theta_rec)
+        params.stitch_ids = stitch_ids
+        if stitch_ids is not None:
+            # source columns of mirrored projections at theta+pi, wrt the rotation axis
+            params.stitch_x = np.float32(2*center-np.arange(n))
         params.nzchunk = nzchunk
         params.lzchunk = lzchunk
         params.ntchunk = ntchunk
         params.ltchunk = ltchunk
         params.dtype = args.dtype
         params.in_dtype = in_dtype
+        params.bin_scale = bin_scale
         params.st_n = st_n
         params.end_n = end_n
 
@@ -221,6 +257,76 @@ class Reader():
         params.shape_data_full = (nproj, nz, ni)
         params.shape_data_fulln = (nproj, nz, n)
 
+    def stitch_pairs(self, theta):
+        """Ids of projections at theta in [theta[0],theta[0]+pi) and of the opposing projections at theta+pi"""
+
+        # stitching depends on the rotation center, it cannot be changed afterwards as in try reconstruction
+        if args.lamino_angle != 0 or args.reconstruction_type != 'full':
+            raise RuntimeError('--double-fov-method stitch is supported only for full tomographic reconstruction')
+        step = np.median(np.abs(np.diff(theta))) if len(theta) > 1 else 0
+        ids0 = np.where(theta-theta[0] < np.pi-step/2)[0]
+        diff = np.abs(theta[np.newaxis]-theta[ids0, np.newaxis]-np.pi)
+        ids1 = diff.argmin(axis=1)
+        if len(ids0) == len(theta) or diff[np.arange(len(ids0)), ids1].max() > step/2:
+            raise RuntimeError('No opposing projections at theta+180 deg for stitching, use --double-fov-method pad')
+        log.info(f'Stitch {len(ids0)} pairs of projections at theta and theta+180 deg')
+        return ids0, ids1
+
+    def parse_slices(self, nzi):
+        """Binned rows for --slices given as a list or start:end:step of detector rows"""
+
+        if args.reconstruction_type != 'full' or args.lamino_angle != 0 or args.retrieve_phase_method != 'none':
+            raise RuntimeError('--slices is supported for full tomographic reconstruction without phase retrieval')
+        if args.save_format not in ('tiff', 'h5', 'h5nolinks'):
+            raise RuntimeError('--slices is supported for tiff, h5 and h5nolinks output formats')
+        if ':' in args.slices:
+            st, end, step = (args.slices.split(':')+[''])[:3]
+            rows = np.arange(int(st or 0), int(end or nzi), int(step or 1))
+        else:
+            rows = np.atleast_1d(literal_eval(args.slices))
+        rows = np.unique(np.int64(rows)//2**args.binning)
+        rows = rows[(rows >= 0) & (rows < nzi//2**args.binning)]
+        if len(rows) == 0:
+            raise RuntimeError(f'No detector rows in --slices {args.slices}')
+        if args.start_row != 0:
+            log.warning('--start-row is ignored with --slices')
+        # chunk positions are mapped to rows with params.slices
+        args.start_row = 0
+        log.info(f'Reconstruct {len(rows)} slices')
+        return rows
+
+    def parse_rec_roi(self, n):
+        """Binned region x0,x1,y0,y1 of reconstructed slices for --rec-roi, the whole slice by default"""
+
+        if getattr(args, 'rec_roi', 'none') == 'none':
+            return (0, n, 0, n)
+        if args.reconstruction_type != 'full':
+            raise RuntimeError('--rec-roi is supported for full reconstruction')
+        if args.save_format not in ('tiff', 'h5', 'h5nolinks', 'zarr'):
+            raise RuntimeError('--rec-roi is supported for tiff, h5, h5nolinks and zarr output formats')
+        try:
+            x0, x1, y0, y1 = [int(v)//2**args.binning for v in args.rec_roi.split(',')]
+        except ValueError:
+            raise RuntimeError(f'--rec-roi should be given as x0,x1,y0,y1, got {args.rec_roi}')
+        x0, x1 = max(x0, 0), min(x1, n)
+        y0, y1 = max(y0, 0), min(y1, n)
+        if x1 <= x0 or y1 <= y0:
+            raise RuntimeError(f'Empty region --rec-roi {args.rec_roi} for slices of size {n*2**args.binning}')
+        log.info(f'Reconstruct region x {x0}:{x1}, y {y0}:{y1} of binned slices of size {n}')
+        return (x0, x1, y0, y1)
+
+    def rows_selection(self, rows):
+        """Selection of detector rows for binned rows, strided if possible to read with one hyperslab"""
+
+        b = 2**args.binning
+        rows = (rows[:, np.newaxis]*b+np.arange(b)).ravel()
+        if len(rows) == 1:
+            return slice(int(rows[0]), int(rows[0])+1)
+        step = int(rows[1]-rows[0])
+        if np.all(np.diff(rows) == step):
+            return slice(int(rows[0]), int(rows[-1])+1, step)
+        return rows
+
     def init_sizes_try(self):
         """Calculating sizes for try reconstruction by chunks"""
 
@@ -275,6 +381,23 @@ class Reader():
         params.lamino_shift = (rh0//2-rh//2) - \
             args.lamino_start_row//2**args.binning
 
+    def dataset(self, fid, name):
+        """Memory map of a contiguous uncompressed dataset (read as numpy arrays without HDF5 layers and lock),
+        or the h5py dataset for chunked, filtered or external layouts"""
+
+        key = (fid.filename, name)
+        if key not in self.mmaps:
+            dset = fid[name]
+            offset = dset.id.get_offset()
+            if dset.chunks is None and dset.external is None and offset is not None:
+                self.mmaps[key] = np.memmap(fid.filename, dtype=dset.dtype, mode='r',
+                                            offset=offset, shape=dset.shape)
+            else:
+                self.mmaps[key] = None
+        if self.mmaps[key] is None:
+            return fid[name]
+        return self.mmaps[key]
+
     def read_sizes(self):
         '''
         Read data sizes        
@@ -321,7 +444,7 @@ class Reader():
                         theta = np.linspace(0, np.pi, projections, dtype='float32')
         return theta
 
-    def read_data_chunk_to_queue(self, data_queue, ids_proj, st_z, end_z, st_n, end_n, id_z, in_dtype):
+    def read_data_chunk_to_queue(self, data_queue, ids_proj, st_z, end_z, st_n, end_n, id_z, in_dtype, z=None):
         '''
         Read a data chunk (proj, flat,dark) from the storage to a python queue, with downsampling
         Input:
@@ -334,25 +457,32 @@ class Reader():
         end_n - end column in x
         id_z - chunk id (for ordering after parallel processing) 
         id_dtype - input data type (e.g. uint8), or reconstruction type (if binning>0)
+        z - selection of rows instead of st_z:end_z (e.g. for sparse slices)
         '''
 
+        if z is None:
+            z = slice(st_z, end_z)
+
         with h5py.File(args.file_name) as fid:
-            if isinstance(ids_proj, np.ndarray):
-                # data = fid['/exchange/data'][ids_proj, st_z:end_z,
-                #                             st_n:end_n].astype(in_dtype, copy=False)
-                data = fid['/exchange/data'][:, st_z:end_z,
-                                             st_n:end_n][ids_proj].astype(in_dtype, copy=False)
+            dset = self.dataset(fid, '/exchange/data')
+            if read_pool.nworkers > 0 and not isinstance(dset, np.ndarray):
+                # chunked or compressed data are decoded by worker processes,
+                # the shared slab is binned or copied before the next read of this thread
+                ids = ids_proj if isinstance(ids_proj, np.ndarray) else np.arange(ids_proj[0], ids_proj[1])
+                data = read_pool.read(dset, ids, (z, slice(st_n, end_n)), in_dtype, copy=args.binning == 0)
+            elif isinstance(ids_proj, np.ndarray):
+                # blocked views, only the kept projections are read
+                data = utils.read_ids(dset, ids_proj, (z, slice(st_n, end_n)), in_dtype)
             else:
-                data = fid['/exchange/data'][ids_proj[0]:ids_proj[1],
-                                             st_z:end_z, st_n:end_n].astype(in_dtype, copy=False)
+                data = dset[ids_proj[0]:ids_proj[1], z, st_n:end_n].astype(in_dtype, copy=False)
 
         with h5py.File(args.dark_file_name) as fid:
-            data_dark = fid['/exchange/data_dark'][:,
-                                                   st_z:end_z, st_n:end_n].astype(in_dtype, copy=False)
+            data_dark = self.dataset(fid, '/exchange/data_dark')[:,
+                                                                 z, st_n:end_n].astype(in_dtype, copy=False)
 
         with h5py.File(args.flat_file_name) as fid:
-            data_flat = fid['/exchange/data_white'][:,
-                                                    st_z:end_z, st_n:end_n].astype(in_dtype, copy=False)
+            data_flat = self.dataset(fid, '/exchange/data_white')[:,
+                                                                  z, st_n:end_n].astype(in_dtype, copy=False)
             item = {}
             item['data'] = utils.downsample(data, args.binning)
             item['flat'] = utils.downsample(data_flat, args.binning)
@@ -366,21 +496,25 @@ class Reader():
         """Read a chunk of projections with binning"""
 
         with h5py.File(args.file_name) as fid:
-            d = fid['/exchange/data'][args.start_proj +
-                                      st_proj:args.start_proj+end_proj, st_z:end_z, st_n:end_n]
-            data[st_proj:end_proj] = utils.downsample(d, args.binning)
+            dset = self.dataset(fid, '/exchange/data')
+            if read_pool.nworkers > 0 and not isinstance(dset, np.ndarray):
+                ids = np.arange(args.start_proj+st_proj, args.start_proj+end_proj)
+                d = read_pool.read(dset, ids, (slice(st_z, end_z), slice(st_n, end_n)), dset.dtype)
+            else:
+                d = dset[args.start_proj+st_proj:args.start_proj+end_proj, st_z:end_z, st_n:end_n]
+            utils.downsample(d, args.binning, out=data[st_proj:end_proj])
 
     def read_flat_dark(self, st_n, end_n):
         """Read flat and dark"""
 
         with h5py.File(args.dark_file_name) as fid:
-            dark = fid['/exchange/data_dark'][:,
-                                              args.start_row:args.end_row, st_n:end_n]
+            dark = self.dataset(fid, '/exchange/data_dark')[:,
+                                                            args.start_row:args.end_row, st_n:end_n]
             dark = utils.downsample(dark, args.binning)
 
         with h5py.File(args.flat_file_name) as fid:
-            flat = fid['/exchange/data_white'][:,
-                                               args.start_row:args.end_row, st_n:end_n]
+            flat = self.dataset(fid, '/exchange/data_white')[:,
+                                                             args.start_row:args.end_row, st_n:end_n]
             flat = utils.downsample(flat, args.binning)
 
         return flat, dark
@@ -389,7 +523,7 @@ class Reader():
         """Read projection pairs for automatic search of the rotation center. E.g. pairs=[0,1499] for the regular 180 deg dataset [1500,2048,2448]. """
 
         with h5py.File(args.file_name) as fid:
-            d = fid['/exchange/data'][pairs, st_z:end_z, st_n:end_n]
+            d = self.dataset(fid, '/exchange/data')[pairs, st_z:end_z, st_n:end_n]
             data = utils.downsample(d, args.binning)
             return data
 
@@ -401,6 +535,41 @@ class Reader():
         self.read_data_chunk_to_queue(
             data_queue, params.ids_proj, st_z, end_z, params.st_n, params.end_n, 0, params.in_dtype)
 
+    def read_rows(self, dset, ids, rows):
+        """Read projections with ids for binned rows"""
+
+        data = []
+        for iz in rows:
+            st_z = args.start_row+iz*2**args.binning
+            d = utils.read_ids(dset, np.arange(dset.shape[0])[ids],
+                               (slice(st_z, st_z+2**args.binning), slice(params.st_n, params.end_n)), params.in_dtype)
+            data.append(utils.downsample(d, args.binning))
+        return np.concatenate(data, axis=1)
+
+    def read_rows_flat_dark(self, rows):
+        """Read flat and dark for binned rows"""
+
+        with h5py.File(args.flat_file_name) as fid:
+            flat = self.read_rows(self.dataset(fid, '/exchange/data_white'), slice(None), rows)
+        with h5py.File(args.dark_file_name) as fid:
+            dark = self.read_rows(self.dataset(fid, '/exchange/data_dark'), slice(None), rows)
+        return flat, dark
+
+    def read_rows_chunks(self, rows, nsubsets):
+        """Generator of projection chunks for binned rows, projections are ordered by interleaved angular subsets.
+        Yields positions of projections in theta and data [nproj_chunk,len(rows),ni]"""
+
+        ids = params.ids_proj
+        if not isinstance(ids, np.ndarray):
+            ids = np.arange(ids[0], ids[1])
+        with h5py.File(args.file_name) as fid:
+            dset = self.dataset(fid, '/exchange/data')
+            for s in range(nsubsets):
+                pos_subset = np.arange(s, params.nproj, nsubsets)
+                for st in range(0, len(pos_subset), params.ncproj):
+                    pos = pos_subset[st:st+params.ncproj]
+                    yield pos, self.read_rows(dset, ids[pos], rows)
+
     def read_data_to_queue(self, data_queue, read_threads):
         """Reading data from hard disk and putting it to a queue"""
 
@@ -408,9 +577,13 @@ class Reader():
             st_z = args.start_row+k*params.ncz*2**args.binning
             end_z = args.start_row + \
                 (k*params.ncz+params.lzchunk[k])*2**args.binning
+            z = None
+            if params.slices is not None:
+                z = self.rows_selection(
+                    params.slices[k*params.ncz:k*params.ncz+params.lzchunk[k]])
             ithread = utils.find_free_thread(read_threads)
             read_threads[ithread].run(self.read_data_chunk_to_queue, (
-                data_queue, params.ids_proj, st_z, end_z, params.st_n, params.end_n, k, params.in_dtype))
+                data_queue, params.ids_proj, st_z, end_z, params.st_n, params.end_n, k, params.in_dtype, z))
 
     def read_data_parallel(self, nthreads=16):
         """Reading data in parallel (good for ssd disks)"""
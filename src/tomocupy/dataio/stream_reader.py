@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# *************************************************************************** #
+#                  Copyright © 2022, UChicago Argonne, LLC                    #
+#                           All Rights Reserved                               #
+#                         Software Name: Tomocupy                             #
+#                     By: Argonne National Laboratory                         #
+#                                                                             #
+#                           OPEN SOURCE LICENSE                               #
+#                                                                             #
+# Redistribution and use in source and binary forms, with or without          #
+# modification, are permitted provided that the following conditions are met: #
+#                                                                             #
+# 1. Redistributions of source code must retain the above copyright notice,   #
+#    this list of conditions and the following disclaimer.                    #
+# 2. Redistributions in binary form must reproduce the above copyright        #
+#    notice, this list of conditions and the following disclaimer in the      #
+#    documentation and/or other materials provided with the distribution.     #
+# 3. Neither the name of the copyright holder nor the names of its            #
+#    contributors may be used to endorse or promote products derived          #
+#    from this software without specific prior written permission.            #
+#                                                                             #
+#                                                                             #
+# *************************************************************************** #
+#                               DISCLAIMER                                    #
+#                                                                             #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS         #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT           #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS           #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,      #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED    #
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR      #
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF      #
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING        #
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS          #
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.                #
+# *************************************************************************** #
+
+from tomocupy import logging
+from tomocupy import utils
+from tomocupy.dataio.reader import Reader
+from tomocupy.global_vars import args, params
+
+import os
+import time
+import signal
+import numpy as np
+import h5py
+
+from pathlib import Path
+from threading import Thread, Condition
+
+__author__ = "Viktor Nikitin"
+__copyright__ = "Copyright (c) 2022, UChicago Argonne, LLC."
+__docformat__ = 'restructuredtext en'
+__all__ = ['StreamReader', ]
+
+log = logging.getLogger(__name__)
+
+
+class StreamReader(Reader):
+    '''
+    Class for reading projections while they are acquired, from a growing DXfile written in the SWMR mode
+    or from a directory of frames (dark_<id>.tiff, flat_<id>.tiff, proj_<id>.tiff, optional theta.npy in degrees).
+    Flat and dark fields should be written before projections. New projections are binned and put to
+    the layout of sinogram chunks in memory as they arrive, chunks are given for reconstruction
+    as soon as all angles are received.
+    '''
+
+    def __init__(self):
+        if args.slices != 'none':
+            raise RuntimeError('--slices is not supported for streaming')
+        if args.reconstruction_type not in ('full', 'try', 'preview') or args.rotation_axis_auto == 'auto' or args.lamino_angle != 0:
+            raise RuntimeError(
+                'Streaming is supported for full, try and preview tomographic reconstruction with a given rotation axis')
+        if args.stream_mode == 'frames' and args.out_path_name is None:
+            args.out_path_name = Path(f'{str(args.file_name).rstrip("/")}_rec')
+
+        super().__init__()
+
+        # raw projection id -> position in the reconstructed set (-1 for skipped ids)
+        ids = params.ids_proj
+        if not isinstance(ids, np.ndarray):
+            ids = np.arange(ids[0], ids[1])
+        self.pos = np.full(ids[-1]+1, -1, dtype='int64')
+        self.pos[ids] = np.arange(len(ids))
+
+        # detector region and binned buffers in the layout of z chunks
+        self.rows = slice(args.start_row, args.start_row+params.nz*2**args.binning)
+        self.cols = slice(params.st_n, params.end_n)
+        self.data = np.empty([params.nzchunk, params.nproj, params.ncz, params.ni], dtype=params.in_dtype)
+        self.flat, self.dark = self.read_flat_dark(params.st_n, params.end_n)
+        log.info(f'Streaming buffer {self.data.nbytes/2**30:.2f} GB')
+
+        frame_bytes = (self.rows.stop-self.rows.start)*(self.cols.stop-self.cols.start)*self.data.itemsize
+        self.batch = max(1, 2**27//frame_bytes)
+        self.present = np.zeros(params.nproj, dtype=bool)
+        self.nready = 0
+        self.error = None
+        self.cond = Condition()
+        self.stream_thread = Thread(target=self.stream, daemon=True)
+        self.stream_thread.start()
+
+    def _wait(self, check, what):
+        """Poll check() until it returns a value other than None"""
+
+        t = time.time()
+        while True:
+            res = check()
+            if res is not None:
+                return res
+            if time.time()-t > args.stream_timeout:
+                raise RuntimeError(f'No {what} in {args.stream_timeout}s')
+            time.sleep(args.stream_poll_interval)
+
+    def _open_swmr(self, fname):
+        def check():
+            try:
+                fid = h5py.File(fname, 'r', libver='latest', swmr=True)
+            except OSError:
+                return None
+            if '/exchange/data' not in fid and fname == args.file_name:
+                fid.close()
+                return None
+            return fid
+        return self._wait(check, f'file {fname} open for SWMR reading')
+
+    def _frames(self, prefix):
+        """Ids and names of frames <prefix>_<id>.tiff in the directory"""
+
+        frames = {}
+        for fname in Path(args.file_name).glob(f'{prefix}_*.tif*'):
+            try:
+                frames[int(fname.stem.split('_')[-1])] = fname
+            except ValueError:
+                pass
+        return frames
+
+    def _read_frames(self, frames, ids):
+        import tifffile
+        return np.stack([tifffile.imread(frames[id])[self.rows, self.cols] for id in ids])
+
+    def read_sizes(self):
+        """Read data sizes, the number of projections is given by --stream-nproj or by the bounded SWMR dataset"""
+
+        sizes = {}
+        if args.stream_mode == 'frames':
+            import tifffile
+            self._wait(lambda: True if self._frames('dark') and self._frames('flat') else None,
+                       f'flat and dark frames in {args.file_name}')
+            if args.stream_nproj <= 0:
+                raise RuntimeError('Set the number of projections with --stream-nproj')
+            dark = tifffile.imread(next(iter(self._frames('dark').values())))
+            sizes['dtype'] = dark.dtype
+            sizes['nproji'] = args.stream_nproj
+            sizes['nzi'], sizes['ni'] = dark.shape
+            sizes['nflat'] = len(self._frames('flat'))
+            sizes['ndark'] = len(self._frames('dark'))
+            return sizes
+
+        with self._open_swmr(args.file_name) as fid:
+            data = fid['/exchange/data']
+            nproj = args.stream_nproj if args.stream_nproj > 0 else data.maxshape[0]
+            if nproj is None:
+                raise RuntimeError(
+                    'Set the number of projections with --stream-nproj, the SWMR dataset is unlimited')
+            sizes['dtype'] = data.dtype
+            sizes['nproji'] = nproj
+            sizes['nzi'], sizes['ni'] = data.shape[1:]
+        with self._open_swmr(args.flat_file_name) as fid:
+            sizes['nflat'] = fid['/exchange/data_white'].shape[0]
+        with self._open_swmr(args.dark_file_name) as fid:
+            sizes['ndark'] = fid['/exchange/data_dark'].shape[0]
+        if sizes['nflat'] == 0 or sizes['ndark'] == 0:
+            raise RuntimeError('Flat and dark fields should be written before projections')
+        return sizes
+
+    def read_theta(self, projections):
+        """Read projection angles (in radians), uniform in [0,pi] if they are not given for all projections"""
+
+        theta = None
+        if args.stream_mode == 'frames':
+            fname = Path(args.file_name)/'theta.npy'
+            if fname.exists():
+                theta = np.load(fname)
+        else:
+            with self._open_swmr(args.file_name) as fid:
+                if '/exchange/theta' in fid:
+                    theta = fid['/exchange/theta'][:]
+        if theta is None or len(theta) < projections:
+            return np.linspace(0, np.pi, projections, dtype='float32')
+        return theta[:projections].astype('float32') / 180 * np.pi
+
+    def read_flat_dark(self, st_n, end_n):
+        """Read flat and dark"""
+
+        if args.stream_mode == 'frames':
+            flats, darks = self._frames('flat'), self._frames('dark')
+            flat = self._read_frames(flats, sorted(flats))
+            dark = self._read_frames(darks, sorted(darks))
+        else:
+            with self._open_swmr(args.flat_file_name) as fid:
+                flat = fid['/exchange/data_white'][:, self.rows, st_n:end_n]
+            with self._open_swmr(args.dark_file_name) as fid:
+                dark = fid['/exchange/data_dark'][:, self.rows, st_n:end_n]
+        flat = utils.downsample(flat.astype(params.in_dtype, copy=False), args.binning)
+        dark = utils.downsample(dark.astype(params.in_dtype, copy=False), args.binning)
+        return flat, dark
+
+    def put_projections(self, ids, data):
+        """Bin projections with raw ids and put them to z chunks"""
+
+        pos = self.pos[ids]
+        data = data[pos >= 0]
+        pos = pos[pos >= 0]
+        if len(pos) == 0:
+            return
+        data = utils.downsample(data.astype(params.in_dtype, copy=False), args.binning)
+        for k in range(params.nzchunk):
+            st = k*params.ncz
+            self.data[k, pos, :params.lzchunk[k]] = data[:, st:st+params.lzchunk[k]]
+        with self.cond:
+            self.present[pos] = True
+            self.nready = int(np.sum(self.present))
+            self.cond.notify_all()
+
+    def stream_swmr(self):
+        """Read new projections from the growing dataset"""
+
+        last = len(self.pos)
+        with self._open_swmr(args.file_name) as fid:
+            dset = fid['/exchange/data']
+            nread = 0
+            t = time.time()
+            while nread < last:
+                dset.refresh()
+                end = min(dset.shape[0], last, nread+self.batch)
+                if end > nread:
+                    self.put_projections(np.arange(nread, end), dset[nread:end, self.rows, self.cols])
+                    nread = end
+                    t = time.time()
+                elif time.time()-t > args.stream_timeout:
+                    raise RuntimeError(
+                        f'No new projections in {args.stream_timeout}s, received {self.nready} of {params.nproj}')
+                else:
+                    time.sleep(args.stream_poll_interval)
+
+    def stream_frames(self):
+        """Read new projection frames from the directory, frames can come in any order"""
+
+        todo = set(np.where(self.pos >= 0)[0].tolist())
+        t = time.time()
+        while todo:
+            frames = self._frames('proj')
+            new = sorted(todo.intersection(frames))
+            if new:
+                for st in range(0, len(new), self.batch):
+                    ids = new[st:st+self.batch]
+                    self.put_projections(np.array(ids), self._read_frames(frames, ids))
+                todo.difference_update(new)
+                t = time.time()
+            elif time.time()-t > args.stream_timeout:
+                raise RuntimeError(
+                    f'No new projections in {args.stream_timeout}s, received {self.nready} of {params.nproj}')
+            else:
+                time.sleep(args.stream_poll_interval)
+
+    def stream(self):
+        t = time.time()
+        try:
+            if args.stream_mode == 'frames':
+                self.stream_frames()
+            else:
+                self.stream_swmr()
+            log.info(f'Received {params.nproj} projections in {time.time()-t:.1f}s')
+        except Exception as e:
+            log.error(f'Streaming stopped: {e}')
+            with self.cond:
+                self.error = e
+                self.cond.notify_all()
+
+    def wait_projections(self):
+        """Wait until all projections are received"""
+
+        with self.cond:
+            while self.nready < params.nproj and self.error is None:
+                self.cond.wait()
+        if self.error is not None:
+            raise RuntimeError(f'Streaming stopped: {self.error}')
+
+    def read_rows_flat_dark(self, rows):
+        """Flat and dark for binned rows"""
+
+        return self.flat[:, rows], self.dark[:, rows]
+
+    def read_rows_chunks(self, rows, nsubsets):
+        """Generator of projection chunks for binned rows in the order of arrival.
+        Yields positions of projections in theta and data [nproj_chunk,len(rows),ni]"""
+
+        k, j = rows//params.ncz, rows % params.ncz
+        done = np.zeros(params.nproj, dtype=bool)
+        while not np.all(done):
+            with self.cond:
+                while self.error is None and not np.any(self.present & ~done):
+                    self.cond.wait()
+                if self.error is not None:
+                    raise RuntimeError(f'Streaming stopped: {self.error}')
+                pos = np.where(self.present & ~done)[0]
+            done[pos] = True
+            for st in range(0, len(pos), params.ncproj):
+                p = pos[st:st+params.ncproj]
+                yield p, self.data[k[np.newaxis], p[:, np.newaxis], j[np.newaxis]]
+
+    def read_data_to_queue(self, data_queue, read_threads):
+        """Putting z chunks to a queue once all angles are received"""
+
+        try:
+            self.wait_projections()
+        except RuntimeError:
+            # the conveyor in the main thread waits for data, abort it
+            os.kill(os.getpid(), signal.SIGTERM)
+            return
+        for k in range(params.nzchunk):
+            st = k*params.ncz
+            end = st+params.lzchunk[k]
+            item = {}
+            item['data'] = self.data[k, :, :params.lzchunk[k]]
+            item['flat'] = self.flat[:, st:end]
+            item['dark'] = self.dark[:, st:end]
+            item['id'] = k
+            data_queue.put(item)
+
+    def read_data_try(self, data_queue, id_slice):
+
+        self.wait_projections()
+        iz = min(max((id_slice-args.start_row)//2**args.binning, 0), params.nz-1)
+        k, j = iz//params.ncz, iz % params.ncz
+        item = {}
+        item['data'] = self.data[k, :, j:j+1]
+        item['flat'] = self.flat[:, iz:iz+1]
+        item['dark'] = self.dark[:, iz:iz+1]
+        item['id'] = 0
+        data_queue.put(item)
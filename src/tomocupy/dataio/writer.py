@@ -78,6 +78,8 @@ class Writer():
     def __init__(self):
         if args.reconstruction_type[:3] == 'try':
             self.init_output_files_try()
+        elif args.reconstruction_type == 'preview':
+            self.init_output_files_preview()
         else:
             self.init_output_files()
 
@@ -100,6 +102,20 @@ class Writer():
         log.info(f'Output: {fnameout}')
         params.fnameout = fnameout
 
+    def init_output_files_preview(self):
+        """Constructing output file names for preview slices"""
+
+        if (args.out_path_name is None):
+            fnameout = os.path.dirname(
+                args.file_name)+'_rec/preview/'+os.path.basename(args.file_name)[:-3]
+        else:
+            fnameout = str(args.out_path_name)
+        if not os.path.exists(fnameout):
+            os.makedirs(fnameout)
+        fnameout += '/recon'
+        log.info(f'Output: {fnameout}')
+        params.fnameout = fnameout
+
     def init_output_files(self):
         """Constructing output file names and initiating the actual files"""
 
@@ -136,15 +152,20 @@ class Writer():
             z_dim = params.rh if args.lamino_angle != 0 else int(params.nzi/2**args.binning)
             # Assemble virtual dataset
             layout = h5py.VirtualLayout(shape=(
-                z_dim, params.n, params.n), dtype=params.dtype)
+                z_dim, *params.shape_rec_slice), dtype=params.dtype)
             if not os.path.exists(f'{fnameout[:-3]}_parts'):
                 os.makedirs(f'{fnameout[:-3]}_parts')
             for k in range(params.nzchunk):
                 filename = f"{fnameout[:-3]}_parts/p{k:04d}.h5"
                 vsource = h5py.VirtualSource(
-                    filename, "/exchange/data", shape=(params.lzchunk[k], params.n, params.n), dtype=params.dtype)
+                    filename, "/exchange/data", shape=(params.lzchunk[k], *params.shape_rec_slice), dtype=params.dtype)
                 st = args.start_row//2**args.binning+k*params.ncz
-                layout[st:st+params.lzchunk[k]] = vsource
+                if params.slices is not None:
+                    # sparse slices are placed at their z positions
+                    for j, z in enumerate(params.slices[st:st+params.lzchunk[k]]):
+                        layout[z] = vsource[j]
+                else:
+                    layout[st:st+params.lzchunk[k]] = vsource
 
             # Add virtual dataset to output file
             rec_virtual = h5py.File(fnameout, "w")
@@ -176,7 +197,7 @@ class Writer():
             # regular tomo produces nzi/2**binning.
             z_dim = params.rh if args.lamino_angle != 0 else int(params.nzi/2**args.binning)
             dset_rec = h5w.create_dataset("/exchange/data", shape=(
-                z_dim, params.n, params.n), dtype=params.dtype)
+                z_dim, *params.shape_rec_slice), dtype=params.dtype)
 
             # saving command line to repeat the reconstruction as attribute of /exchange/data
             rec_line = sys.argv
@@ -289,15 +310,18 @@ class Writer():
 
         if args.save_format == 'tiff':
             for kk in range(end-st):
-                fid = st+kk
+                fid = st+kk if params.slices is None else params.slices[st+kk]
                 tifffile.imwrite(f'{params.fnameout}_{fid:05}.tiff', rec[kk])
         elif args.save_format == 'h5':
             filename = f"{params.fnameout[:-3]}_parts/p{k:04d}.h5"
             with h5py.File(filename, "w") as fid:
                 fid.create_dataset("/exchange/data", data=rec,
-                                   chunks=(1, params.n, params.n))
+                                   chunks=(1, *params.shape_rec_slice))
         elif args.save_format == 'h5nolinks':
-            self.h5w['/exchange/data'][st:end, :, :] = rec[:end-st]
+            if params.slices is not None:
+                self.h5w['/exchange/data'][params.slices[st:end], :, :] = rec[:end-st]
+            else:
+                self.h5w['/exchange/data'][st:end, :, :] = rec[:end-st]
         elif args.save_format == 'h5sino':
             filename = f"{params.fnameout[:-3]}_parts/p{k:04d}.h5"
             with h5py.File(filename, "w") as fid:
@@ -307,7 +331,7 @@ class Writer():
 
             chunks = [int(c.strip()) for c in args.zarr_chunk.split(',')]
             if not hasattr(self, 'zarr_array'):
-                shape = (int(params.nz / 2**args.binning), params.n, params.n)  # Full dataset shape
+                shape = (int(params.nz / 2**args.binning), *params.shape_rec_slice)  # Full dataset shape
                 print('initialize')
                 max_levels = lambda X, Y: (lambda r: (int(r).bit_length() - 1) if r != 0 else (X.bit_length() - 1))(int(X) % int(Y))
 
@@ -340,6 +364,13 @@ class Writer():
 
         tifffile.imwrite(
             f'{params.fnameout}_slice{id_slice:04d}_center{cid:05.2f}.tiff', rec)
+
+    def write_data_preview(self, rec, id_slice):
+        """Write a preview slice, the file is replaced so that viewers never read a partial image"""
+
+        fname = f'{params.fnameout}_slice{id_slice:04d}.tiff'
+        tifffile.imwrite(f'{fname}.tmp', rec)
+        os.replace(f'{fname}.tmp', fname)
                         
             
 def clean_zarr(output_path):
@@ -51,6 +51,15 @@ class ProcFunctions():
         if args.beam_hardening_method != 'none':
             from tomocupy.processing.external import hardening
             self.cl_hardening = hardening.Beam_Corrector(args)
+        if args.remove_stripe_method == 'fw':
+            self.cl_fw = remove_stripe.FourierWaveletStripeRemover(
+                args.fw_sigma, args.fw_filter, args.fw_level)
+        if args.retrieve_phase_method != 'none':
+            # units adjusted based on the tomopy implementation
+            self.cl_phase = retrieve_phase.PhaseRetrieval(
+                args.retrieve_phase_method, args.pixel_size*1e-4, args.propagation_distance/10, args.energy,
+                args.retrieve_phase_alpha, args.retrieve_phase_delta_beta, args.retrieve_phase_W*1e-4,
+                ratio=args.FFratio, dim=args.FFdim, ff_pad=args.FFpad, apply_log=args.FFlog)
 
     def darkflat_correction(self, data, dark, flat):
         """Dark-flat field correction"""
@@ -82,13 +91,18 @@ class ProcFunctions():
         cp.nan_to_num(data, copy=False, nan=6.0, posinf=0.0, neginf=0.0)
         return data  # reuse input memory
 
-    def beamhardening(self, data, start_row, end_row):
-        """Beam hardening correction"""
-        if start_row == None:
-            start_row = 0
-        if end_row == None:
-            end_row = data.shape[-2]
-        current_rows = list(range(start_row, end_row))
+    def beamhardening(self, data, start_row, end_row, rows=None):
+        """Beam hardening correction, rows gives binned detector rows of the data explicitly"""
+        if rows is not None:
+            current_rows = list(rows)
+        else:
+            if start_row == None:
+                start_row = 0
+            if end_row == None:
+                end_row = data.shape[-2]
+            current_rows = list(range(start_row, end_row))
+            if getattr(params, 'slices', None) is not None:
+                current_rows = list(params.slices[current_rows])
         data[:] = self.cl_hardening.correct_centerline(data)
         data[:] = self.cl_hardening.correct_angle(data, current_rows)
         return data
@@ -102,8 +116,10 @@ class ProcFunctions():
                 fdata = ndimage.median_filter(data, [w, 1, w])
             else:
                 fdata = ndimage.median_filter(data, [w, w])
+            # threshold for sums of binned pixels, integer data are binned to the mean
+            threshold = args.dezinger_threshold/params.bin_scale
             data[:] = cp.where(cp.logical_and(
-                data > fdata, (data - fdata) > args.dezinger_threshold), fdata, data)
+                data > fdata, (data - fdata) > threshold), fdata, data)
         return data
 
     def pad360(self, data):
@@ -123,6 +139,39 @@ class ProcFunctions():
         data = cp.pad(data, ((0, 0), (0, 0), (0, data.shape[-1])), 'constant')
         return data
 
+    def stitch180(self, data):
+        """Stitch projections at theta and theta+pi of a 360 degrees scan to a 180 degrees sinogram of double width.
+
+        Opposing projections are mirrored wrt the rotation axis (with linear interpolation for non-integer 2*center),
+        the overlap is blended with the same smooth transition as in pad360. The result is scaled by 1/2
+        to be consistent with the reconstruction from padded 360 degrees sinograms.
+        """
+
+        if (params.centeri < params.ni//2):
+            # if rotation center is on the left side of the ROI
+            data[:] = data[:, :, ::-1]
+        ni = data.shape[-1]
+        w = max(1, int(2*(params.ni-params.center)))
+
+        # smooth transition at the border
+        v = cp.ones(ni, dtype=data.dtype)
+        t = cp.linspace(1, 0, w, endpoint=False)
+        v[-w:] = t**5*(126-420*t+540*t**2-315*t**3+70*t**4)
+
+        ids0, ids1 = params.stitch_ids
+        res = cp.zeros([len(ids0), data.shape[1], params.n], dtype=data.dtype)
+        res[:, :, :ni] = data[ids0]*v
+        x = cp.asarray(params.stitch_x)
+        x0 = cp.clip(cp.floor(x), 0, ni-2).astype('int32')
+        a = (x-x0).astype(data.dtype)
+        a *= (x >= 0) * (x <= ni-1)
+        b = (1-(x-x0)).astype(data.dtype)
+        b *= (x >= 0) * (x <= ni-1)
+        mirror = data[ids1]*v
+        res += mirror[:, :, x0]*b + mirror[:, :, x0+1]*a
+        res *= 0.5
+        return res
+
     def rotate_proj(self, data, angle, order=2):
         """
         Rotate projections (fixing the roll issue)
@@ -149,8 +198,7 @@ class ProcFunctions():
         res[:] = self.darkflat_correction(data, dark, flat)
         # remove stripes
         if args.remove_stripe_method == 'fw':
-            res[:] = remove_stripe.remove_stripe_fw(
-                res, args.fw_sigma, args.fw_filter, args.fw_level)
+            res[:] = self.cl_fw.apply(res)
         elif args.remove_stripe_method == 'ti':
             res[:] = remove_stripe.remove_stripe_ti(
                 res, args.ti_beta, args.ti_mask)
@@ -160,25 +208,26 @@ class ProcFunctions():
 
         return res
 
-    def proc_proj(self, data, st=None, end=None, res=None):
-        """Processing a projection data chunk"""
+    def retrieve_phase(self, data):
+        """Phase retrieval of a projection data chunk"""
+
+        return self.cl_phase(data)
+
+    def proc_proj(self, data, st=None, end=None, res=None, phase=True, rows=None):
+        """Processing a projection data chunk
+
+        phase=False skips phase retrieval, e.g. when it was already applied to
+        the chunk extended with neighbouring rows in z.
+        rows gives binned detector rows of the chunk instead of st:end (e.g. for preview rows).
+        """
 
         if not isinstance(res, cp.ndarray):
+            nproj = params.nproj_rec if params.stitch_ids is not None else data.shape[0]
             res = cp.zeros(
-                [data.shape[0], data.shape[1], params.n], args.dtype)
+                [nproj, data.shape[1], params.n], args.dtype)
         # retrieve phase
-        if args.retrieve_phase_method == 'Gpaganin' or args.retrieve_phase_method == 'paganin':
-            data[:] = retrieve_phase.paganin_filter(
-                data,  args.pixel_size*1e-4, args.propagation_distance/10, args.energy,
-                args.retrieve_phase_alpha, args.retrieve_phase_method, args.retrieve_phase_delta_beta,
-                args.retrieve_phase_W*1e-4)  # units adjusted based on the tomopy implementation
-        if args.retrieve_phase_method == 'FF':        
-                data[:] = retrieve_phase.fresnel_filter(
-                data, args.FFratio, args.FFdim, window=None, pad=args.FFpad, apply_log=args.FFlog)        
-        if args.retrieve_phase_method == 'farago':        
-                data[:] = retrieve_phase.farago_filter(
-                data,  args.pixel_size*1e-4, args.propagation_distance/10, args.energy,
-                args.retrieve_phase_delta_beta, args.retrieve_phase_method)
+        if phase:
+            data[:] = self.retrieve_phase(data)
                 
         if args.rotate_proj_angle != 0:
             data[:] = self.rotate_proj(
@@ -188,10 +237,13 @@ class ProcFunctions():
             data[:] = self.minus_log(data)
         # beam hardening correction
         if args.beam_hardening_method != 'none':
-            data[:] = self.beamhardening(data, st, end)
+            data[:] = self.beamhardening(data, st, end, rows)
         # padding for 360 deg recon
         if args.file_type == 'double_fov':
-            res[:] = self.pad360(data)
+            if params.stitch_ids is not None:
+                res[:] = self.stitch180(data)
+            else:
+                res[:] = self.pad360(data)
         else:
             res[:] = data[:]
 
@@ -44,7 +44,7 @@ from cupyx.scipy.ndimage import median_filter
 from cupyx.scipy.ndimage import binary_dilation
 from cupyx.scipy.ndimage import uniform_filter1d
 
-__all__ = ['DWTForward', 'DWTInverse', 'afb1d', 'remove_all_stripe', 'remove_stripe_fw', 'remove_stripe_ti']
+__all__ = ['DWTForward', 'DWTInverse', 'FourierWaveletStripeRemover', 'afb1d', 'remove_all_stripe', 'remove_stripe_fw', 'remove_stripe_ti']
 
 ###### Ring removal with wavelet filtering (adapted for cupy from pytroch_wavelet package https://pytorch-wavelets.readthedocs.io/)##########
 
@@ -88,11 +88,13 @@ def _mypad(x, pad, value=0):
         xe = _reflect(cp.arange(-m1, l+m2, dtype='int32'), -0.5, l-0.5)
         return x[:, :, :, xe]
 
-def afb1d(x, h0, h1='zero', dim=-1):
+def afb1d(x, h0, h1='zero', dim=-1, pad_index=None, xpad=None, out=None):
     """1D analysis filter bank: stride-2 convolution along dim, all channels in parallel.
 
     Output channels interleaved [lo_0, hi_0, lo_1, hi_1, ...] to match
     the grouped-convolution ordering expected by DWTForward.
+    Precomputed padding indices and buffers for the padded input and the
+    output can be given to avoid allocations.
     """
     C = x.shape[1]
     d = dim % 4
@@ -103,12 +105,16 @@ def afb1d(x, h0, h1='zero', dim=-1):
     outsize = pywt.dwt_coeff_len(N, L, mode='symmetric')
     p = 2 * (outsize - 1) - N + L
     pad = (0, 0, p//2, (p+1)//2) if d == 2 else (p//2, (p+1)//2, 0, 0)
-    x = _mypad(x, pad=pad)
+    if pad_index is None:
+        x = _mypad(x, pad=pad)
+    else:
+        x = cp.take(x, pad_index, axis=d, out=xpad)
     B = x.shape[0]
     if d == 3:  # row direction: stride-2 along axis 3
         H = x.shape[2]
         # Accumulate directly into interleaved output: avoids cp.zeros×2 + cp.stack copy
-        out = cp.empty((B, C, 2, H, outsize), dtype='float32')
+        if out is None:
+            out = cp.empty((B, C, 2, H, outsize), dtype='float32')
         sl0 = x[:, :, :, 0:2*outsize:2]
         out[:, :, 0] = h0f[0] * sl0
         out[:, :, 1] = h1f[0] * sl0
@@ -118,7 +124,8 @@ def afb1d(x, h0, h1='zero', dim=-1):
             out[:, :, 1] += h1f[j] * sl
     else:  # col direction: stride-2 along axis 2
         W = x.shape[3]
-        out = cp.empty((B, C, 2, outsize, W), dtype='float32')
+        if out is None:
+            out = cp.empty((B, C, 2, outsize, W), dtype='float32')
         sl0 = x[:, :, 0:2*outsize:2, :]
         out[:, :, 0] = h0f[0] * sl0
         out[:, :, 1] = h1f[0] * sl0
@@ -129,10 +136,11 @@ def afb1d(x, h0, h1='zero', dim=-1):
     return out.reshape(B, 2*C, *out.shape[3:])
 
 
-def sfb1d(lo, hi, g0, g1='zero', dim=-1):
+def sfb1d(lo, hi, g0, g1='zero', dim=-1, out=None):
     """1D synthesis filter bank: scatter-add (upsampled transposed conv).
 
     Combines lo and hi in a single pass to avoid one temporary allocation.
+    An output buffer can be given to be reused.
     """
     C = lo.shape[1]
     d = dim % 4
@@ -143,14 +151,20 @@ def sfb1d(lo, hi, g0, g1='zero', dim=-1):
     if d == 3:  # row direction: stride (1, 2)
         H, W = lo.shape[2], lo.shape[3]
         wi = (W - 1) * 2 + L
-        out = cp.zeros((B, C, H, wi), dtype='float32')
+        if out is None:
+            out = cp.zeros((B, C, H, wi), dtype='float32')
+        else:
+            out.fill(0)
         for j in range(L):
             out[:, :, :, j:j + 2*W:2] += g0f[j] * lo + g1f[j] * hi
         return out[:, :, :, (L - 2):wi - (L - 2)]
     else:  # col direction: stride (2, 1)
         H, W = lo.shape[2], lo.shape[3]
         hi_size = (H - 1) * 2 + L
-        out = cp.zeros((B, C, hi_size, W), dtype='float32')
+        if out is None:
+            out = cp.zeros((B, C, hi_size, W), dtype='float32')
+        else:
+            out.fill(0)
         for i in range(L):
             out[:, :, i:i + 2*H:2, :] += g0f[i] * lo + g1f[i] * hi
         return out[:, :, (L - 2):hi_size - (L - 2), :]
@@ -250,47 +264,140 @@ class DWTInverse():
         yl = sfb1d(lo_hi[:, :1], lo_hi[:, 1:], self.g0_row, self.g1_row, dim=3)
         return yl
 
+class FourierWaveletStripeRemover():
+    """Remove stripes with wavelet filtering, reusing setup between chunks.
+
+    Filter banks are built once, damping vectors, padding indices and level
+    buffers are built for the first chunk and reused while the chunk shape
+    does not change.
+    """
+
+    def __init__(self, sigma, wname, level):
+        self.sigma = sigma
+        self.level = level
+        # Accepts all wave types available to PyWavelets
+        self.xfm = DWTForward(wave=wname)
+        self.ifm = DWTInverse(wave=wname)
+        self.shape = None
+
+    def _buffer(self, name, shape, zero=False):
+        """Buffer kept between chunks"""
+
+        buf = self.buffers.get(name)
+        if buf is None:
+            if zero:
+                buf = cp.zeros(shape, dtype='float32')
+            else:
+                buf = cp.empty(shape, dtype='float32')
+            self.buffers[name] = buf
+        return buf
+
+    def _pad_index(self, l, m1, m2):
+        """Symmetric padding indices as in _mypad"""
+
+        key = (l, m1, m2)
+        if key not in self.pad_indices:
+            self.pad_indices[key] = _reflect(
+                cp.arange(-m1, l+m2, dtype='int32'), -0.5, l-0.5)
+        return self.pad_indices[key]
+
+    def _damp(self, my):
+        """Damping of the vertical band in the Fourier domain"""
+
+        if my not in self.damps:
+            myr = my // 2 + 1
+            y_hat = cp.fft.ifftshift((cp.arange(-my, my, 2) + 1) / 2)[:myr]
+            self.damps[my] = -cp.expm1(-y_hat**2 / (2 * self.sigma**2))
+        return self.damps[my]
+
+    def _afb1d(self, x, h0, h1, dim, name):
+        d = dim % 4
+        N = x.shape[d]
+        L = h0.size
+        outsize = pywt.dwt_coeff_len(N, L, mode='symmetric')
+        p = 2 * (outsize - 1) - N + L
+        pad_index = self._pad_index(N, p//2, (p+1)//2)
+        xpad_shape = list(x.shape)
+        xpad_shape[d] = len(pad_index)
+        out_shape = [x.shape[0], x.shape[1], 2, *x.shape[2:]]
+        out_shape[d+1] = outsize
+        xpad = self._buffer(f'{name}_pad', xpad_shape)
+        out = self._buffer(f'{name}_out', out_shape)
+        return afb1d(x, h0, h1, dim, pad_index, xpad, out)
+
+    def _forward(self, x, k):
+        """One level of DWTForward, coefficients are views of level buffers"""
+
+        xfm = self.xfm
+        lohi = self._afb1d(x, xfm.h0_row, xfm.h1_row, 3, f'{k}_row')
+        y = self._afb1d(lohi, xfm.h0_col, xfm.h1_col, 2, f'{k}_col')
+        s = y.shape
+        y = y.reshape(s[0], -1, 4, s[-2], s[-1])
+        return y[:, :, 0], y[:, :, 1:]
+
+    def _inverse(self, yl, yh, k):
+        """One level of DWTInverse with level buffers"""
+
+        ifm = self.ifm
+        nz, _, h, w = yl.shape
+        lo = self._buffer(f'{k}_lo', [nz, 2, h, w])
+        hi = self._buffer(f'{k}_hi', [nz, 2, h, w])
+        lo[:, :1] = yl
+        lo[:, 1:] = yh[:, :, 1]
+        hi[:, :1] = yh[:, :, 0]
+        hi[:, 1:] = yh[:, :, 2]
+        L = ifm.g0_col.size
+        out = self._buffer(f'{k}_icol', [nz, 2, (h - 1) * 2 + L, w])
+        lo_hi = sfb1d(lo, hi, ifm.g0_col, ifm.g1_col, dim=2, out=out)
+        h = lo_hi.shape[2]
+        out = self._buffer(f'{k}_irow', [nz, 1, h, (w - 1) * 2 + L])
+        return sfb1d(lo_hi[:, :1], lo_hi[:, 1:], ifm.g0_row, ifm.g1_row, dim=3, out=out)
+
+    def apply(self, data):
+        """Remove stripes from a data chunk [nproj, nz, ni]"""
+
+        [nproj, nz, ni] = data.shape
+        if data.shape != self.shape:
+            self.buffers = {}
+            self.pad_indices = {}
+            self.damps = {}
+            self.shape = data.shape
+
+        nproj_pad = nproj + nproj // 8
+
+        # Wavelet decomposition.
+        cc = []
+        sli = self._buffer('sli', [nz, 1, nproj_pad, ni], zero=True)
+        sli[:, 0, (nproj_pad - nproj)//2:(nproj_pad + nproj) //
+            2] = data.swapaxes(0, 1)
+        for k in range(self.level):
+            sli, c = self._forward(sli, k)
+            cc.append(c)
+            # FFT – use rfft (real input → ~2× faster, half memory)
+            band = c[:, 0, 1]
+            _, my, mx = band.shape
+            fcV = cp.fft.rfft(band, axis=1)          # [nz, my//2+1, mx]
+            fcV *= self._damp(my)[:, None]
+            c[:, 0, 1] = cp.fft.irfft(fcV, my, axis=1)  # always real
+
+        # Wavelet reconstruction.
+        for k in range(self.level)[::-1]:
+            shape0 = cc[k][0, 0, 1].shape
+            sli = sli[:, :, :shape0[0], :shape0[1]]
+            sli = self._inverse(sli, cc[k], k)
+
+        # astype copies, the result does not share memory with the buffers
+        data = sli[:, 0, (nproj_pad - nproj)//2:(nproj_pad + nproj) //
+                   2, :ni].astype(data.dtype)  # modified
+        data = data.swapaxes(0, 1)
+
+        return data
+
+
 def remove_stripe_fw(data, sigma, wname, level):
     """Remove stripes with wavelet filtering"""
 
-    [nproj, nz, ni] = data.shape
-
-    nproj_pad = nproj + nproj // 8
-
-    # Accepts all wave types available to PyWavelets
-    xfm = DWTForward(wave=wname)
-    ifm = DWTInverse(wave=wname)
-
-    # Wavelet decomposition.
-    cc = []
-    sli = cp.zeros([nz, 1, nproj_pad, ni], dtype='float32')
-
-    sli[:, 0, (nproj_pad - nproj)//2:(nproj_pad + nproj) //
-        2] = data.astype('float32').swapaxes(0, 1)
-    for k in range(level):
-        sli, c = xfm.apply(sli)
-        cc.append(c)
-        # FFT – use rfft (real input → ~2× faster, half memory)
-        band = cc[k][:, 0, 1]
-        _, my, mx = band.shape
-        fcV = cp.fft.rfft(band, axis=1)          # [nz, my//2+1, mx]
-        myr = my // 2 + 1
-        y_hat = cp.fft.ifftshift((cp.arange(-my, my, 2) + 1) / 2)[:myr]
-        damp = -cp.expm1(-y_hat**2 / (2 * sigma**2))
-        fcV *= damp[:, None]
-        cc[k][:, 0, 1] = cp.fft.irfft(fcV, my, axis=1)  # always real
-
-    # Wavelet reconstruction.
-    for k in range(level)[::-1]:
-        shape0 = cc[k][0, 0, 1].shape
-        sli = sli[:, :, :shape0[0], :shape0[1]]
-        sli = ifm.apply((sli, cc[k]))
-
-    data = sli[:, 0, (nproj_pad - nproj)//2:(nproj_pad + nproj) //
-               2, :ni].astype(data.dtype)  # modified
-    data = data.swapaxes(0, 1)
-
-    return data
+    return FourierWaveletStripeRemover(sigma, wname, level).apply(data)
 
 ######## Titarenko ring removal ################
 def remove_stripe_ti(data, beta, mask_size):
@@ -386,10 +493,33 @@ def _inverse_perm3(ids):
     return ids2
 
 
-def _rs_sort3(tomo, size, dim):
-    """Batched _rs_sort for 3D input [nproj, nz, ni]."""
+def _reuse_argsort3(t, ids):
+    """Argsort of t along axis=2 starting from a permutation of a previous step.
+
+    ids is kept for columns where it still gives the stable sort order of t,
+    other columns are sorted again, so the result equals cp.argsort(t, axis=2).
+    """
+    ts = cp.take_along_axis(t, ids, axis=2)
+    bad = cp.any((ts[..., 1:] < ts[..., :-1]) |
+                 ((ts[..., 1:] == ts[..., :-1]) & (ids[..., 1:] < ids[..., :-1])), axis=2)
+    del ts
+    bad = cp.nonzero(bad)
+    if len(bad[0]) > 0:
+        ids[bad] = cp.argsort(t[bad], axis=1)
+    return ids
+
+
+def _rs_sort3(tomo, size, dim, ids=None):
+    """Batched _rs_sort for 3D input [nproj, nz, ni].
+
+    ids is an optional argsort permutation of a previous step (_rs_large3),
+    reused for columns whose order did not change.
+    """
     t = cp.transpose(tomo, (2, 1, 0))                              # [ni, nz, nproj]
-    ids = cp.argsort(t, axis=2)
+    if ids is None:
+        ids = cp.argsort(t, axis=2)
+    else:
+        ids = _reuse_argsort3(t, ids)
     matsort_vals = cp.take_along_axis(t, ids, axis=2)
     del t
     if dim == 1:
@@ -401,8 +531,11 @@ def _rs_sort3(tomo, size, dim):
     return cp.transpose(cp.take_along_axis(matsort_vals, ids2, axis=2), (2, 1, 0))
 
 
-def _rs_large3(tomo, snr, size, drop_ratio=0.1, norm=True):
-    """Batched _rs_large for 3D input [nproj, nz, ni]."""
+def _rs_large3(tomo, snr, size, drop_ratio=0.1, norm=True, return_ids=False):
+    """Batched _rs_large for 3D input [nproj, nz, ni].
+
+    With return_ids=True the argsort permutation is also returned for _rs_sort3.
+    """
     drop_ratio = max(min(drop_ratio, 0.8), 0)
     nproj, nz, ni = tomo.shape
     ndrop = int(0.5 * drop_ratio * nproj)
@@ -427,15 +560,18 @@ def _rs_large3(tomo, snr, size, drop_ratio=0.1, norm=True):
     sinosmooth_t = cp.transpose(sinosmooth, (2, 1, 0))            # [ni, nz, nproj]
     del sinosmooth
     ids2 = _inverse_perm3(ids)                                     # O(n) scatter
-    del ids
+    if not return_ids:
+        del ids
     sino_corrected = cp.transpose(
         cp.take_along_axis(sinosmooth_t, ids2, axis=2), (2, 1, 0))  # [nproj, nz, ni]
     del sinosmooth_t, ids2
     cp.copyto(tomo, sino_corrected, where=(listmask[None] > 0.0))
+    if return_ids:
+        return tomo, ids
     return tomo
 
 
-def _rs_dead3(tomo, snr, size, norm=True):
+def _rs_dead3(tomo, snr, size, norm=True, return_ids=False):
     """Batched _rs_dead for 3D input [nproj, nz, ni]."""
     tomo = cp.copy(tomo)
     nproj, nz, ni = tomo.shape
@@ -449,19 +585,29 @@ def _rs_dead3(tomo, snr, size, norm=True):
         structure=cp.ones((1, 3), dtype=bool)).astype(listmask.dtype)
     listmask[:, 0:2] = 0.0
     listmask[:, -2:] = 0.0
-    for m in range(nz):
-        listx = cp.where(listmask[m] < 1.0)[0]
-        listxmiss = cp.where(listmask[m] > 0.0)[0]
-        if len(listxmiss) > 0:
-            matz = tomo[:, m, listx]
-            ids = cp.searchsorted(listx, listxmiss)
-            tomo[:, m, listxmiss] = (
-                matz[:, ids - 1] +
-                (listxmiss - listx[ids - 1]) *
-                (matz[:, ids] - matz[:, ids - 1]) /
-                (listx[ids] - listx[ids - 1]))
+    # linear interpolation of dead columns for all rows at once,
+    # neighbours are found by gathering with the cumulative count of good columns
+    good = listmask < 1.0
+    zmiss, xmiss = cp.nonzero(listmask > 0.0)
+    if len(xmiss) > 0:
+        zgood, xgood = cp.nonzero(good)
+        cnt = cp.cumsum(good, axis=1)
+        listx = cp.empty([nz, ni], dtype=xgood.dtype)
+        listx[zgood, cnt[zgood, xgood] - 1] = xgood
+        ids = cnt[zmiss, xmiss]
+        xl = listx[zmiss, ids - 1]
+        xr = listx[zmiss, ids]
+        matl = tomo[:, zmiss, xl]
+        matr = tomo[:, zmiss, xr]
+        tomo[:, zmiss, xmiss] = (
+            matl +
+            (xmiss - xl) *
+            (matr - matl) /
+            (xr - xl))
     if norm:
-        tomo = _rs_large3(tomo, snr, size)
+        return _rs_large3(tomo, snr, size, return_ids=return_ids)
+    if return_ids:
+        return tomo, None
     return tomo
 
 
@@ -493,6 +639,6 @@ def remove_all_stripe(tomo,
     ndarray
         Corrected 3D tomographic data.
     """
-    tomo = _rs_dead3(tomo, snr, la_size)
-    tomo = _rs_sort3(tomo, sm_size, dim)
+    tomo, ids = _rs_dead3(tomo, snr, la_size, return_ids=True)
+    tomo = _rs_sort3(tomo, sm_size, dim, ids)
     return tomo
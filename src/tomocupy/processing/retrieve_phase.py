@@ -41,10 +41,11 @@
 ''' Paganin phase retrieval implementation 
 '''
 
+import math
 import cupy as cp
-from cupy.fft import fft2, ifft2
+import cupyx.scipy.fft as cufft
 
-__all__ = ['paganin_filter', ]
+__all__ = ['PhaseRetrieval', 'paganin_filter', ]
 
 BOLTZMANN_CONSTANT = 1.3806488e-16  # [erg/k]
 SPEED_OF_LIGHT = 299792458e+2  # [cm/s]
@@ -56,6 +57,156 @@ def _wavelength(energy):
     return 2 * PI * PLANCK_CONSTANT * SPEED_OF_LIGHT / energy
 
 
+class PhaseRetrieval():
+    """Phase retrieval engine keeping filters and FFT workspaces between chunks.
+
+    The filter depends only on the geometry and the chunk shape, so it is
+    built for the first chunk and rebuilt only when the shape changes.
+    Projections are filtered by batches with one batched FFT per batch,
+    the padded complex workspace and the cuFFT plan are reused.
+
+    Parameters
+    ----------
+    method : str
+        'paganin', 'Gpaganin', 'farago' or 'FF' (Fourier filter).
+    pixel_size : float, optional
+        Detector pixel size in cm.
+    dist : float, optional
+        Propagation distance of the wavefront in cm.
+    energy : float, optional
+        Energy of incident wave in keV.
+    alpha : float, optional
+        Regularization parameter for Paganin method.
+    db : float, optional
+        delta/beta for generalized Paganin and Farago phase retrieval
+    W : float, optional
+        Characteristic transverse lenght scale for generalized Paganin
+    pad : bool, optional
+        If True, extend the size of the projections by edge padding.
+    ratio, dim, ff_pad, apply_log, window : optional
+        Window shape, filtering dimension, padding width, log flag and
+        custom window for the Fourier filter, see :func:`fresnel_filter`.
+    workspace_bytes : int, optional
+        Size limit of the complex FFT workspace, defines the batch size.
+    """
+
+    def __init__(self, method='paganin', pixel_size=1e-4, dist=50, energy=20, alpha=1e-3, db=1000, W=2e-4,
+                 pad=True, ratio=100, dim=2, ff_pad=150, apply_log=True, window=None, workspace_bytes=2**28):
+        if method == 'FourierFilter':
+            method = 'FF'
+        self.method = method
+        self.pixel_size = pixel_size
+        self.dist = dist
+        self.energy = energy
+        self.alpha = alpha
+        self.db = db
+        self.W = W
+        self.pad = pad
+        self.ratio = ratio
+        self.dim = int(dim)
+        self.ff_pad = int(ff_pad)
+        self.apply_log = apply_log
+        self.window = window
+        self.workspace_bytes = workspace_bytes
+        self.key = None
+
+    def __call__(self, data):
+        """Filter a data chunk in place"""
+
+        if self.method == 'FF':
+            if self.apply_log:
+                cp.log(data, out=data)
+                data *= -1
+            if self.dim == 2:
+                # projections stored as data[m, :, :]
+                self._filter(data)
+            else:
+                # sinograms stored as data[:, m, :]
+                self._filter(cp.moveaxis(data, 1, 0))
+            if self.apply_log:
+                data *= -1
+                cp.exp(data, out=data)
+        else:
+            self._filter(data)
+        return data
+
+    def _filter(self, data):
+        """Filter data[m] for all m by batches"""
+
+        self._prepare(data.shape, data.dtype)
+        nz, n = data.shape[1:]
+        py, pz = self.py, self.pz
+        for st in range(0, data.shape[0], self.nbatch):
+            end = min(st+self.nbatch, data.shape[0])
+            w = self.workspace[:end-st]
+            # edge padding
+            w[:, py:py+nz, pz:pz+n] = data[st:end]
+            w[:, :py, pz:pz+n] = data[st:end, :1]
+            w[:, py+nz:, pz:pz+n] = data[st:end, -1:]
+            w[:, :, :pz] = w[:, :, pz:pz+1]
+            w[:, :, pz+n:] = w[:, :, pz+n-1:pz+n]
+            plan = self.plan if end-st == self.nbatch else None
+            if self.axes == (1, 2):
+                w = cufft.fft2(w, axes=self.axes, overwrite_x=True, plan=plan)
+                w *= self.phase_filter
+                w = cufft.ifft2(w, axes=self.axes, overwrite_x=True, plan=plan)
+            else:
+                w = cufft.fft(w, axis=-1, overwrite_x=True, plan=plan)
+                w *= self.phase_filter
+                w = cufft.ifft(w, axis=-1, overwrite_x=True, plan=plan)
+            data[st:end] = w[:, py:py+nz, pz:pz+n].real
+
+    def _prepare(self, shape, dtype):
+        """Build the filter, workspace and FFT plan for a chunk shape"""
+
+        nproj, nz, n = shape
+        key = (nz, n, cp.dtype(dtype))
+        if key == self.key:
+            return
+        self.axes = (1, 2)
+        if self.method == 'FF':
+            p = self.ff_pad
+            window = self.window
+            if window is None:
+                window = make_fresnel_window(nz, n, self.ratio, self.dim)
+            if self.dim == 2:
+                self.py, self.pz = p, p
+                window = cp.pad(window, p, mode='edge')
+                self.phase_filter = 1/cp.fft.ifftshift(window)
+            else:
+                self.py, self.pz = 0, p
+                window = cp.pad(window, ((0, 0), (p, p)), mode='edge')
+                self.phase_filter = 1/cp.fft.ifftshift(window, axes=1)
+                self.axes = (2,)
+        else:
+            self.py, self.pz = _calc_pad(nz, n, self.pixel_size, self.dist, self.energy, self.pad)
+            ny, nx = nz + 2 * self.py, n + 2 * self.pz
+            if self.method == 'paganin':
+                w2 = _reciprocal_grid(self.pixel_size, ny, nx)
+                phase_filter = cp.fft.fftshift(
+                    _paganin_filter_factor(self.energy, self.dist, self.alpha, w2))
+            elif self.method == 'Gpaganin':
+                kf = _reciprocal_gridG(self.pixel_size, ny, nx)
+                phase_filter = cp.fft.fftshift(
+                    _paganin_filter_factorG(self.energy, self.dist, kf, self.pixel_size, self.db, self.W))
+            elif self.method == 'farago':
+                w2 = _reciprocal_grid(self.pixel_size, ny, nx)
+                phase_filter = cp.fft.fftshift(
+                    _farago_filter_factor(self.energy, self.dist, self.db, w2))
+            self.phase_filter = phase_filter / phase_filter.max()
+        if cp.dtype(dtype) == cp.float64:
+            rtype, ctype = cp.float64, cp.complex128
+        else:
+            rtype, ctype = cp.float32, cp.complex64
+        self.phase_filter = self.phase_filter.astype(rtype)
+        size = (nz + 2 * self.py) * (n + 2 * self.pz) * cp.dtype(ctype).itemsize
+        self.nbatch = int(max(1, min(nproj, self.workspace_bytes // size)))
+        self.workspace = None
+        self.workspace = cp.empty([self.nbatch, nz + 2 * self.py, n + 2 * self.pz], dtype=ctype)
+        self.plan = cufft.get_fft_plan(self.workspace, axes=self.axes)
+        self.key = key
+
+
 def paganin_filter(
         data, pixel_size=1e-4, dist=50, energy=20, alpha=1e-3, method='paganin', db=1000, W=2e-4, pad=True):
     """
@@ -88,24 +239,8 @@ def paganin_filter(
         Approximated 3D tomographic phase data.
     """
 
-    # New dimensions and pad value after padding.
-    py, pz, val = _calc_pad(data, pixel_size, dist, energy, pad)
-
-    # Compute the reciprocal grid.
-    dx, dy, dz = data.shape
-    if method == 'paganin':
-        w2 = _reciprocal_grid(pixel_size, dy + 2 * py, dz + 2 * pz)
-        phase_filter = cp.fft.fftshift(
-            _paganin_filter_factor(energy, dist, alpha, w2))
-    elif method == 'Gpaganin':
-        kf = _reciprocal_gridG(pixel_size, dy + 2 * py, dz + 2 * pz)
-        phase_filter = cp.fft.fftshift(
-            _paganin_filter_factorG(energy, dist, kf, pixel_size, db, W))
+    return PhaseRetrieval(method, pixel_size, dist, energy, alpha=alpha, db=db, W=W, pad=pad)(data)
 
-    prj = cp.full((dy + 2 * py, dz + 2 * pz), val, dtype=data.dtype)
-    _retrieve_phase(data, phase_filter, py, pz, prj, pad)
-
-    return data
 
 def farago_filter(
         data, pixel_size=1e-4, dist=50, energy=20, db=1000, method='farago', pad=True):
@@ -135,48 +270,17 @@ def farago_filter(
         Approximated 3D tomographic phase data.
     """
 
-    # New dimensions and pad value after padding.
-    py, pz, val = _calc_pad(data, pixel_size, dist, energy, pad)
-
-    # Compute the reciprocal grid.
-    dx, dy, dz = data.shape
-    w2 = _reciprocal_grid(pixel_size, dy + 2 * py, dz + 2 * pz)
-    phase_filter = cp.fft.fftshift(
-        _farago_filter_factor(energy, dist, db, w2))
-
-    prj = cp.full((dy + 2 * py, dz + 2 * pz), val, dtype=data.dtype)
-    _retrieve_phase(data, phase_filter, py, pz, prj, pad)
-
-    return data
-
-
-def _retrieve_phase(data, phase_filter, px, py, prj, pad):
-    dx, dy, dz = data.shape
-    num_jobs = data.shape[0]
-    normalized_phase_filter = phase_filter / phase_filter.max()
-
-    for m in range(num_jobs):
-        prj[px:dy + px, py:dz + py] = data[m]
-        prj[:px] = prj[px]
-        prj[-px:] = prj[-px-1]
-        prj[:, :py] = prj[:, py][:, cp.newaxis]
-        prj[:, -py:] = prj[:, -py-1][:, cp.newaxis]
-        fproj = fft2(prj)
-        fproj *= normalized_phase_filter
-        proj = cp.real(ifft2(fproj))
-        if pad:
-            proj = proj[px:dy + px, py:dz + py]
-        data[m] = proj
+    return PhaseRetrieval(method, pixel_size, dist, energy, db=db, pad=pad)(data)
 
 
-def _calc_pad(data, pixel_size, dist, energy, pad):
+def _calc_pad(ny, nz, pixel_size, dist, energy, pad):
     """
-    Calculate new dimensions and pad value after padding.
+    Calculate pad widths.
 
     Parameters
     ----------
-    data : ndarray
-        3D tomographic data.
+    ny, nz : int
+        Projection sizes.
     pixel_size : float
         Detector pixel size in cm.
     dist : float
@@ -184,7 +288,7 @@ def _calc_pad(data, pixel_size, dist, energy, pad):
     energy : float
         Energy of incident wave in keV.
     pad : bool
-        If True, extend the size of the projections by padding with zeros.
+        If True, extend the size of the projections by padding.
 
     Returns
     -------
@@ -192,18 +296,14 @@ def _calc_pad(data, pixel_size, dist, energy, pad):
         Pad amount in projection axis.
     int
         Pad amount in sinogram axis.
-    float
-        Pad value.
     """
-    dx, dy, dz = data.shape
     wavelength = _wavelength(energy)
-    py, pz, val = 0, 0, 0
+    py, pz = 0, 0
     if pad:
-        val = _calc_pad_val(data)
-        py = _calc_pad_width(dy, pixel_size, wavelength, dist)
-        pz = _calc_pad_width(dz, pixel_size, wavelength, dist)
+        py = _calc_pad_width(ny, pixel_size, wavelength, dist)
+        pz = _calc_pad_width(nz, pixel_size, wavelength, dist)
 
-    return py, pz, val
+    return py, pz
 
 
 def _paganin_filter_factor(energy, dist, alpha, w2):
@@ -223,12 +323,8 @@ def _paganin_filter_factorG(energy, dist, kf, pixel_size, db, W):
 
 
 def _calc_pad_width(dim, pixel_size, wavelength, dist):
-    pad_pix = cp.ceil(PI * wavelength * dist / pixel_size ** 2)
-    return int((pow(2, cp.ceil(cp.log2(dim + pad_pix))) - dim) * 0.5)
-
-
-def _calc_pad_val(data):
-    return cp.mean((data[..., 0] + data[..., -1]) * 0.5)
+    pad_pix = math.ceil(PI * wavelength * dist / pixel_size ** 2)
+    return int((pow(2, math.ceil(math.log2(dim + pad_pix))) - dim) * 0.5)
 
 
 def _reciprocal_grid(pixel_size, nx, ny):
@@ -374,41 +470,4 @@ def fresnel_filter(data, ratio, dim, window=None, pad=150, apply_log=True):
 
     [2] : https://tinyurl.com/2f8nv875
     """
-    if apply_log:
-        data = -cp.log(data)
-
-    if dim == 2:
-        (nrow, ncol, num_jobs) = data.shape
-    else:    
-        (nrow, num_jobs, ncol) = data.shape
-    #create FF window
-    if window is None:
-        if dim == 2:  # On projections
-            window = make_fresnel_window(nrow, ncol, ratio, dim)
-        else:
-            window = make_fresnel_window(nrow, ncol, ratio, dim)       
-
-    for m in range(num_jobs):
-        mat = data[:, m, :] if dim != 2 else data[:, :, m]
-        if dim == 2:
-            mat_pad = cp.pad(data[:, :, m], pad, mode="edge")
-            win_pad = cp.pad(window, pad, mode="edge")
-            #win_pad = cp.repeat(win_pad[:,:,cp.newaxis], num_jobs,axis=2)
-            mat_dec = cp.fft.ifft2(cp.fft.fft2(mat_pad) / cp.fft.ifftshift(win_pad))
-            mat_dec = cp.real(mat_dec[pad:pad + nrow, pad:pad + ncol])
-            data[:, :, m] = mat_dec
-        else:  # On sinograms
-            mat_pad = cp.pad(data[:, m, :], ((0, 0), (pad, pad)), mode='edge')
-            win_pad = cp.pad(window, ((0, 0), (pad, pad)), mode="edge")
-            #win_pad = cp.repeat(win_pad[:,cp.newaxis,:], num_jobs,axis=1)
-            mat_fft = cp.fft.fftshift(cp.fft.fft(mat_pad), axes=1) / win_pad
-            mat_dec = cp.fft.ifft(cp.fft.ifftshift(mat_fft, axes=1))
-            mat_dec = cp.real(mat_dec[:, pad:pad + ncol])
-            data[:, m, :] = mat_dec
-
-    if apply_log:
-        data = cp.exp(-data)
-
-    return data
-    
-    
+    return PhaseRetrieval('FF', ratio=ratio, dim=dim, ff_pad=pad, apply_log=apply_log, window=window)(data)
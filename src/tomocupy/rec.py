@@ -66,24 +66,24 @@ class GPURec():
     The implemented reconstruction method is Fourier-based with exponential functions for interpoaltion in the frequency domain (implemented with CUDA C).
     '''
 
-    def __init__(self, cl_reader, cl_writer, cache_to_infer=False):
+    def __init__(self, cl_reader, cl_writer, cache_to_infer=False, cache=None):
 
         # Set ^C, ^Z interrupt to abort and deallocate memory on GPU
         signal.signal(signal.SIGINT, utils.signal_handler)
         signal.signal(signal.SIGTERM, utils.signal_handler)
 
-        # # use pinned memory
-        cp.cuda.set_pinned_memory_allocator(cp.cuda.PinnedMemoryPool().malloc)
-
         # chunks for processing
         self.shape_data_chunk = (params.nproj, params.ncz, params.ni)
-        self.shape_recon_chunk = (params.ncz, params.n, params.n)
+        self.shape_recon_chunk = (params.ncz, *params.shape_rec_slice)
         self.shape_dark_chunk = (params.ndark, params.ncz, params.ni)
         self.shape_flat_chunk = (params.nflat, params.ncz, params.ni)
 
-        # init tomo functions
-        self.cl_proc_func = proc_functions.ProcFunctions()
-        self.cl_backproj_func = backproj_functions.BackprojFunctions()
+        # init tomo functions, or take them from the cache of a running server (tomocupy serve)
+        if cache is not None:
+            self.cl_proc_func, self.cl_backproj_func = cache.get()
+        else:
+            self.cl_proc_func = proc_functions.ProcFunctions()
+            self.cl_backproj_func = backproj_functions.BackprojFunctions()
 
         # streams for overlapping data transfers with computations
         self.stream1 = cp.cuda.Stream(non_blocking=False)
@@ -110,10 +110,20 @@ class GPURec():
         self.cl_reader = cl_reader
         self.cl_writer = cl_writer
         self.cache_to_infer = cache_to_infer
+        # number of rows from neighbouring chunks used for phase retrieval
+        params.phase_halo = min(args.retrieve_phase_pad, params.ncz)
+        if args.retrieve_phase_method != 'none' and params.phase_halo < args.retrieve_phase_pad:
+            log.warning(
+                f'Phase retrieval z halo is limited by the chunk size, using {params.phase_halo} rows')
+        # in the AI center search try slices are kept in memory, writing tiffs is optional
+        self.write_try = not cache_to_infer or args.infer_save_try
 
     def recon_all(self):
         """Reconstruction of data from an h5file by splitting into sinogram chunks"""
 
+        if args.retrieve_phase_method != 'none':
+            return self.recon_all_phase()
+
         # start readint to the queue
         self.main_read_thread.start()
 
@@ -123,16 +133,16 @@ class GPURec():
         nzchunk = params.nzchunk
         lzchunk = params.lzchunk
         ncz = params.ncz
-        nproj = params.nproj
+        nproj = params.nproj_rec  # projections to reconstruct, after double_fov stitching
 
         # pinned memory for data item
         item_pinned = {}
-        item_pinned['data'] = utils.pinned_array(
-            np.zeros([2, *self.shape_data_chunk], dtype=in_dtype))
-        item_pinned['dark'] = utils.pinned_array(
-            np.zeros([2, *self.shape_dark_chunk], dtype=in_dtype))
-        item_pinned['flat'] = utils.pinned_array(
-            np.ones([2, *self.shape_flat_chunk], dtype=in_dtype))
+        item_pinned['data'] = utils.pinned_arena.array(
+            'rec.data', [2, *self.shape_data_chunk], in_dtype, fill=0)
+        item_pinned['dark'] = utils.pinned_arena.array(
+            'rec.dark', [2, *self.shape_dark_chunk], in_dtype, fill=0)
+        item_pinned['flat'] = utils.pinned_arena.array(
+            'rec.flat', [2, *self.shape_flat_chunk], in_dtype, fill=1)
 
         # gpu memory for data item
         item_gpu = {}
@@ -144,8 +154,8 @@ class GPURec():
             [2, *self.shape_flat_chunk], dtype=in_dtype)
 
         # pinned memory for reconstrution
-        rec_pinned = utils.pinned_array(
-            np.zeros([args.max_write_threads, *self.shape_recon_chunk], dtype=dtype))
+        rec_pinned = utils.pinned_arena.array(
+            'rec.rec', [args.max_write_threads, *self.shape_recon_chunk], dtype)
         # gpu memory for reconstrution
         rec_gpu = cp.zeros([2, *self.shape_recon_chunk], dtype=dtype)
 
@@ -174,7 +184,7 @@ class GPURec():
                     data = self.cl_proc_func.proc_proj(data, st, end, res=proj_res)
                     data_t[:] = data.swapaxes(0, 1)
                     data_t = self.cl_backproj_func.fbp_filter_center(data_t, sht)
-                    self.cl_backproj_func.cl_rec.backprojection(
+                    self.cl_backproj_func.backprojection(
                         rec, data_t, self.stream2)
 
             if (k > 1):
@@ -186,9 +196,10 @@ class GPURec():
                 # copy to pinned memory
                 item = self.data_queue.get()
                 ids.append(item['id'])
-                item_pinned['data'][k % 2, :, :lzchunk[ids[k]]] = item['data']
-                item_pinned['dark'][k % 2, :, :lzchunk[ids[k]]] = item['dark']
-                item_pinned['flat'][k % 2, :, :lzchunk[ids[k]]] = item['flat']
+                # chunks from memory-mapped files are read here by the copy pool threads
+                utils.copy(item['data'], item_pinned['data'][k % 2, :, :lzchunk[ids[k]]])
+                utils.copy(item['dark'], item_pinned['dark'][k % 2, :, :lzchunk[ids[k]]])
+                utils.copy(item['flat'], item_pinned['flat'][k % 2, :, :lzchunk[ids[k]]])
 
                 with self.stream1:  # cpu->gpu copy
                     item_gpu['data'][k % 2].set(item_pinned['data'][k % 2])
@@ -208,6 +219,142 @@ class GPURec():
         for t in self.write_threads:
             t.join()
 
+    def get_chunk_ordered(self, pending, k):
+        """Get the kth data chunk from the queue, keeping chunks read out of order in pending"""
+
+        while k not in pending:
+            item = self.data_queue.get()
+            pending[item['id']] = item
+        return pending.pop(k)
+
+    def recon_all_phase(self):
+        """Reconstruction of data from an h5file by splitting into sinogram chunks, with phase retrieval.
+
+        Phase retrieval filters projections in 2D, so each chunk is extended in z by a halo
+        of params.phase_halo rows on both sides before filtering, and the halo is cropped afterwards.
+        The halo rows are taken from the neighbouring chunks already on GPU (the tail of the previous
+        chunk is kept in a separate buffer), therefore no rows are read twice. Processing of a chunk
+        is delayed until the next chunk is dark-flat corrected, and chunks are processed in order.
+        """
+
+        # start readint to the queue
+        self.main_read_thread.start()
+
+        # refs for faster access
+        dtype = params.dtype
+        in_dtype = params.in_dtype
+        nzchunk = params.nzchunk
+        lzchunk = params.lzchunk
+        ncz = params.ncz
+        nproj = params.nproj
+        h = params.phase_halo
+
+        # pinned memory for data item
+        item_pinned = {}
+        item_pinned['data'] = utils.pinned_arena.array(
+            'rec.data', [2, *self.shape_data_chunk], in_dtype, fill=0)
+        item_pinned['dark'] = utils.pinned_arena.array(
+            'rec.dark', [2, *self.shape_dark_chunk], in_dtype, fill=0)
+        item_pinned['flat'] = utils.pinned_arena.array(
+            'rec.flat', [2, *self.shape_flat_chunk], in_dtype, fill=1)
+
+        # gpu memory for data item
+        item_gpu = {}
+        item_gpu['data'] = cp.zeros(
+            [2, *self.shape_data_chunk], dtype=in_dtype)
+        item_gpu['dark'] = cp.zeros(
+            [2, *self.shape_dark_chunk], dtype=in_dtype)
+        item_gpu['flat'] = cp.ones(
+            [2, *self.shape_flat_chunk], dtype=in_dtype)
+
+        # pinned memory for reconstrution
+        rec_pinned = utils.pinned_arena.array(
+            'rec.rec', [args.max_write_threads, *self.shape_recon_chunk], dtype)
+        # gpu memory for reconstrution
+        rec_gpu = cp.zeros([2, *self.shape_recon_chunk], dtype=dtype)
+
+        # gpu memory for dark-flat corrected chunks, the extended chunk, and the halo from the previous chunk
+        sino_res = cp.zeros([2, *self.shape_data_chunk], dtype=dtype)
+        ext = cp.zeros((nproj, ncz+2*h, params.ni), dtype=dtype)
+        halo_top = cp.zeros((nproj, h, params.ni), dtype=dtype)
+
+        # pre-allocate intermediate GPU buffers to avoid per-chunk allocation
+        proj_res = cp.zeros((params.nproj_rec, ncz, params.n), dtype=dtype)
+        data_t = cp.empty((ncz, params.nproj_rec, params.n), dtype=dtype)
+        sht = cp.zeros(ncz, dtype='float32')
+
+        pending = {}
+        log.info(f'Full reconstruction with phase retrieval, z halo {h} rows')
+        # Conveyor for data cpu-gpu copy, processing with delay by 1 chunk, and reconstruction
+        for k in range(nzchunk+3):
+            utils.printProgressBar(
+                k, nzchunk+2, self.data_queue.qsize(), length=40)
+            if (k > 0 and k < nzchunk+1):
+                with self.stream2:  # dark-flat correction etc. of chunk k-1
+                    self.cl_proc_func.proc_sino(item_gpu['data'][(k-1) % 2], item_gpu['dark'][(k-1) % 2],
+                                                item_gpu['flat'][(k-1) % 2], res=sino_res[(k-1) % 2])
+            if (k > 1 and k < nzchunk+2):
+                with self.stream2:  # phase retrieval and reconstruction of chunk k-2
+                    j = k-2
+                    lz = lzchunk[j]
+                    cur = sino_res[j % 2]
+                    # top halo: tail of the previous chunk or replicated first row
+                    if j == 0:
+                        ext[:, :h] = cur[:, :1]
+                    else:
+                        ext[:, :h] = halo_top
+                    ext[:, h:h+lz] = cur[:, :lz]
+                    # bottom halo: head of the next chunk or replicated last row
+                    if j < nzchunk-1:
+                        hn = min(h, lzchunk[j+1])
+                        ext[:, h+lz:h+lz+hn] = sino_res[(j+1) % 2][:, :hn]
+                        ext[:, h+lz+hn:] = ext[:, h+lz+hn-1:h+lz+hn]
+                        # keep the tail of the current chunk as the top halo for the next one
+                        halo_top[:] = cur[:, lz-h:lz]
+                    else:
+                        ext[:, h+lz:] = cur[:, lz-1:lz]
+
+                    self.cl_proc_func.retrieve_phase(ext)
+                    rec = rec_gpu[j % 2]
+                    st = j*ncz+args.start_row//2**args.binning
+                    end = st+lz
+                    data = self.cl_proc_func.proc_proj(
+                        ext[:, h:h+ncz], st, end, res=proj_res, phase=False)
+                    data_t[:] = data.swapaxes(0, 1)
+                    data_t = self.cl_backproj_func.fbp_filter_center(data_t, sht)
+                    self.cl_backproj_func.backprojection(
+                        rec, data_t, self.stream2)
+
+            if (k > 2):
+                with self.stream3:  # gpu->cpu copy
+                    # find free thread
+                    ithread = utils.find_free_thread(self.write_threads)
+                    rec_gpu[(k-3) % 2].get(out=rec_pinned[ithread])
+            if (k < nzchunk):
+                # copy to pinned memory
+                item = self.get_chunk_ordered(pending, k)
+                utils.copy(item['data'], item_pinned['data'][k % 2, :, :lzchunk[k]])
+                utils.copy(item['dark'], item_pinned['dark'][k % 2, :, :lzchunk[k]])
+                utils.copy(item['flat'], item_pinned['flat'][k % 2, :, :lzchunk[k]])
+
+                with self.stream1:  # cpu->gpu copy
+                    item_gpu['data'][k % 2].set(item_pinned['data'][k % 2])
+                    item_gpu['dark'][k % 2].set(item_pinned['dark'][k % 2])
+                    item_gpu['flat'][k % 2].set(item_pinned['flat'][k % 2])
+            self.stream3.synchronize()
+            if (k > 2):
+                # add a new thread for writing to hard disk (after gpu->cpu copy is done)
+                st = (k-3)*ncz+args.start_row//2**args.binning
+                end = st+lzchunk[k-3]
+                self.write_threads[ithread].run(
+                    self.cl_writer.write_data_chunk, (rec_pinned[ithread], st, end, k-3))
+
+            self.stream1.synchronize()
+            self.stream2.synchronize()
+
+        for t in self.write_threads:
+            t.join()
+
     def recon_try(self):
         """GPU reconstruction of 1 slice for different centers"""
 
@@ -234,8 +381,8 @@ class GPURec():
             ncz = params.ncz
 
             # pinned memory for reconstrution
-            rec_pinned = utils.pinned_array(
-                np.zeros([args.max_write_threads, *self.shape_recon_chunk], dtype=dtype))
+            rec_pinned = utils.pinned_arena.array(
+                'rec.rec', [args.max_write_threads, *self.shape_recon_chunk], dtype)
             # gpu memory for reconstrution
             rec_gpu = cp.zeros([2, *self.shape_recon_chunk], dtype=dtype)
 
@@ -243,11 +390,12 @@ class GPURec():
             datat = cp.empty((ncz, data.shape[1], data.shape[2]), dtype=data.dtype)
             sht = cp.zeros(ncz, dtype='float32')
 
-            # Conveyor for data cpu-gpu copy and reconstruction
+            # preallocated in-memory cache of try slices for the AI center search
             if self.cache_to_infer:
-                img_cache = []
-                center_of_rotation_cache = []
-                id_slice_cache = []
+                img_cache = np.empty(
+                    [len(params.shift_array), *self.shape_recon_chunk[1:]], dtype=dtype)
+
+            # Conveyor for data cpu-gpu copy and reconstruction
             for k in range(nschunk+2):
                 utils.printProgressBar(
                     k, nschunk+1, self.data_queue.qsize(), length=40)
@@ -268,23 +416,23 @@ class GPURec():
                         rec_gpu[(k-2) % 2].get(out=rec_pinned[ithread])
                 self.stream3.synchronize()
                 if (k > 1):
-                    # add a new thread for writing to hard disk (after gpu->cpu copy is done)
-                    for kk in range(lschunk[k-2]):
-                        self.write_threads[ithread].run(self.cl_writer.write_data_try, (
-                            rec_pinned[ithread, kk], params.save_centers[(k-2)*ncz+kk], id_slice))
-                        if self.cache_to_infer:
-                            img_cache.append(np.copy(rec_pinned[ithread, kk:kk+1]))
-                            center_of_rotation_cache.append(params.save_centers[(k-2)*ncz+kk])
-                            id_slice_cache.append(id_slice)
+                    st = (k-2)*ncz
+                    end = st+lschunk[k-2]
+                    if self.cache_to_infer:
+                        img_cache[st:end] = rec_pinned[ithread, :end-st]
+                    if self.write_try:
+                        # add a new thread for writing to hard disk (after gpu->cpu copy is done)
+                        for kk in range(lschunk[k-2]):
+                            self.write_threads[ithread].run(self.cl_writer.write_data_try, (
+                                rec_pinned[ithread, kk], params.save_centers[st+kk], id_slice))
 
                 self.stream1.synchronize()
                 self.stream2.synchronize()
 
             for t in self.write_threads:
                 t.join()
-            
+
             if self.cache_to_infer:
-                img_cache = np.concatenate(img_cache,axis=0)
-                center_of_rotation_cache = np.array(center_of_rotation_cache)
-                id_slice_cache = np.array(id_slice_cache)
+                center_of_rotation_cache = np.array(params.save_centers)
+                id_slice_cache = np.full(len(img_cache), id_slice)
                 return img_cache, center_of_rotation_cache,id_slice_cache
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# *************************************************************************** #
+#                  Copyright © 2022, UChicago Argonne, LLC                    #
+#                           All Rights Reserved                               #
+#                         Software Name: Tomocupy                             #
+#                     By: Argonne National Laboratory                         #
+#                                                                             #
+#                           OPEN SOURCE LICENSE                               #
+#                                                                             #
+# Redistribution and use in source and binary forms, with or without          #
+# modification, are permitted provided that the following conditions are met: #
+#                                                                             #
+# 1. Redistributions of source code must retain the above copyright notice,   #
+#    this list of conditions and the following disclaimer.                    #
+# 2. Redistributions in binary form must reproduce the above copyright        #
+#    notice, this list of conditions and the following disclaimer in the      #
+#    documentation and/or other materials provided with the distribution.     #
+# 3. Neither the name of the copyright holder nor the names of its            #
+#    contributors may be used to endorse or promote products derived          #
+#    from this software without specific prior written permission.            #
+#                                                                             #
+#                                                                             #
+# *************************************************************************** #
+#                               DISCLAIMER                                    #
+#                                                                             #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS         #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT           #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS           #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,      #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED    #
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR      #
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF      #
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING        #
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS          #
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.                #
+# *************************************************************************** #
+
+from tomocupy import utils
+from tomocupy import logging
+from tomocupy.processing import proc_functions
+from tomocupy.reconstruction import backproj_functions
+from tomocupy.global_vars import args, params
+
+import cupy as cp
+import numpy as np
+import signal
+import time
+
+__author__ = "Viktor Nikitin"
+__copyright__ = "Copyright (c) 2022, UChicago Argonne, LLC."
+__docformat__ = 'restructuredtext en'
+__all__ = ['GPURecPreview', ]
+
+
+log = logging.getLogger(__name__)
+
+
+class GPURecPreview():
+    '''
+    Class for a quick preview of a few slices (--nsino) refined as more projections are processed.
+    Reconstruction is linear in projections, so projection chunks are filtered and backprojected with linerec
+    into accumulated slices without recomputing them. Projections are taken in interleaved angular subsets
+    (--preview-subsets), or in the order of arrival when streaming. Slices are written after every
+    nproj/preview-subsets new projections.
+    Preview rows are not adjacent, so phase retrieval and projection rotation are not supported.
+    Stripe removal works on whole sinogram chunks and is not applied, otherwise after the last subset
+    the preview matches the full reconstruction.
+    '''
+
+    def __init__(self, cl_reader, cl_writer):
+
+        if args.retrieve_phase_method != 'none' or args.rotate_proj_angle != 0:
+            raise RuntimeError('Preview is supported without phase retrieval and projection rotation')
+        if args.remove_stripe_method != 'none':
+            log.warning(f'Stripe removal ({args.remove_stripe_method}) is not applied in preview')
+
+        # Set ^C, ^Z interrupt to abort and deallocate memory on GPU
+        signal.signal(signal.SIGINT, utils.signal_handler)
+        signal.signal(signal.SIGTERM, utils.signal_handler)
+
+        # binned rows of the preview slices
+        self.id_slices = np.unique(params.id_slices)
+        self.rows = np.clip((self.id_slices-args.start_row)//2**args.binning, 0, params.nz-1)
+
+        # init tomo functions
+        self.cl_proc_func = proc_functions.ProcFunctions()
+        self.cl_backproj_func = backproj_functions.PreviewFunctions(len(self.rows))
+
+        self.cl_reader = cl_reader
+        self.cl_writer = cl_writer
+
+    def recon_preview(self):
+        """Preview reconstruction with accumulating projection chunks"""
+
+        nrows = len(self.rows)
+        ncproj = params.ncproj
+        stream = cp.cuda.get_current_stream()
+
+        flat, dark = self.cl_reader.read_rows_flat_dark(self.rows)
+        flat = self.cl_proc_func.remove_outliers(cp.array(flat))
+        dark = self.cl_proc_func.remove_outliers(cp.array(dark))
+        # binned detector rows of the preview slices, as st:end in full reconstruction
+        rows = self.rows+args.start_row//2**args.binning
+        theta_gpu = cp.array(params.theta)
+
+        # projection chunks are padded to ncproj, zero data does not change the reconstruction
+        data_chunk = cp.zeros([nrows, ncproj, params.n], dtype=params.dtype)
+        theta_chunk = cp.zeros([ncproj], dtype='float32')
+        rec = cp.zeros([nrows, params.n, params.n], dtype=params.dtype)
+
+        nrec = 0
+        nwrite = max(1, params.nproj//args.preview_subsets)
+        t = time.time()
+        for pos, data in self.cl_reader.read_rows_chunks(self.rows, args.preview_subsets):
+            # outliers are removed in raw data, as in proc_sino
+            data = self.cl_proc_func.remove_outliers(cp.array(data))
+            data = self.cl_proc_func.darkflat_correction(data, dark, flat)
+            data = self.cl_proc_func.proc_proj(data, phase=False, rows=rows)
+
+            nchunk = len(pos)
+            data_chunk[:, :nchunk] = data.swapaxes(0, 1)
+            data_chunk[:, nchunk:] = 0
+            theta_chunk[:nchunk] = theta_gpu[cp.array(pos)]
+            data_chunk = self.cl_backproj_func.fbp_filter_center(data_chunk)
+            self.cl_backproj_func.cl_rec.backprojection(rec, data_chunk, stream, theta_chunk)
+
+            nrec_old = nrec
+            nrec += nchunk
+            if nrec//nwrite > nrec_old//nwrite or nrec == params.nproj:
+                self.write_preview(rec, nrec)
+                log.info(f'Preview with {nrec} of {params.nproj} projections, {time.time()-t:.1f}s')
+
+    def write_preview(self, rec, nrec):
+        """Write slices scaled to the full number of projections"""
+
+        rec = (rec*np.float32(params.nproj/nrec)).get()
+        for k, id_slice in enumerate(self.id_slices):
+            self.cl_writer.write_data_preview(rec[k], id_slice)
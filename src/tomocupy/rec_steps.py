@@ -54,9 +54,6 @@ __copyright__ = "Copyright (c) 2022, UChicago Argonne, LLC."
 __docformat__ = 'restructuredtext en'
 __all__ = ['GPURecSteps', ]
 
-pinned_memory_pool = cp.cuda.PinnedMemoryPool()
-cp.cuda.set_pinned_memory_allocator(pinned_memory_pool.malloc)
-
 log = logging.getLogger(__name__)
 
 
@@ -75,6 +72,9 @@ class GPURecSteps():
         signal.signal(signal.SIGINT, utils.signal_handler)
         signal.signal(signal.SIGTERM, utils.signal_handler)
 
+        if params.stitch_ids is not None:
+            raise RuntimeError('--double-fov-method stitch is not supported by recon_steps, use recon')
+
         # chunks for processing
         self.shape_data_chunk_z = (params.nproj, params.ncz, params.ni)
         self.shape_dark_chunk_z = (params.ndark, params.ncz, params.ni)
@@ -82,7 +82,7 @@ class GPURecSteps():
         self.shape_data_chunk_zn = (params.nproj, params.ncz, params.n)
         self.shape_data_chunk_t = (params.ncproj, params.nz, params.ni)
         self.shape_data_chunk_tn = (params.ncproj, params.nz, params.n)
-        self.shape_recon_chunk = (params.ncz, params.n, params.n)
+        self.shape_recon_chunk = (params.ncz, *params.shape_rec_slice)
 
         # full shapes
         self.shape_data_full = (params.nproj, params.nz, params.ni)
@@ -142,12 +142,12 @@ class GPURecSteps():
 
         # pinned memory for data item
         item_pinned = {}
-        item_pinned['data'] = utils.pinned_array(
-            np.zeros([2, *self.shape_data_chunk_z], dtype=params.in_dtype))
-        item_pinned['dark'] = utils.pinned_array(
-            np.zeros([2, *self.shape_dark_chunk_z], dtype=params.in_dtype))
-        item_pinned['flat'] = utils.pinned_array(
-            np.ones([2, *self.shape_flat_chunk_z], dtype=params.in_dtype))
+        item_pinned['data'] = utils.pinned_arena.array(
+            'steps.data', [2, *self.shape_data_chunk_z], params.in_dtype, fill=0)
+        item_pinned['dark'] = utils.pinned_arena.array(
+            'steps.dark', [2, *self.shape_dark_chunk_z], params.in_dtype, fill=0)
+        item_pinned['flat'] = utils.pinned_arena.array(
+            'steps.flat', [2, *self.shape_flat_chunk_z], params.in_dtype, fill=1)
 
         # gpu memory for data item
         item_gpu = {}
@@ -159,8 +159,8 @@ class GPURecSteps():
             [2, *self.shape_flat_chunk_z], dtype=params.in_dtype)
 
         # pinned memory for res
-        rec_pinned = utils.pinned_array(
-            np.zeros([2, *self.shape_data_chunk_z], dtype=params.dtype))
+        rec_pinned = utils.pinned_arena.array(
+            'steps.res', [2, *self.shape_data_chunk_z], params.dtype)
         # gpu memory for res
         rec_gpu = cp.zeros([2, *self.shape_data_chunk_z], dtype=params.dtype)
 
@@ -212,14 +212,14 @@ class GPURecSteps():
             res = np.zeros([*self.shape_data_fulln], dtype=params.dtype)
 
         # pinned memory for data item
-        data_pinned = utils.pinned_array(
-            np.zeros([2, *self.shape_data_chunk_t], dtype=params.dtype))
+        data_pinned = utils.pinned_arena.array(
+            'steps.data', [2, *self.shape_data_chunk_t], params.dtype, fill=0)
         # gpu memory for data item
         data_gpu = cp.zeros([2, *self.shape_data_chunk_t], dtype=params.dtype)
 
         # pinned memory for processed data
-        rec_pinned = utils.pinned_array(
-            np.zeros([2, *self.shape_data_chunk_tn], dtype=params.dtype))
+        rec_pinned = utils.pinned_arena.array(
+            'steps.res', [2, *self.shape_data_chunk_tn], params.dtype)
         # gpu memory for processed data
         rec_gpu = cp.zeros([2, *self.shape_data_chunk_tn], dtype=params.dtype)
 
@@ -47,36 +47,41 @@ import cupy as cp
 class BackprojFunctions():
     def __init__(self):
 
-        params.ne = 4*params.n
-
-        if args.dtype == 'float16':
-            # power of 2 for float16
-            params.ne = 2**int(cp.ceil(cp.log2(params.ne)))
-
         theta = cp.array(params.theta)
 
         if args.lamino_angle != 0:
             # laminography reconstruction with direct discretization of line integrals
             self.cl_rec = linerec.LineRec(
-                theta, params.nproj, params.ncproj, params.nz, params.ncz, params.n, args.dtype)
-            self.cl_filter = fbp_filter.FBPFilter(
-                params.ne, params.ncproj, params.nz, args.dtype)  # note ncproj,nz!
+                theta, params.nproj, params.ncproj, params.nz, params.ncz, params.n, args.dtype, params.rec_roi)
         else:
-            # tomography
+            # tomography, angles of stitched double_fov sinograms cover 180 degrees
+            theta = cp.array(params.theta_rec)
             if args.reconstruction_algorithm == 'fourierrec':
                 self.cl_rec = fourierrec.FourierRec(
-                    params.n, params.nproj, params.ncz, theta, args.dtype)
+                    params.n, params.nproj_rec, params.ncz, theta, args.dtype)
             elif args.reconstruction_algorithm == 'lprec':
-                params.centeri += 0.5      # consistence with the Fourier based method
-                params.center += 0.5
                 self.cl_rec = lprec.LpRec(
-                    params.n, params.nproj, params.ncz, theta, args.dtype)
+                    params.n, params.nproj_rec, params.ncz, theta, args.dtype)
             elif args.reconstruction_algorithm == 'linerec':
                 self.cl_rec = linerec.LineRec(
-                    theta, params.nproj, params.nproj, params.ncz, params.ncz, params.n, args.dtype)
+                    theta, params.nproj_rec, params.nproj_rec, params.ncz, params.ncz, params.n, args.dtype, params.rec_roi)
 
-            self.cl_filter = fbp_filter.FBPFilter(
-                params.ne, params.nproj, params.ncz, args.dtype)
+        # Fourier-based methods reconstruct whole slices, a region is cropped on GPU
+        self.rec_full = None
+        if params.rec_roi != (0, params.n, 0, params.n) and not isinstance(self.cl_rec, linerec.LineRec):
+            self.rec_full = cp.zeros([params.ncz, params.n, params.n], dtype=args.dtype)
+
+        self.init_params()
+        if args.lamino_angle != 0:
+            self.init_filter(params.nz, params.ncproj)  # note ncproj,nz!
+        else:
+            self.init_filter(params.ncz, params.nproj_rec)
+
+    def init_filter(self, nz, ntheta):
+        """FBP filter for data chunks of size [nz,ntheta,n]"""
+
+        self.cl_filter = fbp_filter.FBPFilter(
+            params.ne, ntheta, nz, args.dtype)
 
         # calculate the FBP filter with quadrature rules
         self.wfilter = self.cl_filter.calc_filter(args.fbp_filter)
@@ -84,11 +89,28 @@ class BackprojFunctions():
         self.t = cp.fft.rfftfreq(params.ne).astype('float32')
 
         # pre-allocate padded buffer to avoid per-call allocation in fbp_filter_center
-        if args.lamino_angle != 0:
-            nz_filter, ntheta_filter = params.nz, params.ncproj
+        self._tmp = cp.empty((nz, ntheta, params.ne), dtype=args.dtype)
+
+    def init_params(self):
+        """Set parameters derived for the current dataset, called again when the object is reused"""
+
+        params.ne = 4*params.n
+        if args.dtype == 'float16':
+            # power of 2 for float16
+            params.ne = 2**int(cp.ceil(cp.log2(params.ne)))
+        if isinstance(self.cl_rec, lprec.LpRec):
+            params.centeri += 0.5      # consistence with the Fourier based method
+            params.center += 0.5
+
+    def backprojection(self, rec, data, stream, *bp_args):
+        """Backprojection to the region params.rec_roi of slices, rec has size [ncz,*params.shape_rec_slice]"""
+
+        if self.rec_full is None:
+            self.cl_rec.backprojection(rec, data, stream, *bp_args)
         else:
-            nz_filter, ntheta_filter = params.ncz, params.nproj
-        self._tmp = cp.empty((nz_filter, ntheta_filter, params.ne), dtype=args.dtype)
+            x0, x1, y0, y1 = params.rec_roi
+            self.cl_rec.backprojection(self.rec_full, data, stream, *bp_args)
+            rec[:] = self.rec_full[:, y0:y1, x0:x1]
 
     def fbp_filter_center(self, data, sht=0):
         """FBP filtering of projections with applying the rotation center shift wrt to the origin"""
@@ -107,3 +129,14 @@ class BackprojFunctions():
         data[:] = tmp[:, :, self.pad:self.pad+params.n]
 
         return data  # reuse input memory
+
+
+class PreviewFunctions(BackprojFunctions):
+    """Filtering and backprojection by projection chunks for a few slices, reconstructions are accumulated with linerec"""
+
+    def __init__(self, nslices):
+
+        self.cl_rec = linerec.LineRec(
+            cp.array(params.theta), params.nproj, params.ncproj, nslices, nslices, params.n, args.dtype)
+        self.init_params()
+        self.init_filter(nslices, params.ncproj)
@@ -46,6 +46,8 @@ from tomocupy.global_vars import args, params
 from threading import Thread
 import cupy as cp
 import numpy as np
+import tempfile
+import os
 
 log = logging.getLogger(__name__)
 
@@ -89,20 +91,27 @@ class BackprojLamFourierParallel():
         gpu_block_size = max(np.prod(s0c), np.prod(
             s1c)*2, np.prod(s2c)*2, np.prod(s3c)*2, np.prod(s4c)*2, np.prod(s5c))
 
-        self.pab0 = np.empty(global_block_size, dtype='float32')
-        self.pab1 = np.empty(global_block_size, dtype='float32')
-
-        self.pa33 = self.pab0[:np.prod(s3)].reshape(s3)
+        self.out_of_core = args.lamino_scratch_dir != 'none'
+        if self.out_of_core:
+            # stages are streamed through scratch files, the input data are used
+            # directly by the first step so pa33 is not needed
+            log.info(f'Out-of-core mode with scratch files in {args.lamino_scratch_dir}')
+            self.pab0 = self.scratch_array(np.prod(s1)*2)
+            self.pab1 = self.scratch_array(max(np.prod(s2)*2, np.prod(s0)))
+        else:
+            self.pab0 = np.empty(global_block_size, dtype='float32')
+            self.pab1 = np.empty(global_block_size, dtype='float32')
+            self.pa33 = self.pab0[:np.prod(s3)].reshape(s3)
         self.pa22 = self.pab1[:np.prod(s2)*2].view('complex64').reshape(s2)
         self.pa11 = self.pab0[:np.prod(s1)*2].view('complex64').reshape(s1)
         self.pa00 = self.pab1[:np.prod(s0)].reshape(s0)
 
         self.gab0 = cp.empty(2*gpu_block_size, dtype='float32')
         self.gab1 = cp.empty(2*gpu_block_size, dtype='float32')
-        self.gpab0 = utils.pinned_array(
-            np.empty(gpu_block_size, dtype='float32'))
-        self.gpab1 = utils.pinned_array(
-            np.empty(gpu_block_size, dtype='float32'))
+        self.gpab0 = utils.pinned_arena.array(
+            'lamfourier.block0', gpu_block_size, 'float32')
+        self.gpab1 = utils.pinned_arena.array(
+            'lamfourier.block1', gpu_block_size, 'float32')
 
         self.ga55 = self.gab0[:2*np.prod(s5c)].reshape(2, *s5c)
         self.ga44 = self.gab1[:2 *
@@ -146,6 +155,16 @@ class BackprojLamFourierParallel():
 
         self.rec_fun = self.rec_lam
 
+    def scratch_array(self, size):
+        """Float32 array in a memory-mapped scratch file, removed when the mapping is released"""
+
+        fid, fname = tempfile.mkstemp(
+            prefix='tomocupy_lamino_', suffix='.tmp', dir=args.lamino_scratch_dir)
+        os.close(fid)
+        res = np.memmap(fname, dtype='float32', mode='w+', shape=(size,))
+        os.remove(fname)  # the file is kept by the mapping
+        return res
+
     def usfft1d_chunks(self, out_t, inp_t, out_gpu, inp_gpu, out_p, inp_p, phi):
         log.info("usfft1d by chunks.")
         nchunk = int(np.ceil(self.n1/self.n1c))
@@ -280,15 +299,38 @@ class BackprojLamFourierParallel():
     def rec_lam(self, data):
         """Reconstruction via the the Fourier-based method"""
 
-        utils.copy(data, self.pa33)
-        self.fft2_chunks(self.pa22, self.pa33, self.ga44,
+        if self.out_of_core:
+            pa33 = data
+        else:
+            utils.copy(data, self.pa33)
+            pa33 = self.pa33
+        self.fft2_chunks(self.pa22, pa33, self.ga44,
                          self.ga55, self.gpa44, self.gpa55)
         self.usfft2d_chunks(self.pa11, self.pa22, self.ga22, self.ga33, self.gpa22,
                             self.gpa33, params.theta, np.pi/2+params.lamino_angle/180*np.pi)
         self.usfft1d_chunks(self.pa00, self.pa11, self.ga00, self.ga11,
                             self.gpa00, self.gpa11, np.pi/2+params.lamino_angle/180*np.pi)
-        u = utils.copyTransposed(self.pa00)
-        self.write_parallel(u)
+        if self.out_of_core:
+            self.write_transposed(self.pa00)
+        else:
+            u = utils.copyTransposed(self.pa00)
+            self.write_parallel(u)
+
+    def write_transposed(self, u):
+        """Transpose by tiles of ncz rows going directly to the writer"""
+
+        log.info('Transpose and write by chunks.')
+        nchunk = int(np.ceil(u.shape[1]/params.ncz))
+        for k in range(nchunk):
+            utils.printProgressBar(k+1, nchunk, nchunk-k-1, length=40)
+            st, end = k*params.ncz, min(u.shape[1], (k+1)*params.ncz)
+            tile = utils.copyTransposed(u[:, st:end])
+            ithread = utils.find_free_thread(self.write_threads)
+            self.write_threads[ithread].run(
+                self.cl_writer.write_data_chunk,
+                (tile, st+params.lamino_start_row, end+params.lamino_start_row, k))
+        for t in self.write_threads:
+            t.join()
 
     def write_parallel(self, u):
         nthreads = args.max_write_threads
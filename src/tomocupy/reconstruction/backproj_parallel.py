@@ -53,6 +53,12 @@ __all__ = ['BackprojParallel']
 log = logging.getLogger(__name__)
 
 
+def filtered_chunk(data, k):
+    """View of the filtered projection chunk k [nz,ltchunk[k],n] saved in place of projections data[k*ncproj:k*ncproj+ltchunk[k]]"""
+
+    return data[k*params.ncproj:k*params.ncproj+params.ltchunk[k]].reshape(data.shape[1], params.ltchunk[k], data.shape[2])
+
+
 class BackprojParallel():
 
     def __init__(self, cl_writer, cache_to_infer = False):
@@ -63,7 +69,7 @@ class BackprojParallel():
         self.shape_data_chunk_zn = (params.nproj, params.ncz, params.n)
         self.shape_data_chunk_t = (params.ncproj, params.nz, params.ni)
         self.shape_data_chunk_tn = (params.ncproj, params.nz, params.n)
-        self.shape_recon_chunk = (params.ncz, params.n, params.n)
+        self.shape_recon_chunk = (params.ncz, *params.shape_rec_slice)
 
         if args.reconstruction_type == 'full':
             if args.lamino_angle == 0:
@@ -92,9 +98,18 @@ class BackprojParallel():
         self.cl_writer = cl_writer
 
         self.cache_to_infer = cache_to_infer
+        # in the AI center search try slices are kept in memory, writing tiffs is optional
+        self.write_try = not cache_to_infer or args.infer_save_try
 
     def recon_sino_proj_parallel(self, data):
-        """Reconstruction by splitting into sinogram and projectionchunks"""
+        """Reconstruction by splitting into sinogram and projection chunks.
+
+        Output slabs are kept on GPU in groups as large as the free memory allows. Every projection chunk
+        is copied to GPU and filtered once per group, and backprojected to all slabs of the group.
+        If more than one group is needed, the filtered chunks are saved to data in place during the first
+        group (chunk k becomes data[k*ncproj:(k+1)*ncproj] of shape [nz,ncproj,n]), or to a separate array
+        if data is read-only, not contiguous or not of params.dtype, and the next groups only copy them to GPU.
+        """
 
         # refs for faster access
         nrchunk = params.nrchunk
@@ -103,10 +118,28 @@ class BackprojParallel():
         ntchunk = params.ntchunk
         ltchunk = params.ltchunk
         ncproj = params.ncproj
+        shape_filtered_chunk = (params.nz, ncproj, params.n)
+
+        # number of output slabs resident on GPU, keeping memory for data chunks and filtering
+        itemsize = np.dtype(params.dtype).itemsize
+        mem_free = cp.cuda.runtime.memGetInfo()[0]+cp.get_default_memory_pool().free_bytes()
+        mem_free -= 16*np.prod(self.shape_data_chunk_tn)*itemsize
+        nslabs = int(np.clip(0.9*mem_free//(np.prod(self.shape_recon_chunk)*itemsize), 1, nrchunk))
+        ngroups = int(np.ceil(nrchunk/nslabs))
+        cache_filtered = ngroups > 1
+        if cache_filtered:
+            if data.flags.c_contiguous and data.flags.writeable and data.dtype == np.dtype(params.dtype):
+                cache = data
+            else:
+                cache = np.empty(data.shape, dtype=params.dtype)
+        log.info(f'{nslabs} of {nrchunk} output slabs on GPU, {ngroups} pass(es) over projection chunks')
 
         # pinned memory for data item
-        data_pinned = utils.pinned_array(
-            np.zeros([2, *self.shape_data_chunk_tn], dtype=params.dtype))
+        data_pinned = utils.pinned_arena.array(
+            'backproj.data', [2, *self.shape_data_chunk_tn], params.dtype, fill=0)
+        if cache_filtered:
+            filtered_pinned = utils.pinned_arena.array(
+                'backproj.filtered', [2, *shape_filtered_chunk], params.dtype)
 
         # gpu memory for data item
         data_gpu = cp.zeros(
@@ -114,231 +147,227 @@ class BackprojParallel():
         theta_gpu = cp.array(params.theta)
 
         # pinned memory for reconstrution
-        rec_pinned = utils.pinned_array(
-            np.zeros([args.max_write_threads, *self.shape_recon_chunk], dtype=params.dtype))
-        # gpu memory for reconstrution
-        rec_gpu = cp.zeros([2, *self.shape_recon_chunk], dtype=params.dtype)
-
-        # Conveyor for data cpu-gpu copy and reconstruction
-        for kr in range(nrchunk+2):
-            utils.printProgressBar(
-                kr, nrchunk+1, nrchunk-kr+1, length=40)
-            rec_gpu[(kr-1) % 2][:] = 0
+        rec_pinned = utils.pinned_arena.array(
+            'backproj.rec', [args.max_write_threads, *self.shape_recon_chunk], params.dtype)
+        # gpu memory for a group of output slabs
+        rec_gpu = cp.zeros([nslabs, *self.shape_recon_chunk], dtype=params.dtype)
+
+        filtered = False
+        for ig in range(ngroups):
+            krs = range(ig*nslabs, min((ig+1)*nslabs, nrchunk))
+            rec_gpu[:] = 0
+            # Conveyor for data cpu-gpu copy and reconstruction
             for kt in range(ntchunk+2):
-                if (kr > 0 and kr < nrchunk+1 and kt > 0 and kt < ntchunk+1):
-                    with self.stream2:  # reconstruction
-                        data0 = data_gpu[(kt-1) % 2]
-                        theta0 = theta_gpu[(kt-1)*ncproj:(kt-1)
-                                           * ncproj+ltchunk[(kt-1)]]
-                        rec = rec_gpu[(kr-1) % 2]
-
-                        data0 = cp.ascontiguousarray(data0.swapaxes(0, 1))
-                        data0 = self.cl_backproj_func.fbp_filter_center(
-                            data0, cp.tile(np.float32(0), [data0.shape[0], 1]))
-                        self.cl_backproj_func.cl_rec.backprojection(
-                            rec, data0, self.stream2, theta0, params.lamino_angle, (kr-1)*ncz+args.lamino_start_row//2**args.binning)
-
-                if (kr > 1 and kt == 0):
-                    with self.stream3:  # gpu->cpu copy
-                        rec_gpu[(kr-2) % 2, :] = rec_gpu[(kr-2) % 2]
-                        ithread = 0
-                        while True:
-                            if not self.write_threads[ithread].is_alive():
-                                break
-                            ithread = (
-                                ithread+1) % args.max_write_threads
-                        rec_gpu[(kr-2) % 2].get(out=rec_pinned[ithread])
+                utils.printProgressBar(
+                    ig*(ntchunk+1)+kt, ngroups*(ntchunk+1), ntchunk-kt+1, length=40)
+                if (kt > 0 and kt < ntchunk+1):
+                    with self.stream2:  # filtering and backprojection to all slabs of the group
+                        j = kt-1
+                        theta0 = theta_gpu[j*ncproj:j*ncproj+ltchunk[j]]
+                        if filtered:
+                            data0 = data_gpu[j % 2].reshape(shape_filtered_chunk)
+                        else:
+                            data0 = cp.ascontiguousarray(data_gpu[j % 2].swapaxes(0, 1))
+                            data0 = self.cl_backproj_func.fbp_filter_center(
+                                data0, cp.tile(np.float32(0), [data0.shape[0], 1]))
+                        for i, kr in enumerate(krs):
+                            self.cl_backproj_func.backprojection(
+                                rec_gpu[i], data0, self.stream2, theta0, params.lamino_angle, kr*ncz+args.lamino_start_row//2**args.binning)
+                        if cache_filtered and not filtered:
+                            # chunk j has already been copied from data to pinned memory
+                            data0.get(out=filtered_pinned[j % 2])
+                            utils.copy(filtered_pinned[j % 2, :, :ltchunk[j]], filtered_chunk(cache, j))
                 if (kt < ntchunk):
                     # copy to pinned memory
-                    data_pinned[kt % 2][:ltchunk[kt]
-                                        ] = data[kt*ncproj:kt*ncproj+ltchunk[kt]]
-                    data_pinned[kt % 2][ltchunk[kt]:] = 0
+                    if filtered:
+                        tmp = data_pinned[kt % 2].reshape(shape_filtered_chunk)
+                        utils.copy(filtered_chunk(cache, kt), tmp[:, :ltchunk[kt]])
+                        tmp[:, ltchunk[kt]:] = 0
+                    else:
+                        data_pinned[kt % 2][:ltchunk[kt]
+                                            ] = data[kt*ncproj:kt*ncproj+ltchunk[kt]]
+                        data_pinned[kt % 2][ltchunk[kt]:] = 0
                     with self.stream1:  # cpu->gpu copy
                         data_gpu[kt % 2].set(data_pinned[kt % 2])
-                self.stream3.synchronize()
-                if (kr > 1 and kt == 0):
-                    # add a new thread for writing to hard disk (after gpu->cpu copy is done)
-                    st = (kr-2)*ncz+args.lamino_start_row//2**args.binning
-                    end = st+lrchunk[kr-2]
-                    self.write_threads[ithread].run(
-                        self.cl_writer.write_data_chunk, (rec_pinned[ithread], st, end, kr-2))
-
                 self.stream1.synchronize()
                 self.stream2.synchronize()
+            filtered = cache_filtered
+
+            for i, kr in enumerate(krs):
+                with self.stream3:  # gpu->cpu copy
+                    ithread = utils.find_free_thread(self.write_threads)
+                    rec_gpu[i].get(out=rec_pinned[ithread])
+                self.stream3.synchronize()
+                # add a new thread for writing to hard disk (after gpu->cpu copy is done)
+                st = kr*ncz+args.lamino_start_row//2**args.binning
+                end = st+lrchunk[kr]
+                self.write_threads[ithread].run(
+                    self.cl_writer.write_data_chunk, (rec_pinned[ithread], st, end, kr))
+
         # wait until reconstructions are written to hard disk
         for t in self.write_threads:
             t.join()
 
-    def recon_try_sino_proj_parallel(self, data):
-        """Reconstruction of 1 slice with different centers by splitting data into sinogram and projection chunks"""
+    def filter_chunks(self, data):
+        """Filtering of projection chunks once for all reconstructions of a try sweep.
+
+        Filtered chunks [nz,ncproj,n] are kept on GPU if they fit, otherwise in host memory in place of
+        data (see filtered_chunk), or in a separate array if data is read-only, not contiguous or not of params.dtype.
+        Returns the GPU array of filtered chunks or the host array with them.
+        """
 
         # refs for faster access
-        nschunk = params.nschunk
-        lschunk = params.lschunk
-        ncz = params.ncz
         ntchunk = params.ntchunk
         ltchunk = params.ltchunk
         ncproj = params.ncproj
+        shape_chunk = (ncproj, *data.shape[1:])
+        shape_filtered = (data.shape[1], ncproj, data.shape[2])
+
+        itemsize = np.dtype(params.dtype).itemsize
+        mem_free = cp.cuda.runtime.memGetInfo()[0]+cp.get_default_memory_pool().free_bytes()
+        mem_free -= 16*np.prod(shape_chunk)*itemsize
+        if ntchunk*np.prod(shape_filtered)*itemsize < 0.9*mem_free:
+            log.info('Filtered projections are kept on GPU')
+            res = cp.zeros([ntchunk, *shape_filtered], dtype=params.dtype)
+        else:
+            log.info('Filtered projections are kept in host memory')
+            if data.flags.c_contiguous and data.flags.writeable and data.dtype == np.dtype(params.dtype):
+                res = data
+            else:
+                res = np.empty(data.shape, dtype=params.dtype)
+            res_pinned = utils.pinned_arena.array(
+                'backproj.filtered', [2, *shape_filtered], params.dtype)
 
         # pinned memory for data item
-        data_pinned = utils.pinned_array(
-            np.zeros([2, *self.shape_data_chunk_tn], dtype=params.dtype))
-
+        data_pinned = utils.pinned_arena.array(
+            'backproj.data', [2, *shape_chunk], params.dtype, fill=0)
         # gpu memory for data item
-        data_gpu = cp.zeros(
-            [2, *self.shape_data_chunk_tn], dtype=params.dtype)
+        data_gpu = cp.zeros([2, *shape_chunk], dtype=params.dtype)
+
+        # Conveyor for data cpu-gpu copy and filtering
+        for kt in range(ntchunk+1):
+            if (kt > 0):
+                with self.stream2:  # filtering
+                    j = kt-1
+                    data0 = cp.ascontiguousarray(data_gpu[j % 2].swapaxes(0, 1))
+                    data0 = self.cl_backproj_func.fbp_filter_center(
+                        data0, cp.tile(np.float32(0), [data0.shape[0], 1]))
+                    if isinstance(res, cp.ndarray):
+                        res[j] = data0
+                    else:
+                        # chunk j has already been copied from data to pinned memory
+                        data0.get(out=res_pinned[j % 2])
+                        utils.copy(res_pinned[j % 2, :, :ltchunk[j]], filtered_chunk(res, j))
+            if (kt < ntchunk):
+                # copy to pinned memory
+                data_pinned[kt % 2][:ltchunk[kt]
+                                    ] = data[kt*ncproj:kt*ncproj+ltchunk[kt]]
+                data_pinned[kt % 2][ltchunk[kt]:] = 0
+                with self.stream1:  # cpu->gpu copy
+                    data_gpu[kt % 2].set(data_pinned[kt % 2])
+            self.stream1.synchronize()
+            self.stream2.synchronize()
+        return res
+
+    def backproject_chunks(self, filtered, backprojection):
+        """Backprojection of filtered projection chunks from filter_chunks,
+        backprojection(data0, theta0) is called on stream2 for every chunk and its angles"""
+
+        # refs for faster access
+        ntchunk = params.ntchunk
+        ltchunk = params.ltchunk
+        ncproj = params.ncproj
         theta_gpu = cp.array(params.theta)
 
-        # pinned memory for reconstrution
-        rec_pinned = utils.pinned_array(
-            np.zeros([args.max_write_threads, *self.shape_recon_chunk], dtype=params.dtype))
-        # gpu memory for reconstrution
-        rec_gpu = cp.zeros([2, *self.shape_recon_chunk], dtype=params.dtype)
+        if isinstance(filtered, cp.ndarray):
+            with self.stream2:
+                for kt in range(ntchunk):
+                    backprojection(filtered[kt], theta_gpu[kt*ncproj:kt*ncproj+ltchunk[kt]])
+            self.stream2.synchronize()
+            return
 
-        # Conveyor for data cpu-gpu copy and reconstruction
-        if self.cache_to_infer:
-            img_cache = []
-            center_of_rotation_cache = []
-            id_slice_cache = []
-        for id_slice in params.id_slices:
-            log.info(f'Processing slice {id_slice}')
-            for ks in range(nschunk+2):
-                rec_gpu[(ks-1) % 2][:] = 0
-
-                for kt in range(ntchunk+2):
-                    if (ks > 0 and ks < nschunk+1 and kt > 0 and kt < ntchunk+1):
-                        with self.stream2:  # reconstruction
-                            sht = cp.array(params.shift_array[(
-                                ks-1)*ncz:(ks-1)*ncz+lschunk[ks-1]])
-                            theta0 = theta_gpu[(kt-1)*ncproj:(kt-1)
-                                               * ncproj+ltchunk[(kt-1)]]
-                            rec = rec_gpu[(ks-1) % 2]
-                            data0 = data_gpu[(kt-1) % 2]
-                            data0 = cp.ascontiguousarray(data0.swapaxes(0, 1))
-                            data0 = self.cl_backproj_func.fbp_filter_center(
-                                data0, cp.tile(np.float32(0), [data0.shape[0], 1]))
-                            self.cl_backproj_func.cl_rec.backprojection_try(
-                                rec, data0, sht, self.stream2, theta0, params.lamino_angle, int(id_slice//2**args.binning))
-
-                    if (ks > 1 and kt == 0):
-                        with self.stream3:  # gpu->cpu copy
-                            rec_gpu[(ks-2) % 2] = rec_gpu[(ks-2) % 2]
-                            # find free thread
-                            ithread = utils.find_free_thread(
-                                self.write_threads)
-                            rec_gpu[(ks-2) % 2].get(out=rec_pinned[ithread])
-                    if (kt < ntchunk):
-                        # copy to pinned memory
-                        data_pinned[kt % 2][:ltchunk[kt]
-                                            ] = data[kt*ncproj:kt*ncproj+ltchunk[kt]]
-                        data_pinned[kt % 2][ltchunk[kt]:] = 0
-                        with self.stream1:  # cpu->gpu copy
-                            data_gpu[kt % 2].set(data_pinned[kt % 2])
-                    self.stream3.synchronize()
-                    if (ks > 1 and kt == 0):
-                        # add a new thread for writing to hard disk (after gpu->cpu copy is done)
-                        for kk in range(lschunk[ks-2]):
-                            self.write_threads[ithread].run(self.cl_writer.write_data_try, (
-                                rec_pinned[ithread, kk], params.save_centers[(ks-2)*ncz+kk], id_slice))
-                        if self.cache_to_infer:
-                            img_cache.append(np.copy(rec_pinned[ithread, kk:kk+1]))
-                            center_of_rotation_cache.append(params.save_centers[(ks-2)*ncz+kk])
-                            id_slice_cache.append(id_slice)
-                    self.stream1.synchronize()
-                    self.stream2.synchronize()
-            for t in self.write_threads:
-                t.join()
-            
-            if self.cache_to_infer:
-                img_cache = np.concatenate(img_cache,axis=0)
-                center_of_rotation_cache = np.array(center_of_rotation_cache)
-                id_slice_cache = np.array(id_slice_cache)
-                return img_cache, center_of_rotation_cache,id_slice_cache
+        shape_filtered = (filtered.shape[1], ncproj, filtered.shape[2])
+        # pinned memory for data item
+        data_pinned = utils.pinned_arena.array(
+            'backproj.data', [2, *shape_filtered], params.dtype, fill=0)
+        # gpu memory for data item
+        data_gpu = cp.zeros([2, *shape_filtered], dtype=params.dtype)
+
+        # Conveyor for data cpu-gpu copy and backprojection
+        for kt in range(ntchunk+1):
+            if (kt > 0):
+                with self.stream2:  # backprojection
+                    j = kt-1
+                    backprojection(data_gpu[j % 2], theta_gpu[j*ncproj:j*ncproj+ltchunk[j]])
+            if (kt < ntchunk):
+                # copy to pinned memory
+                utils.copy(filtered_chunk(filtered, kt), data_pinned[kt % 2, :, :ltchunk[kt]])
+                data_pinned[kt % 2, :, ltchunk[kt]:] = 0
+                with self.stream1:  # cpu->gpu copy
+                    data_gpu[kt % 2].set(data_pinned[kt % 2])
+            self.stream1.synchronize()
+            self.stream2.synchronize()
+
+    def recon_try_sino_proj_parallel(self, data):
+        """Reconstruction of 1 slice with different centers by splitting data into sinogram and projection chunks.
+        Projections do not depend on the center and are filtered once for all centers."""
+
+        return self.recon_try_chunks(data, self.cl_backproj_func.cl_rec.backprojection_try)
 
     def recon_try_lamino_sino_proj_parallel(self, data):
-        """Reconstruction of 1 slice with different lamino angles by splitting data into sinogram and projection chunks"""
+        """Reconstruction of 1 slice with different lamino angles by splitting data into sinogram and projection chunks.
+        Projections do not depend on the lamino angle and are filtered once for all angles."""
+
+        return self.recon_try_chunks(data, self.cl_backproj_func.cl_rec.backprojection_try_lamino)
+
+    def recon_try_chunks(self, data, backprojection_try):
+        """Reconstruction of 1 slice for chunks of params.shift_array with backprojection_try from filtered projection chunks"""
 
         # refs for faster access
         nschunk = params.nschunk
         lschunk = params.lschunk
         ncz = params.ncz
-        ntchunk = params.ntchunk
-        ltchunk = params.ltchunk
-        ncproj = params.ncproj
-
-        # pinned memory for data item
-        data_pinned = utils.pinned_array(
-            np.zeros([2, *self.shape_data_chunk_t], dtype=params.dtype))
-
-        # gpu memory for data item
-        data_gpu = cp.zeros([2, *self.shape_data_chunk_t], dtype=params.dtype)
-        theta_gpu = cp.array(params.theta)
 
         # pinned memory for reconstrution
-        rec_pinned = utils.pinned_array(
-            np.zeros([args.max_write_threads, *self.shape_recon_chunk], dtype=params.dtype))
+        rec_pinned = utils.pinned_arena.array(
+            'backproj.rec', [args.max_write_threads, *self.shape_recon_chunk], params.dtype)
         # gpu memory for reconstrution
-        rec_gpu = cp.zeros([2, *self.shape_recon_chunk], dtype=params.dtype)
+        rec_gpu = cp.zeros(self.shape_recon_chunk, dtype=params.dtype)
 
+        # preallocated in-memory cache of try slices for the AI center search
         if self.cache_to_infer:
-            img_cache = []
-            center_of_rotation_cache = []
-            id_slice_cache = []
+            img_cache = np.empty(
+                [len(params.shift_array), *self.shape_recon_chunk[1:]], dtype=params.dtype)
+
+        log.info('Filtering projections')
+        filtered = self.filter_chunks(data)
         for id_slice in params.id_slices:
             log.info(f'Processing slice {id_slice}')
-            # Conveyor for data cpu-gpu copy and reconstruction
-            for ks in range(nschunk+2):
-                rec_gpu[(ks-1) % 2][:] = 0
-
-                for kt in range(ntchunk+2):
-                    if (ks > 0 and ks < nschunk+1 and kt > 0 and kt < ntchunk+1):
-                        with self.stream2:  # reconstruction
-                            sht = cp.array(params.shift_array[(
-                                ks-1)*ncz:(ks-1)*ncz+lschunk[ks-1]])
-                            theta0 = theta_gpu[(kt-1)*ncproj:(kt-1)
-                                               * ncproj+ltchunk[(kt-1)]]
-                            rec = rec_gpu[(ks-1) % 2]
-                            data0 = data_gpu[(kt-1) % 2]
-
-                            data0 = cp.ascontiguousarray(data0.swapaxes(0, 1))
-                            data0 = self.cl_backproj_func.fbp_filter_center(
-                                data0, cp.tile(np.float32(0), [data0.shape[0], 1]))
-                            self.cl_backproj_func.cl_rec.backprojection_try_lamino(
-                                rec, data0, sht, self.stream2, theta0, params.lamino_angle, int(id_slice//2**args.binning))
-
-                    if (ks > 1 and kt == 0):
-                        with self.stream3:  # gpu->cpu copy
-                            rec_gpu[(ks-2) % 2] = rec_gpu[(ks-2) % 2]
-                            # find free thread
-                            ithread = utils.find_free_thread(
-                                self.write_threads)
-                            rec_gpu[(ks-2) % 2].get(out=rec_pinned[ithread])
-                    if (kt < ntchunk):
-                        # copy to pinned memory
-                        data_pinned[kt % 2][:ltchunk[kt]
-                                            ] = data[kt*ncproj:kt*ncproj+ltchunk[kt]]
-                        data_pinned[kt % 2][ltchunk[kt]:] = 0
-                        with self.stream1:  # cpu->gpu copy
-                            data_gpu[kt % 2].set(data_pinned[kt % 2])
-                    self.stream3.synchronize()
-                    if (ks > 1 and kt == 0):
-                        # add a new thread for writing to hard disk (after gpu->cpu copy is done)
-                        for kk in range(lschunk[ks-2]):
-                            self.write_threads[ithread].run(self.cl_writer.write_data_try, (
-                                rec_pinned[ithread, kk], params.save_centers[(ks-2)*ncz+kk], id_slice))
-                        if self.cache_to_infer:
-                            img_cache.append(np.copy(rec_pinned[ithread, kk:kk+1]))
-                            center_of_rotation_cache.append(params.save_centers[(ks-2)*ncz+kk])
-                            id_slice_cache.append(id_slice)
-                    self.stream1.synchronize()
-                    self.stream2.synchronize()
+            sz = int(id_slice//2**args.binning)
+            for ks in range(nschunk):
+                utils.printProgressBar(ks, nschunk, nschunk-ks, length=40)
+                sht = cp.array(params.shift_array[ks*ncz:ks*ncz+lschunk[ks]])
+                rec_gpu[:] = 0
+                self.backproject_chunks(filtered, lambda data0, theta0: backprojection_try(
+                    rec_gpu, data0, sht, self.stream2, theta0, params.lamino_angle, sz))
+                # find free thread
+                ithread = utils.find_free_thread(self.write_threads)
+                rec_gpu.get(out=rec_pinned[ithread])
+                st = ks*ncz
+                end = st+lschunk[ks]
+                if self.cache_to_infer:
+                    img_cache[st:end] = rec_pinned[ithread, :end-st]
+                if self.write_try:
+                    # add a new thread for writing to hard disk (after gpu->cpu copy is done)
+                    for kk in range(lschunk[ks]):
+                        self.write_threads[ithread].run(self.cl_writer.write_data_try, (
+                            rec_pinned[ithread, kk], params.save_centers[st+kk], id_slice))
             for t in self.write_threads:
                 t.join()
-            
+
             if self.cache_to_infer:
-                img_cache = np.concatenate(img_cache,axis=0)
-                center_of_rotation_cache = np.array(center_of_rotation_cache)
-                id_slice_cache = np.array(id_slice_cache)
+                center_of_rotation_cache = np.array(params.save_centers)
+                id_slice_cache = np.full(len(img_cache), id_slice)
                 return img_cache, center_of_rotation_cache,id_slice_cache
 
     def recon_sino_parallel(self, data):
@@ -350,15 +379,15 @@ class BackprojParallel():
         ncz = params.ncz
 
         # pinned memory for data item
-        data_pinned = utils.pinned_array(
-            np.zeros([2, *self.shape_data_chunk_zn], dtype=params.dtype))
+        data_pinned = utils.pinned_arena.array(
+            'backproj.data', [2, *self.shape_data_chunk_zn], params.dtype, fill=0)
 
         # gpu memory for data item
         data_gpu = cp.zeros([2, *self.shape_data_chunk_zn], dtype=params.dtype)
 
         # pinned memory for reconstrution
-        rec_pinned = utils.pinned_array(
-            np.zeros([args.max_write_threads, *self.shape_recon_chunk], dtype=params.dtype))
+        rec_pinned = utils.pinned_arena.array(
+            'backproj.rec', [args.max_write_threads, *self.shape_recon_chunk], params.dtype)
         # gpu memory for reconstrution
         rec_gpu = cp.zeros([2, *self.shape_recon_chunk], dtype=params.dtype)
 
@@ -373,7 +402,7 @@ class BackprojParallel():
                     data0 = cp.ascontiguousarray(data0.swapaxes(0, 1))
                     data0 = self.cl_backproj_func.fbp_filter_center(
                         data0, cp.tile(np.float32(0), [data0.shape[0], 1]))
-                    self.cl_backproj_func.cl_rec.backprojection(
+                    self.cl_backproj_func.backprojection(
                         rec, data0, self.stream2)
             if (k > 1):
                 with self.stream3:  # gpu->cpu copy
@@ -414,16 +443,17 @@ class BackprojParallel():
             ncz = params.ncz
 
             # pinned memory for reconstrution
-            rec_pinned = utils.pinned_array(
-                np.zeros([args.max_write_threads, *self.shape_recon_chunk], dtype=dtype))
+            rec_pinned = utils.pinned_arena.array(
+                'backproj.rec', [args.max_write_threads, *self.shape_recon_chunk], dtype)
             # gpu memory for reconstrution
             rec_gpu = cp.zeros([2, *self.shape_recon_chunk], dtype=dtype)
 
-            # Conveyor for data cpu-gpu copy and reconstruction
+            # preallocated in-memory cache of try slices for the AI center search
             if self.cache_to_infer:
-                img_cache = []
-                center_of_rotation_cache = []
-                id_slice_cache = []
+                img_cache = np.empty(
+                    [len(params.shift_array), *self.shape_recon_chunk[1:]], dtype=dtype)
+
+            # Conveyor for data cpu-gpu copy and reconstruction
             for k in range(nschunk+2):
                 utils.printProgressBar(
                     k, nschunk+1, nschunk-k+1, length=40)
@@ -443,23 +473,23 @@ class BackprojParallel():
                         rec_gpu[(k-2) % 2].get(out=rec_pinned[ithread])
                 self.stream3.synchronize()
                 if (k > 1):
-                    # add a new thread for writing to hard disk (after gpu->cpu copy is done)
-                    for kk in range(lschunk[k-2]):
-                        self.write_threads[ithread].run(self.cl_writer.write_data_try, (
-                            rec_pinned[ithread, kk], params.save_centers[(k-2)*ncz+kk], id_slice))
+                    st = (k-2)*ncz
+                    end = st+lschunk[k-2]
                     if self.cache_to_infer:
-                        img_cache.append(np.copy(rec_pinned[ithread, kk:kk+1]))
-                        center_of_rotation_cache.append(params.save_centers[(k-2)*ncz+kk])
-                        id_slice_cache.append(id_slice)
+                        img_cache[st:end] = rec_pinned[ithread, :end-st]
+                    if self.write_try:
+                        # add a new thread for writing to hard disk (after gpu->cpu copy is done)
+                        for kk in range(lschunk[k-2]):
+                            self.write_threads[ithread].run(self.cl_writer.write_data_try, (
+                                rec_pinned[ithread, kk], params.save_centers[st+kk], id_slice))
 
                 self.stream1.synchronize()
                 self.stream2.synchronize()
 
             for t in self.write_threads:
                 t.join()
-            
+
             if self.cache_to_infer:
-                img_cache = np.concatenate(img_cache,axis=0)
-                center_of_rotation_cache = np.array(center_of_rotation_cache)
-                id_slice_cache = np.array(id_slice_cache)
+                center_of_rotation_cache = np.array(params.save_centers)
+                id_slice_cache = np.full(len(img_cache), id_slice)
                 return img_cache, center_of_rotation_cache,id_slice_cache
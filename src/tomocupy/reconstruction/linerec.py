@@ -47,7 +47,7 @@ import cupy as cp
 class LineRec():
     """Backprojection by summation over lines"""
 
-    def __init__(self, theta, nproj, ncproj, nz, ncz, n, dtype):
+    def __init__(self, theta, nproj, ncproj, nz, ncz, n, dtype, roi=None):
         self.nproj = nproj
         self.ncproj = ncproj
         self.nz = nz
@@ -55,6 +55,8 @@ class LineRec():
         self.n = n
         self.dtype = dtype
         self.theta = cp.array(theta)
+        # region x0,x1,y0,y1 of slices computed by backprojection
+        self.roi = (0, n, 0, n) if roi is None else roi
 
         if dtype == 'float16':
             self.fslv = cfunc_linerecfp16.cfunc_linerec(
@@ -67,8 +69,9 @@ class LineRec():
             theta = self.theta
             f[:] = 0
         phi = cp.pi/2+(lamino_angle)/180*cp.pi
+        x0, x1, y0, y1 = self.roi
         self.fslv.backprojection(
-            f.data.ptr, data.data.ptr, theta.data.ptr, phi, sz, stream.ptr)
+            f.data.ptr, data.data.ptr, theta.data.ptr, phi, sz, x0, y0, x1-x0, y1-y0, stream.ptr)
 
     def backprojection_try(self, f, data, sh, stream=0, theta=[], lamino_angle=0, sz=0):
         if len(theta) == 0:
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# *************************************************************************** #
+#                  Copyright © 2022, UChicago Argonne, LLC                    #
+#                           All Rights Reserved                               #
+#                         Software Name: Tomocupy                             #
+#                     By: Argonne National Laboratory                         #
+#                                                                             #
+#                           OPEN SOURCE LICENSE                               #
+#                                                                             #
+# Redistribution and use in source and binary forms, with or without          #
+# modification, are permitted provided that the following conditions are met: #
+#                                                                             #
+# 1. Redistributions of source code must retain the above copyright notice,   #
+#    this list of conditions and the following disclaimer.                    #
+# 2. Redistributions in binary form must reproduce the above copyright        #
+#    notice, this list of conditions and the following disclaimer in the      #
+#    documentation and/or other materials provided with the distribution.     #
+# 3. Neither the name of the copyright holder nor the names of its            #
+#    contributors may be used to endorse or promote products derived          #
+#    from this software without specific prior written permission.            #
+#                                                                             #
+#                                                                             #
+# *************************************************************************** #
+#                               DISCLAIMER                                    #
+#                                                                             #
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS         #
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT           #
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS           #
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT    #
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,      #
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED    #
+# TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR      #
+# PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF      #
+# LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING        #
+# NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS          #
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.                #
+# *************************************************************************** #
+
+"""Reconstruction server keeping GPU objects between datasets.
+
+Jobs are json files ``<name>.job`` put to a queue directory, e.g. with
+``python -m tomocupy.serve <queue_dir> --file-name ... --rotation-axis ...``.
+A job holds the command line arguments of ``tomocupy recon`` in ``{"args": [...]}``,
+arguments that are not given take the values the server was started with.
+The server claims a job by renaming it to ``<name>.run`` and writes the result
+with the job latency to ``<name>.done``.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import hashlib
+import argparse
+from pathlib import Path
+
+from tomocupy import config
+from tomocupy import logging
+from tomocupy.global_vars import args, params
+
+__author__ = "Viktor Nikitin"
+__copyright__ = "Copyright (c) 2022, UChicago Argonne, LLC."
+__docformat__ = 'restructuredtext en'
+__all__ = ['FunctionCache',
+           'Server',
+           'submit',
+           'wait']
+
+log = logging.getLogger(__name__)
+
+# arguments that do not change processing and reconstruction objects
+_volatile_args = ('file_name', 'flat_file_name', 'dark_file_name', 'out_path_name',
+                  'rotation_axis', 'save_format', 'zarr_compression', 'zarr_chunk',
+                  'clear_folder', 'save_test_results', 'config', 'config_update',
+                  'logs_home', 'verbose')
+
+
+class FunctionCache():
+    '''
+    Processing and backprojection functions (filters, plans, grids) kept between datasets,
+    rebuilt only when the geometry or the processing parameters change.
+    '''
+
+    def __init__(self):
+        self.key = None
+        self.functions = None
+        self.rebuilt = False
+
+    def _key(self):
+        import numpy as np
+        theta = hashlib.sha1(np.ascontiguousarray(
+            params.theta, dtype='float32').tobytes()).hexdigest()
+        shape = tuple(getattr(params, name, None)
+                      for name in ('nproj', 'ncproj', 'nz', 'ncz', 'ni', 'n', 'dtype', 'in_dtype'))
+        opts = tuple((k, repr(v)) for k, v in sorted(vars(args).items())
+                     if k not in _volatile_args and not k.startswith('_'))
+        return (theta, shape, opts)
+
+    def get(self):
+        """Functions for the current args and params"""
+
+        from tomocupy.processing import proc_functions
+        from tomocupy.reconstruction import backproj_functions
+
+        key = self._key()
+        self.rebuilt = key != self.key
+        if self.rebuilt:
+            # release GPU memory of the previous objects before allocating new ones
+            self.functions = None
+            self.functions = (proc_functions.ProcFunctions(),
+                              backproj_functions.BackprojFunctions())
+            self.key = key
+        else:
+            self.functions[1].init_params()
+        return self.functions
+
+
+class _JobParser(argparse.ArgumentParser):
+    def error(self, message):
+        raise ValueError(f'wrong job arguments: {message}')
+
+
+class Server():
+    '''
+    Reconstruction server with a directory queue, jobs are processed one by one with *run_job(cache)*
+    returning a dict of results. Global args are reset to the server values for every job.
+    '''
+
+    def __init__(self, queue_dir, run_job, poll_interval=0.5):
+        self.queue_dir = Path(queue_dir)
+        self.queue_dir.mkdir(parents=True, exist_ok=True)
+        self.run_job = run_job
+        self.poll_interval = poll_interval
+        self.cache = FunctionCache()
+        self.defaults = dict(vars(args))
+        self.parser = _JobParser(prog='tomocupy serve job')
+        config.Params(sections=config.RECON_PARAMS).add_arguments(self.parser)
+        self.parser.set_defaults(**self.defaults)
+        self.njobs = 0
+
+    def next_job(self):
+        """Claim the first job in the queue, names given by submit() are ordered by time"""
+
+        for job in sorted(self.queue_dir.glob('*.job')):
+            run = job.with_suffix('.run')
+            try:
+                os.rename(job, run)
+            except FileNotFoundError:
+                continue  # taken by another server
+            return run
+        return None
+
+    def process(self, run):
+        """Process a claimed job and write the result"""
+
+        t = time.time()
+        try:
+            with open(run) as f:
+                spec = json.load(f)
+            job_args = self.parser.parse_args(spec.get('args', []))
+            args.__dict__.clear()
+            args.__dict__.update(vars(job_args))
+            params.__dict__.clear()
+            result = self.run_job(self.cache) or {}
+            result['status'] = 'done'
+            result['rebuilt'] = self.cache.rebuilt
+        except (Exception, SystemExit) as e:
+            log.error(f'job {run.stem} failed: {e}')
+            result = {'status': 'failed', 'error': str(e)}
+        result['latency'] = time.time()-t
+        _write_json(run.with_suffix('.done'), result)
+        os.remove(run)
+        log.info(f"job {run.stem} {result['status']} in {result['latency']:.2f}s")
+        return result
+
+    def serve(self, max_jobs=0):
+        """Process jobs until *max_jobs* are done (0 for no limit)"""
+
+        log.warning(f'waiting for jobs in {self.queue_dir}')
+        while not max_jobs or self.njobs < max_jobs:
+            run = self.next_job()
+            if run is None:
+                time.sleep(self.poll_interval)
+                continue
+            self.process(run)
+            self.njobs += 1
+
+
+def _write_json(fname, obj):
+    # write to a temporary file first so that readers never see a partial file
+    tmp = f'{fname}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(obj, f, indent=4, default=str)
+    os.replace(tmp, fname)
+
+
+def submit(queue_dir, job_args, name=None):
+    """Put a job with recon arguments to the queue, returns the job name"""
+
+    name = name or f'{time.strftime("%Y%m%d_%H%M%S")}_{time.time_ns() % 10**9:09d}_{uuid.uuid4().hex[:4]}'
+    Path(queue_dir).mkdir(parents=True, exist_ok=True)
+    _write_json(Path(queue_dir)/f'{name}.job', {'args': list(job_args)})
+    return name
+
+
+def wait(queue_dir, name, timeout=None, poll_interval=0.1):
+    """Wait for the job result"""
+
+    done = Path(queue_dir)/f'{name}.done'
+    t = time.time()
+    while not done.exists():
+        if timeout is not None and time.time()-t > timeout:
+            raise TimeoutError(f'job {name} is not done in {timeout}s')
+        time.sleep(poll_interval)
+    with open(done) as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    # client: python -m tomocupy.serve <queue_dir> [recon arguments]
+    if len(sys.argv) < 2:
+        print('usage: python -m tomocupy.serve queue_dir [recon arguments]')
+        sys.exit(1)
+    name = submit(sys.argv[1], sys.argv[2:])
+    print(json.dumps(wait(sys.argv[1], name), indent=4))
@@ -40,15 +40,11 @@
 
 from pathlib import Path
 import numpy as np
-import h5py
-import cupy as cp
 import argparse
-from threading import Thread, Event
-import numexpr as ne
+from threading import Thread, Event, Lock
+from concurrent.futures import ThreadPoolExecutor
 import sys
 import os
-import tifffile as tiff
-from scipy.ndimage import zoom
 import time
 from functools import wraps
 import subprocess
@@ -106,6 +102,7 @@ def restricted_float(x):
 def pinned_array(array):
     """Allocate pinned memory and associate it with numpy array"""
 
+    import cupy as cp
     mem = cp.cuda.alloc_pinned_memory(array.nbytes)
     src = np.frombuffer(
         mem, array.dtype, array.size).reshape(array.shape)
@@ -113,6 +110,123 @@ def pinned_array(array):
     return src
 
 
+def _gpu_numa_cpus():
+    """NUMA node of the current GPU and its CPUs, None if unknown"""
+
+    import cupy as cp
+    try:
+        bus_id = cp.cuda.Device().pci_bus_id.lower()
+        with open(f'/sys/bus/pci/devices/{bus_id}/numa_node') as f:
+            node = int(f.read())
+        if node < 0:
+            return None
+        with open(f'/sys/devices/system/node/node{node}/cpulist') as f:
+            cpulist = f.read().strip()
+        cpus = set()
+        for part in cpulist.split(','):
+            st, _, end = part.partition('-')
+            cpus.update(range(int(st), int(end or st)+1))
+        return node, cpus
+    except (OSError, ValueError, cp.cuda.runtime.CUDARuntimeError):
+        return None
+
+
+class PinnedArena():
+    """Named reusable pinned host buffers shared by pipeline objects
+
+    A slab is allocated at the first request of a name and reused by later
+    requests of this name while it is large enough, so objects created again
+    (e.g. for each level of the AI center search) do not pin memory again.
+    Pinned memory is allocated from a thread bound to the NUMA node of the GPU.
+    With pinned=False plain memory is used, e.g. for testing without GPU.
+    """
+
+    def __init__(self, pinned=True):
+        self.pinned = pinned
+        self.slabs = {}
+        self.numa = None
+        self.numa_checked = False
+        self.lock = Lock()
+        self.nbytes = 0
+        self.high_water = 0
+        self.nalloc = 0
+        self.nreuse = 0
+
+    def _alloc(self, nbytes):
+        if not self.pinned:
+            return np.empty(nbytes, dtype='uint8')
+        import cupy as cp
+        if not self.numa_checked:
+            self.numa = _gpu_numa_cpus()
+            self.numa_checked = True
+            if self.numa is not None:
+                log.info(f'Pinned memory on NUMA node {self.numa[0]}')
+        cpus = node_cpus = None
+        if self.numa is not None:
+            # only allowed cpus of the node, e.g. under a cgroup/Slurm cpuset
+            cpus = os.sched_getaffinity(0)
+            node_cpus = cpus & self.numa[1]
+            if node_cpus and node_cpus != cpus:
+                try:
+                    os.sched_setaffinity(0, node_cpus)
+                except OSError as e:
+                    log.warning(f'Pinned memory without NUMA affinity: {e}')
+                    node_cpus = None
+            else:
+                node_cpus = None
+        try:
+            # pages are pinned by the calling thread, i.e. on its node
+            mem = cp.cuda.PinnedMemoryPointer(cp.cuda.PinnedMemory(nbytes), 0)
+        finally:
+            if node_cpus:
+                os.sched_setaffinity(0, cpus)
+        return np.frombuffer(mem, 'uint8', nbytes)
+
+    def array(self, name, shape, dtype, fill=None):
+        """Array from slab name, not initialized unless fill is given"""
+
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape))*dtype.itemsize
+        with self.lock:
+            slab = self.slabs.get(name)
+            if slab is not None and slab.nbytes >= nbytes:
+                self.nreuse += 1
+            else:
+                if slab is not None:
+                    # drop the old slab before allocating a larger one
+                    self.nbytes -= slab.nbytes
+                    del self.slabs[name]
+                    slab = None
+                slab = self._alloc(nbytes)
+                self.slabs[name] = slab
+                self.nalloc += 1
+                self.nbytes += nbytes
+                self.high_water = max(self.high_water, self.nbytes)
+        res = slab[:nbytes].view(dtype).reshape(shape)
+        if fill is not None:
+            res.fill(fill)
+        return res
+
+    def release(self, name=None):
+        """Release slab name or all slabs, memory is freed when arrays using it are deleted"""
+
+        with self.lock:
+            for key in ([name] if name is not None else list(self.slabs)):
+                slab = self.slabs.pop(key, None)
+                if slab is not None:
+                    self.nbytes -= slab.nbytes
+
+    def stats(self):
+        """Current and high-water bytes, numbers of allocations and reuses"""
+
+        return {'slabs': len(self.slabs), 'bytes': self.nbytes, 'high_water_bytes': self.high_water,
+                'allocations': self.nalloc, 'reuses': self.nreuse}
+
+
+# process-wide arena of pinned host buffers
+pinned_arena = PinnedArena()
+
+
 def signal_handler(sig, frame):
     """Calls abort_scan when ^C or ^Z is typed"""
 
@@ -154,8 +268,32 @@ def find_free_thread(threads):
         threads[0]._done.wait(timeout=0.01)
 
 
-def downsample(data, binning):
-    """Downsample data"""
+def bin_int(data, fz, fx, out=None):
+    """Single-pass binning of unsigned integer data [n,nz,nx] by factors fz and fx in the last two dimensions.
+    Sums are accumulated in uint32, the rounded mean is written to out (of the input dtype)"""
+
+    n, nz, nx = data.shape
+    nzb, nxb = nz//fz, nx//fx
+    f = fz*fx
+    if out is None:
+        out = np.empty([n, nzb, nxb], dtype=data.dtype)
+    # blocks of projections with uint32 sums of about 16MB
+    step = max(1, 2**22//max(1, nzb*nxb))
+    for st in range(0, n, step):
+        d = data[st:st+step, :nzb*fz, :nxb*fx].reshape(-1, nzb, fz, nxb, fx)
+        acc = d.sum(axis=(2, 4), dtype='uint32')
+        acc += f//2
+        acc //= f
+        out[st:st+step] = acc
+    return out
+
+
+def downsample(data, binning, out=None):
+    """Downsample data by summing 2**binning x 2**binning pixels,
+    uint8/uint16 data are binned to the rounded mean in the input type (see bin_int)"""
+    if binning > 0 and data.dtype in (np.uint8, np.uint16):
+        return bin_int(data, 2**binning, 2**binning, out)
+    import numexpr as ne
     for j in range(binning):
         x = data[:, :, ::2]
         y = data[:, :, 1::2]
@@ -164,45 +302,191 @@ def downsample(data, binning):
         x = data[:, ::2]
         y = data[:, 1::2]
         data = ne.evaluate('x + y')
+    if out is not None:
+        out[:] = data
+        return out
     return data
 
 
-def _copy(res, u, st, end):
-    res[st:end] = u[st:end]
+def id_ranges(ids):
+    """Run-length ranges of consecutive ids, as (position in ids, first id, last id+1)"""
+
+    ids = np.asarray(ids)
+    if len(ids) == 0:
+        return []
+    st = np.r_[0, np.where(np.diff(ids) != 1)[0]+1]
+    end = np.r_[st[1:], len(ids)]
+    return [(int(p), int(ids[p]), int(ids[p]+q-p)) for p, q in zip(st, end)]
+
 
+def ids_shape(shape, ids, sel):
+    """Shape of dataset entries ids with the selection sel of other dimensions"""
 
-def copy(u, res, nthreads=16):
-    nchunk = int(np.ceil(u.shape[0]/nthreads))
-    mthreads = []
-    for k in range(nthreads):
-        th = Thread(target=_copy, args=(
-            res, u, k*nchunk, min((k+1)*nchunk, u.shape[0])))
-        mthreads.append(th)
-        th.start()
-    for th in mthreads:
-        th.join()
+    res = [len(ids)]
+    for s, n in zip(sel, shape[1:]):
+        res.append(len(range(*s.indices(n))) if isinstance(s, slice) else len(s))
     return res
 
 
-def _copyTransposed(res, u, st, end):
-    res[st:end] = u[:, st:end].swapaxes(0, 1)
+def read_ids(dset, ids, sel, dtype):
+    """Read dataset entries ids (along the first dimension) with the selection sel of other dimensions.
+    Runs of consecutive ids are read with hyperslabs (or copied from a memory map) directly to the output array"""
 
+    res = np.empty(ids_shape(dset.shape, ids, sel), dtype=dtype)
+    for p, st, end in id_ranges(ids):
+        if isinstance(dset, np.ndarray):
+            res[p:p+end-st] = dset[(slice(st, end), *sel)]
+        else:
+            dset.read_direct(res, (slice(st, end), *sel), np.s_[p:p+end-st])
+    return res
+
+
+def _split_parts(shape, nparts):
+    """Index tuples splitting an array into about nparts parts of equal size in bytes"""
+
+    lead = 1
+    for axis, n in enumerate(shape):
+        if lead*n >= nparts:
+            break
+        lead *= n
+    else:
+        return [()]
+    step = int(np.ceil(shape[axis]/np.ceil(nparts/lead)))
+    parts = []
+    for idx in np.ndindex(*shape[:axis]):
+        for st in range(0, shape[axis], step):
+            parts.append((*idx, slice(st, min(st+step, shape[axis]))))
+    return parts
+
+
+def _copy_part(res, u, idx):
+    res[idx] = u[idx]
+
+
+def _transpose_rows(res, u, st, end, bi, bj):
+    for i in range(0, u.shape[0], bi):
+        for j in range(st, end, bj):
+            je = min(j+bj, end)
+            res[j:je, i:i+bi] = u[i:i+bi, j:je].swapaxes(0, 1)
+
+
+class CopyPool():
+    """Process-wide pool of threads for host copies
 
-def copyTransposed(u, res=[], nthreads=16):
-    if res == []:
-        res = np.empty([u.shape[1], u.shape[0], u.shape[2]], dtype=u.dtype)
-    nchunk = int(np.ceil(u.shape[1]/nthreads))
-    mthreads = []
-    for k in range(nthreads):
-        th = Thread(target=_copyTransposed, args=(
-            res, u, k*nchunk, min((k+1)*nchunk, u.shape[1])))
-        mthreads.append(th)
-        th.start()
-    for th in mthreads:
-        th.join()
+    Copies are split into parts of about equal size in bytes, one per thread.
+    Copies with less than min_bytes per thread are done in the calling thread.
+    Counters of calls, copied bytes and time give the copy throughput.
+    """
+
+    def __init__(self, nthreads=16, min_bytes=2**22):
+        self.nthreads = nthreads
+        self.min_bytes = min_bytes
+        self.pool = None
+        self.lock = Lock()
+        self.reset_counters()
+
+    def resize(self, nthreads):
+        """Change the number of threads"""
+
+        with self.lock:
+            if nthreads != self.nthreads and self.pool is not None:
+                self.pool.shutdown(wait=False)
+                self.pool = None
+            self.nthreads = nthreads
+
+    def reset_counters(self):
+        self.ncalls = 0
+        self.nthreaded = 0
+        self.nbytes = 0
+        self.seconds = 0.0
+
+    def stats(self):
+        """Counters and throughput"""
+
+        return {'calls': self.ncalls, 'threaded_calls': self.nthreaded, 'bytes': self.nbytes,
+                'seconds': self.seconds, 'GB/s': self.nbytes/max(self.seconds, 1e-9)/2**30}
+
+    def _count(self, nbytes, t0, threaded):
+        with self.lock:
+            self.ncalls += 1
+            self.nthreaded += threaded
+            self.nbytes += nbytes
+            self.seconds += time.perf_counter()-t0
+
+    def run(self, func, tasks):
+        """Run func(*task) for all tasks on the pool threads"""
+
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.nthreads)
+            pool = self.pool
+        futures = [pool.submit(func, *task) for task in tasks]
+        for f in futures:
+            f.result()
+
+    def copy(self, u, res):
+        """res[:u.shape[0]] = u"""
+
+        t0 = time.perf_counter()
+        res = res[:u.shape[0]]
+        nparts = int(min(self.nthreads, u.nbytes//self.min_bytes))
+        if nparts > 1:
+            self.run(_copy_part, [(res, u, idx)
+                     for idx in _split_parts(u.shape, nparts)])
+        else:
+            res[:] = u
+        self._count(u.nbytes, t0, nparts > 1)
+
+    def transpose(self, u, res, tile_bytes=2**20):
+        """res[j, i] = u[i, j] by cache-sized tiles, each thread fills its own range of output rows"""
+
+        t0 = time.perf_counter()
+        row_bytes = max(1, u[:1, :1].nbytes)
+        bi = bj = max(1, int(np.sqrt(tile_bytes/row_bytes)))
+        nthreads = self.nthreads if u.nbytes >= 2*self.min_bytes else 1
+        # a few strips per thread for load balancing
+        nstrips = max(1, min(4*nthreads, int(np.ceil(u.shape[1]/bj))))
+        nchunk = max(1, int(np.ceil(u.shape[1]/nstrips)))
+        tasks = [(res, u, st, min(st+nchunk, u.shape[1]), bi, bj)
+                 for st in range(0, u.shape[1], nchunk)]
+        if nthreads > 1:
+            self.run(_transpose_rows, tasks)
+        else:
+            for task in tasks:
+                _transpose_rows(*task)
+        self._count(u.nbytes, t0, nthreads > 1)
+
+
+# process-wide pool for host copies
+copy_pool = CopyPool()
+
+
+def copy(u, res):
+    """Copy u to res[:u.shape[0]] with the copy pool"""
+
+    copy_pool.copy(u, res)
     return res
 
 
+def transpose3d(u, res=None, tile_bytes=2**20):
+    """Cache-blocked copy of a 3D array with swapped first two axes, res[j, i] = u[i, j]
+
+    Tiles of about tile_bytes are copied by the copy pool.
+    u and res can be numpy arrays or memmaps.
+    """
+
+    if res is None:
+        res = np.empty([u.shape[1], u.shape[0], *u.shape[2:]], dtype=u.dtype)
+    copy_pool.transpose(u, res, tile_bytes)
+    return res
+
+
+def copyTransposed(u, res=None):
+    """Copy with swapped first two axes, see transpose3d"""
+
+    return transpose3d(u, res)
+
+
 def read_bright_ratio(params):
     '''Read the ratio between the bright exposure and other exposures.
     '''
@@ -247,6 +531,7 @@ def check_item_exists_hdf(hdf_filename, item_name):
     hdf_filename: str filename or pathlib.Path object for HDF file to check
     item_name: name of item whose existence needs to be checked
     '''
+    import h5py
     with h5py.File(hdf_filename, 'r') as hdf_file:
         return item_name in hdf_file
 
@@ -263,6 +548,7 @@ def param_from_dxchange(hdf_file, data_path, attr=None, scalar=True, char_array=
     """
     if not Path(hdf_file).is_file():
         return None
+    import h5py
     with h5py.File(hdf_file, 'r') as f:
         try:
             if attr:
@@ -295,6 +581,7 @@ def downsampleZarr(volume, scale_factor):
     zoom_factors = (1 / scale_factor, 1 / scale_factor, 1 / scale_factor)
 
     # Perform downsampling using interpolation
+    from scipy.ndimage import zoom
     downsampled = zoom(volume, zoom_factors, order=1)  # Use order=1 for bilinear interpolation
 
     return downsampled
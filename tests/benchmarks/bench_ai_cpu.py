@@ -0,0 +1,65 @@
+"""Benchmark of the CPU inference modes of the AI center classifier (ClassificationModel).
+
+Runs a synthetic batch of candidate try slices through the float32 eager model
+and the int8 / compiled variants prepared as in inference_pipeline
+(--infer-device cpu --infer-int8 --infer-compile), prints candidates/s and
+the difference of logits and scores wrt the float32 model.
+
+    python bench_ai_cpu.py [ncandidates] [nthreads] [model_path]
+
+Without model_path the model has random weights.
+"""
+
+import sys
+import copy
+import time
+import torch
+import numpy as np
+from tomocupy.ai.model_archs import _make_dinov2_model, ClassificationModel
+from tomocupy.ai.inference import _prepare_model
+
+num_windows, sz = 3, 518
+
+
+def make_model(model_path):
+    torch.manual_seed(0)
+    model_ = _make_dinov2_model()
+    model = ClassificationModel(model_, embed_dim=model_.embed_dim, num_windows=[num_windows], multi_instances=True)
+    if model_path is not None:
+        states = torch.load(model_path, map_location='cpu')['state_dict']
+        states = {k.replace("module.", ""): v for k, v in states.items()}
+        model.load_state_dict(states, strict=False)
+    return model
+
+
+def bench(model, samples):
+    with torch.no_grad():
+        model(samples[0])  # warm up (and compile)
+        t = time.perf_counter()
+        logits = torch.cat([model(s) for s in samples])
+    return logits, time.perf_counter() - t
+
+
+if __name__ == '__main__':
+    ncandidates = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    nthreads = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    model_path = sys.argv[3] if len(sys.argv) > 3 else None
+    if nthreads > 0:
+        torch.set_num_threads(nthreads)
+    rng = np.random.default_rng(0)
+    samples = [[{'images': torch.from_numpy(rng.random([1, num_windows, 1, sz, sz], dtype='float32'))}]
+               for _ in range(ncandidates)]
+
+    model = make_model(model_path)
+    print(f'{ncandidates} candidates, {num_windows} windows {sz}x{sz}, {torch.get_num_threads()} threads')
+    ref = None
+    for name, int8, compile in [('float32', False, False), ('int8', True, False),
+                                ('float32 compiled', False, True), ('int8 compiled', True, True)]:
+        m = _prepare_model(copy.deepcopy(model), 'cpu', int8=int8, compile=compile)
+        logits, t = bench(m, samples)
+        scores = torch.softmax(logits, dim=1)[:, 1]
+        if ref is None:
+            ref, ref_scores = logits, scores
+        print(f'{name:18} {ncandidates/t:7.2f} candidates/s, max logit delta {(logits-ref).abs().max():.2e}, '
+              f'max score delta {(scores-ref_scores).abs().max():.2e}, '
+              f'same best candidate {bool(scores.argmax() == ref_scores.argmax())}')
@@ -0,0 +1,100 @@
+"""Benchmark of the fw stripe removal (remove_stripe.FourierWaveletStripeRemover).
+
+Compares the previous path (DWTForward/DWTInverse, padding indices, damping
+vectors and level arrays created on every call) with one remover reused for
+all chunks, as in the reconstruction. Prints ms per chunk, bytes requested from
+the cupy memory pool per call and bytes newly allocated on the device per call,
+and checks that results are identical.
+
+    python bench_fw.py [nproj] [nz] [ni] [level]
+"""
+
+import sys
+import time
+import cupy as cp
+from tomocupy.processing import remove_stripe as rs
+
+
+def remove_stripe_fw_ref(data, sigma, wname, level):
+    """Previous remove_stripe_fw with the setup on every call"""
+
+    [nproj, nz, ni] = data.shape
+    nproj_pad = nproj + nproj // 8
+    xfm = rs.DWTForward(wave=wname)
+    ifm = rs.DWTInverse(wave=wname)
+
+    cc = []
+    sli = cp.zeros([nz, 1, nproj_pad, ni], dtype='float32')
+    sli[:, 0, (nproj_pad - nproj)//2:(nproj_pad + nproj) //
+        2] = data.astype('float32').swapaxes(0, 1)
+    for k in range(level):
+        sli, c = xfm.apply(sli)
+        cc.append(c)
+        band = cc[k][:, 0, 1]
+        _, my, mx = band.shape
+        fcV = cp.fft.rfft(band, axis=1)
+        myr = my // 2 + 1
+        y_hat = cp.fft.ifftshift((cp.arange(-my, my, 2) + 1) / 2)[:myr]
+        damp = -cp.expm1(-y_hat**2 / (2 * sigma**2))
+        fcV *= damp[:, None]
+        cc[k][:, 0, 1] = cp.fft.irfft(fcV, my, axis=1)
+
+    for k in range(level)[::-1]:
+        shape0 = cc[k][0, 0, 1].shape
+        sli = sli[:, :, :shape0[0], :shape0[1]]
+        sli = ifm.apply((sli, cc[k]))
+
+    data = sli[:, 0, (nproj_pad - nproj)//2:(nproj_pad + nproj) //
+               2, :ni].astype(data.dtype)
+    return data.swapaxes(0, 1)
+
+
+class PoolCounter(cp.cuda.MemoryHook):
+    """Bytes requested from the memory pool and bytes allocated on the device"""
+
+    name = 'PoolCounter'
+
+    def __init__(self):
+        self.requested = 0
+        self.allocated = 0
+
+    def malloc_postprocess(self, device_id, size, mem_size, mem_ptr, pmem_id):
+        self.requested += mem_size
+
+    def alloc_postprocess(self, device_id, mem_size, mem_ptr):
+        self.allocated += mem_size
+
+
+def gen_data(nproj, nz, ni):
+    cp.random.seed(0)
+    data = cp.random.random([nproj, nz, ni], dtype='float32') + 1
+    data[:, :, cp.random.randint(0, ni, 32)] *= 1.2
+    return data
+
+
+def bench(func, data, nrep=5):
+    func(data)
+    cp.cuda.Device().synchronize()
+    counter = PoolCounter()
+    t = time.perf_counter()
+    with counter:
+        for _ in range(nrep):
+            res = func(data)
+        cp.cuda.Device().synchronize()
+    return res, (time.perf_counter() - t) / nrep, counter.requested / nrep, counter.allocated / nrep
+
+
+if __name__ == '__main__':
+    nproj, nz, ni = [int(v) for v in sys.argv[1:4]] if len(sys.argv) > 3 else [1500, 16, 2048]
+    level = int(sys.argv[4]) if len(sys.argv) > 4 else 7
+    sigma, wname = 1, 'sym16'
+    data = gen_data(nproj, nz, ni)
+    remover = rs.FourierWaveletStripeRemover(sigma, wname, level)
+    ref, tref, qref, aref = bench(lambda d: remove_stripe_fw_ref(d, sigma, wname, level), data)
+    res, tnew, qnew, anew = bench(remover.apply, data)
+    print(f'data [nproj, nz, ni] = {data.shape}, level {level}')
+    print(f'before: {tref*1000:.2f} ms/chunk, pool requests {qref/2**20:.1f} MB/call, '
+          f'device allocations {aref/2**20:.1f} MB/call')
+    print(f'after:  {tnew*1000:.2f} ms/chunk, pool requests {qnew/2**20:.1f} MB/call, '
+          f'device allocations {anew/2**20:.1f} MB/call')
+    print(f'identical: {bool(cp.array_equal(ref, res))}')
@@ -0,0 +1,66 @@
+"""Benchmark of reading z chunks [nproj,ncz,ni] of a contiguous uncompressed HDF5 dataset to a staging buffer.
+
+Compares h5py slicing (previous Reader path) with a memory map of the raw bytes
+(Reader.dataset) copied to the buffer by the copy pool threads. The file is
+generated in scratch_dir (e.g. on local NVMe) and removed at exit. Reads are
+repeated, so the second pass is served from the page cache.
+
+    python bench_mmap_read.py [size_GB] [scratch_dir] [--pinned]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import h5py
+from tomocupy import utils
+
+
+def read_h5py(dset, buf, ncz):
+    for st in range(0, dset.shape[1], ncz):
+        end = min(st+ncz, dset.shape[1])
+        buf[:, :end-st] = dset[:, st:end]
+
+
+def read_mmap(mmap, buf, ncz):
+    for st in range(0, mmap.shape[1], ncz):
+        end = min(st+ncz, mmap.shape[1])
+        utils.copy(mmap[:, st:end], buf[:, :end-st])
+
+
+def bench(func, u, buf, ncz):
+    t = time.perf_counter()
+    func(u, buf, ncz)
+    return time.perf_counter() - t
+
+
+if __name__ == '__main__':
+    size = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    scratch = sys.argv[2] if len(sys.argv) > 2 else None
+    pinned = '--pinned' in sys.argv
+    nproj, ni, ncz = 1500, 2048, 16
+    nz = max(ncz, int(size*2**30/2/nproj/ni))
+
+    fid, fname = tempfile.mkstemp(suffix='.h5', dir=scratch)
+    os.close(fid)
+    try:
+        with h5py.File(fname, 'w') as fid:
+            dset = fid.create_dataset('/exchange/data', (nproj, nz, ni), dtype='uint16')
+            for k in range(nproj):
+                dset[k] = k
+        buf = utils.PinnedArena(pinned=pinned).array('data', [nproj, ncz, ni], 'uint16')
+        gb = nproj*nz*ni*2/2**30
+        with h5py.File(fname, 'r') as fid:
+            dset = fid['/exchange/data']
+            mmap = np.memmap(fname, dtype=dset.dtype, mode='r',
+                             offset=dset.id.get_offset(), shape=dset.shape)
+            for p in range(2):
+                t_h5 = bench(read_h5py, dset, buf, ncz)
+                t_mm = bench(read_mmap, mmap, buf, ncz)
+                print(f'pass {p}: h5py {gb/t_h5:.2f} GB/s, memmap {gb/t_mm:.2f} GB/s')
+            print(f'dataset [{nproj},{nz},{ni}] uint16, {gb:.1f} GB, chunks of {ncz} rows, '
+                  f'{"pinned" if pinned else "pageable"} buffer, {utils.copy_pool.nthreads} copy threads')
+            print(f'correct: {bool(np.all(buf[:, 0, 0] == np.arange(nproj, dtype="uint16")))}')
+    finally:
+        os.remove(fname)
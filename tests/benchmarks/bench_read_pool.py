@@ -0,0 +1,66 @@
+"""Benchmark of reading z chunks [nproj,ncz,ni] of a compressed HDF5 dataset with read threads.
+
+Compares h5py reads in the threads (serialized by the h5py global lock) with
+reads by the process pool (--read-workers) for several numbers of workers.
+The file is generated in scratch_dir and removed at exit.
+
+    python bench_read_pool.py [size_GB] [scratch_dir] [nthreads]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import h5py
+from concurrent.futures import ThreadPoolExecutor
+from tomocupy.dataio.read_pool import ReadPool
+
+
+def read_h5py(fname, st, end):
+    with h5py.File(fname, 'r') as fid:
+        fid['/exchange/data'][:, st:end]
+
+
+def read_pool(pool, fname, st, end):
+    with h5py.File(fname, 'r') as fid:
+        dset = fid['/exchange/data']
+        pool.read(dset, np.arange(dset.shape[0]), (slice(st, end), slice(None)), dset.dtype)
+
+
+def bench(func, nz, ncz, nthreads):
+    t = time.perf_counter()
+    with ThreadPoolExecutor(nthreads) as ex:
+        list(ex.map(lambda st: func(st, min(st+ncz, nz)), range(0, nz, ncz)))
+    return time.perf_counter() - t
+
+
+if __name__ == '__main__':
+    size = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    scratch = sys.argv[2] if len(sys.argv) > 2 else None
+    nthreads = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    nproj, ni, ncz = 1500, 2048, 16
+    nz = max(ncz, int(size*2**30/2/nproj/ni))
+
+    fid, fname = tempfile.mkstemp(suffix='.h5', dir=scratch)
+    os.close(fid)
+    try:
+        rng = np.random.default_rng(0)
+        with h5py.File(fname, 'w') as fid:
+            dset = fid.create_dataset('/exchange/data', (nproj, nz, ni), dtype='uint16',
+                                      chunks=(1, ncz, ni), compression='gzip', compression_opts=1)
+            for k in range(nproj):
+                dset[k] = rng.poisson(1000, [nz, ni])
+        gb = nproj*nz*ni*2/2**30
+        print(f'dataset [{nproj},{nz},{ni}] uint16 gzip, {gb:.1f} GB, {os.path.getsize(fname)/2**30:.1f} GB on disk, '
+              f'chunks of {ncz} rows, {nthreads} read threads')
+        t = bench(lambda st, end: read_h5py(fname, st, end), nz, ncz, nthreads)
+        print(f'h5py in threads:    {gb/t:.2f} GB/s')
+        for nworkers in [1, 2, 4, 8, 16]:
+            pool = ReadPool(nworkers)
+            read_pool(pool, fname, 0, 1)  # start workers
+            t = bench(lambda st, end: read_pool(pool, fname, st, end), nz, ncz, nthreads)
+            pool.close()
+            print(f'{nworkers:2d} read workers:    {gb/t:.2f} GB/s')
+    finally:
+        os.remove(fname)
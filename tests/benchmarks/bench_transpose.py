@@ -0,0 +1,67 @@
+"""Benchmark of the host transpose (utils.transpose3d) used for swapping the first two axes.
+
+Compares the tiled, thread-pooled transpose with the previous copyTransposed
+(16 new threads, one swapaxes copy of a row range per thread).
+
+    python bench_transpose.py [size_GB] [scratch_dir]
+
+With scratch_dir the input is a memmap in that directory (e.g. on local NVMe).
+"""
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+from threading import Thread
+from tomocupy import utils
+
+
+def _copyTransposed_old(res, u, st, end):
+    res[st:end] = u[:, st:end].swapaxes(0, 1)
+
+
+def copyTransposed_old(u, res, nthreads=16):
+    nchunk = int(np.ceil(u.shape[1]/nthreads))
+    mthreads = []
+    for k in range(nthreads):
+        th = Thread(target=_copyTransposed_old, args=(
+            res, u, k*nchunk, min((k+1)*nchunk, u.shape[1])))
+        mthreads.append(th)
+        th.start()
+    for th in mthreads:
+        th.join()
+    return res
+
+
+def bench(func, u, res):
+    t = time.perf_counter()
+    func(u, res)
+    return time.perf_counter() - t
+
+
+if __name__ == '__main__':
+    size = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    n = 2048
+    nz = max(1, int(size*2**30/4/n/n))
+    shape = (nz, n, n)
+    if len(sys.argv) > 2:
+        fid, fname = tempfile.mkstemp(dir=sys.argv[2])
+        os.close(fid)
+        u = np.memmap(fname, dtype='float32', mode='w+', shape=shape)
+        os.remove(fname)
+    else:
+        u = np.empty(shape, dtype='float32')
+    # fill by slices to limit temporary memory
+    for k in range(nz):
+        u[k] = k
+    res = np.empty([shape[1], shape[0], shape[2]], dtype='float32')
+    res[:] = 0  # touch the output pages before timing
+
+    gb = u.nbytes/2**30
+    t_old = bench(copyTransposed_old, u, res)
+    t_new = bench(utils.transpose3d, u, res)
+    print(f'array {shape} float32, {gb:.1f} GB, {"memmap" if isinstance(u, np.memmap) else "ndarray"}')
+    print(f'copyTransposed (previous): {t_old:.2f} s, {gb/t_old:.2f} GB/s')
+    print(f'transpose3d:               {t_new:.2f} s, {gb/t_new:.2f} GB/s')
+    print(f'correct: {all(np.all(res[:, k] == k) for k in range(0, nz, max(1, nz//16)))}')
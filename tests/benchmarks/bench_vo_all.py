@@ -0,0 +1,78 @@
+"""Benchmark of the vo-all stripe removal (remove_stripe.remove_all_stripe).
+
+Compares the current implementation with the previous one (per-row dead
+stripe interpolation, separate argsort in _rs_large3 and _rs_sort3),
+checks that results are identical and prints ms per sinogram.
+
+    python bench_vo_all.py [nproj] [nz] [ni]
+"""
+
+import sys
+import time
+import cupy as cp
+from tomocupy.processing import remove_stripe as rs
+
+
+def _rs_dead3_rowloop(tomo, snr, size):
+    """Previous _rs_dead3 with the interpolation loop over rows"""
+    tomo = cp.copy(tomo)
+    nproj, nz, ni = tomo.shape
+    sinosmooth = rs.uniform_filter1d(tomo, 10, axis=0)
+    listdiff = cp.sum(cp.abs(tomo - sinosmooth), axis=0)
+    listdiffbck = rs.median_filter(listdiff, (1, size))
+    listfact = listdiff / listdiffbck
+    listmask = rs._detect_stripe_batch(listfact, snr)
+    listmask = rs.binary_dilation(
+        listmask, iterations=1,
+        structure=cp.ones((1, 3), dtype=bool)).astype(listmask.dtype)
+    listmask[:, 0:2] = 0.0
+    listmask[:, -2:] = 0.0
+    for m in range(nz):
+        listx = cp.where(listmask[m] < 1.0)[0]
+        listxmiss = cp.where(listmask[m] > 0.0)[0]
+        if len(listxmiss) > 0:
+            matz = tomo[:, m, listx]
+            ids = cp.searchsorted(listx, listxmiss)
+            tomo[:, m, listxmiss] = (
+                matz[:, ids - 1] +
+                (listxmiss - listx[ids - 1]) *
+                (matz[:, ids] - matz[:, ids - 1]) /
+                (listx[ids] - listx[ids - 1]))
+    return rs._rs_large3(tomo, snr, size)
+
+
+def remove_all_stripe_ref(tomo, snr=3, la_size=61, sm_size=21, dim=1):
+    tomo = _rs_dead3_rowloop(tomo, snr, la_size)
+    return rs._rs_sort3(tomo, sm_size, dim)
+
+
+def gen_data(nproj, nz, ni):
+    cp.random.seed(0)
+    data = cp.random.random([nproj, nz, ni], dtype='float32') + 1
+    # dead, large and partial stripes
+    cols = cp.random.randint(8, ni - 8, 16)
+    data[:, :, cols] *= 4
+    data[:, :, cols[:8] + 1] = 0.1
+    data[nproj//2:, :, cols[8:] + 2] *= 0.5
+    return data
+
+
+def bench(func, data, nrep=5):
+    func(data)
+    cp.cuda.Device().synchronize()
+    t = time.perf_counter()
+    for _ in range(nrep):
+        res = func(data)
+    cp.cuda.Device().synchronize()
+    return res, (time.perf_counter() - t) / nrep
+
+
+if __name__ == '__main__':
+    nproj, nz, ni = [int(v) for v in sys.argv[1:4]] if len(sys.argv) > 3 else [1500, 16, 2048]
+    data = gen_data(nproj, nz, ni)
+    ref, tref = bench(remove_all_stripe_ref, data)
+    res, tnew = bench(rs.remove_all_stripe, data)
+    print(f'data [nproj, nz, ni] = {data.shape}')
+    print(f'before: {tref/nz*1000:.2f} ms/sinogram')
+    print(f'after:  {tnew/nz*1000:.2f} ms/sinogram')
+    print(f'identical: {bool(cp.array_equal(ref, res))}')
@@ -0,0 +1,69 @@
+"""Detector stand-in writing projections of an existing DXchange file as they are acquired.
+
+    python simulate_stream.py data/test_data.h5 data_stream/test_data.h5 [--mode swmr|frames] [--fps 200]
+
+In the swmr mode a DXchange file is created with dark/flat fields and angles, then the
+projection dataset grows frame by frame. In the frames mode dark_<id>.tiff, flat_<id>.tiff,
+theta.npy and then proj_<id>.tiff are written to a directory, each frame is renamed from a
+temporary file so that the reader never sees a partial frame.
+"""
+
+import os
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import h5py
+import tifffile
+
+
+def simulate_swmr(fin, fname_out, fps):
+    data = fin['/exchange/data']
+    nproj, nz, ni = data.shape
+    Path(fname_out).parent.mkdir(parents=True, exist_ok=True)
+    with h5py.File(fname_out, 'w', libver='latest') as fout:
+        for name in ('/exchange/data_dark', '/exchange/data_white', '/exchange/theta'):
+            if name in fin:
+                fout.create_dataset(name, data=fin[name][:])
+        dset = fout.create_dataset('/exchange/data', shape=(0, nz, ni), maxshape=(nproj, nz, ni),
+                                   chunks=(1, nz, ni), dtype=data.dtype)
+        fout.swmr_mode = True
+        for k in range(nproj):
+            dset.resize(k+1, axis=0)
+            dset[k] = data[k]
+            dset.flush()
+            time.sleep(1/fps)
+
+
+def _write_frame(fname, frame):
+    tmp = f'{fname}.tmp'
+    tifffile.imwrite(tmp, frame)
+    os.replace(tmp, fname)
+
+
+def simulate_frames(fin, dir_out, fps):
+    Path(dir_out).mkdir(parents=True, exist_ok=True)
+    for name, prefix in (('/exchange/data_dark', 'dark'), ('/exchange/data_white', 'flat')):
+        for k, frame in enumerate(fin[name][:]):
+            _write_frame(f'{dir_out}/{prefix}_{k:05}.tiff', frame)
+    if '/exchange/theta' in fin:
+        np.save(f'{dir_out}/theta.npy', fin['/exchange/theta'][:])
+    data = fin['/exchange/data']
+    for k in range(data.shape[0]):
+        _write_frame(f'{dir_out}/proj_{k:05}.tiff', data[k])
+        time.sleep(1/fps)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('file_in')
+    parser.add_argument('out')
+    parser.add_argument('--mode', default='swmr', choices=['swmr', 'frames'])
+    parser.add_argument('--fps', type=float, default=200)
+    a = parser.parse_args()
+    with h5py.File(a.file_in, 'r') as fin:
+        if a.mode == 'swmr':
+            simulate_swmr(fin, a.out, a.fps)
+        else:
+            simulate_frames(fin, a.out, a.fps)
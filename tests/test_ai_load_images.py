@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+from PIL import Image
+
+from tomocupy.ai.inference import load_images
+
+# float32 rounding of the resize, 8-bit requantization may flip a level
+atol = 1e-4
+atol_8bits = 1/255+atol
+max_flipped = 0.01
+
+
+def load_images_pil(img_cache_original, downsample_factors, use_8bits):
+    """Previous load_images, slice by slice with PIL"""
+    imgs_cache = []
+    for downsample_factor in downsample_factors:
+        img_cache = []
+        for img_ in img_cache_original:
+            if downsample_factor > 1:
+                img_ = Image.fromarray(img_, mode='F')
+                img_array = np.array(img_.resize((img_.size[0]//downsample_factor, img_.size[1]//downsample_factor),
+                                                 Image.BILINEAR), dtype=np.float32)
+            else:
+                img_array = img_.copy().astype(np.float32)
+            img_array = ((img_array - img_array.min()) / (img_array.max() - img_array.min() + 1e-8))
+            if use_8bits:
+                img_array = (img_array * 255).astype(np.uint8)
+                img_array = img_array.astype(np.float32) / 255.
+            img_cache.append(img_array[None, ...])
+        imgs_cache.append(np.concatenate(img_cache, axis=0))
+    return imgs_cache
+
+
+class Tests(unittest.TestCase):
+
+    def test_pil(self):
+        """Batched antialiased bilinear resize on CPU matches PIL's Image.BILINEAR"""
+        rng = np.random.default_rng(0)
+        imgs = (rng.random([3, 100, 90], dtype='float32')*1000-200).astype('float32')
+        factors = [1, 2, 4]
+        for use_8bits in [False, True]:
+            refs = load_images_pil(imgs, factors, use_8bits)
+            ress = load_images(imgs, factors, use_8bits, device='cpu')
+            for factor, ref, res in zip(factors, refs, ress):
+                self.assertEqual(res.shape, ref.shape)
+                diff = np.abs(res-ref)
+                print(f'factor {factor}, 8 bits {use_8bits}: max difference {diff.max():.3e}, '
+                      f'differing {np.mean(diff > atol):.3e}')
+                if use_8bits:
+                    self.assertLessEqual(diff.max(), atol_8bits)
+                    self.assertLessEqual(np.mean(diff > atol), max_flipped)
+                else:
+                    self.assertLessEqual(diff.max(), atol)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import copy
+import unittest
+import numpy as np
+import torch
+
+from tomocupy.ai.model_archs import _make_dinov2_model, RangeClassificationModel, ClassificationModel
+
+
+def make_model(nums_windows):
+    torch.manual_seed(0)
+    model_ = _make_dinov2_model()
+    model = RangeClassificationModel(model_, embed_dim=model_.embed_dim, num_windows=nums_windows, num_frames=2,
+                                     multi_instances=True, multi_frames=True, aggregator_depth=2, aggregator_num_heads=12)
+    return model.eval()
+
+
+class Tests(unittest.TestCase):
+
+    def test_cached_tokens(self):
+        """Logits from per-slice cached backbone tokens match the two-frame forward"""
+        nums_windows, szs = [3, 2], [56, 28]
+        model = make_model(nums_windows)
+        rng = np.random.default_rng(0)
+        slices = [[torch.from_numpy(rng.random([1, k, 1, sz, sz], dtype='float32')) for k, sz in zip(nums_windows, szs)]
+                  for _ in range(3)]
+        with torch.no_grad():
+            tokens = [[model.patch_tokens(imgs)[0] for imgs in s] for s in slices]
+            for idx, idx2 in [(0, 1), (0, 2), (1, 2)]:
+                samples = [{'images': torch.stack((a, b), dim=2)} for a, b in zip(slices[idx], slices[idx2])]
+                ref = model(samples)
+                res = model.forward_tokens([torch.stack((t, t2), dim=1)[None]
+                                            for t, t2 in zip(tokens[idx], tokens[idx2])])
+                self.assertTrue(torch.allclose(ref, res, atol=1e-5))
+
+    def test_single_channel(self):
+        """Logits of models with the patch embedding folded to 1 channel match 3-channel models on CPU"""
+        rng = np.random.default_rng(0)
+        nums_windows, szs = [3, 2], [56, 28]
+        model = make_model(nums_windows)
+        samples = [{'images': torch.from_numpy(rng.random([2, k, 2, 1, sz, sz], dtype='float32'))}
+                   for k, sz in zip(nums_windows, szs)]
+        torch.manual_seed(0)
+        model_ = _make_dinov2_model()
+        cmodel = ClassificationModel(model_, embed_dim=model_.embed_dim, num_windows=[3], multi_instances=True).eval()
+        csamples = [{'images': torch.from_numpy(rng.random([2, 3, 1, 56, 56], dtype='float32'))}]
+        for m, s in [(model, samples), (cmodel, csamples)]:
+            m1 = copy.deepcopy(m)
+            m1.model.patch_embed.to_single_channel()
+            self.assertEqual(m1.model.patch_embed.proj.weight.shape[1], 1)
+            with torch.no_grad():
+                ref = m(s)
+                res = m1(s)
+            self.assertTrue(torch.allclose(ref, res, rtol=1e-5, atol=1e-6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+import numpy as np
+
+from tomocupy import utils
+
+
+def bin_ref(data, fz, fx):
+    n, nz, nx = data.shape
+    d = data[:, :nz//fz*fz, :nx//fx*fx].astype('float64')
+    return d.reshape(n, nz//fz, fz, nx//fx, fx).mean(axis=(2, 4))
+
+
+class Tests(unittest.TestCase):
+
+    def test_bin_int(self):
+        rng = np.random.default_rng(0)
+        data = rng.integers(0, 2**16, [5, 31, 47], dtype='uint16')
+        for fz, fx in [(1, 1), (2, 2), (3, 5), (4, 4), (8, 8)]:
+            res = utils.bin_int(data, fz, fx)
+            self.assertEqual(res.dtype, np.uint16)
+            self.assertTrue(np.all(np.abs(res-bin_ref(data, fz, fx)) <= 0.5))
+
+    def test_downsample_out(self):
+        data = np.full([3, 8, 8], 2**16-1, dtype='uint16')
+        out = np.zeros([4, 2, 2], dtype='uint16')
+        res = utils.downsample(data, 2, out=out[1:])
+        self.assertTrue(np.shares_memory(res, out))
+        self.assertTrue(np.all(out[1:] == 2**16-1) and np.all(out[0] == 0))
+        # float data are summed as before
+        res = utils.downsample(data.astype('float32'), 1)
+        self.assertTrue(np.all(res == 4*(2**16-1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+
+from tomocupy import utils
+from tomocupy.utils import CopyPool
+
+
+class Tests(unittest.TestCase):
+
+    def test_split_parts(self):
+        for shape, nparts in [((3, 10, 4), 6), ((100, 4), 16), ((2, 3, 5), 7), ((1, 1, 8), 3)]:
+            parts = utils._split_parts(shape, nparts)
+            count = np.zeros(shape, dtype='int32')
+            for idx in parts:
+                count[idx] += 1
+            # parts cover the array once, none is much larger than an equal split in bytes
+            self.assertTrue(np.all(count == 1))
+            self.assertGreater(len(parts), nparts//2)
+            self.assertLessEqual(max(count[idx].nbytes for idx in parts),
+                                 2*int(np.ceil(count.nbytes/nparts)))
+        # more parts than elements
+        self.assertEqual(utils._split_parts((2, 2), 16), [()])
+
+    def test_min_bytes(self):
+        pool = CopyPool(nthreads=4, min_bytes=1024)
+        u = np.random.random([4, 16, 8]).astype('float32')  # 2048 bytes, 2 parts
+        res = np.zeros([6, 16, 8], dtype='float32')
+        pool.copy(u[:1], res)
+        self.assertEqual(pool.stats()['threaded_calls'], 0)
+        pool.copy(u, res)
+        self.assertEqual(pool.stats()['threaded_calls'], 1)
+        self.assertTrue(np.array_equal(res[:4], u))
+        self.assertTrue(np.all(res[4:] == 0))
+        stats = pool.stats()
+        self.assertEqual(stats['calls'], 2)
+        self.assertEqual(stats['bytes'], u[:1].nbytes+u.nbytes)
+        self.assertGreater(stats['GB/s'], 0)
+        pool.reset_counters()
+        self.assertEqual(pool.stats()['calls'], 0)
+        self.assertEqual(pool.stats()['bytes'], 0)
+
+    def test_resize(self):
+        pool = CopyPool(nthreads=2, min_bytes=64)
+        u = np.arange(4096, dtype='float32').reshape(64, 64)
+        res = np.zeros_like(u)
+        pool.copy(u, res)
+        self.assertEqual(pool.pool._max_workers, 2)
+        pool.resize(8)
+        self.assertIsNone(pool.pool)
+        res[:] = 0
+        pool.copy(u, res)
+        self.assertEqual(pool.nthreads, 8)
+        self.assertEqual(pool.pool._max_workers, 8)
+        self.assertTrue(np.array_equal(res, u))
+        self.assertEqual(pool.stats()['threaded_calls'], 2)
+
+    def test_non_contiguous(self):
+        pool = CopyPool(nthreads=4, min_bytes=256)
+        a = np.random.random([8, 20, 30]).astype('float32')
+        for u in [a[:, ::2, 1:], a[::2, :, ::3], a.swapaxes(1, 2)]:
+            res = np.zeros([10, *u.shape[1:]], dtype='float32')
+            pool.copy(u, res)
+            self.assertTrue(np.array_equal(res[:u.shape[0]], u))
+            # threaded and single-thread transposes by small tiles
+            for nthreads in [4, 1]:
+                pool.resize(nthreads)
+                res = np.zeros([u.shape[1], u.shape[0], u.shape[2]], dtype='float32')
+                pool.transpose(u, res, tile_bytes=512)
+                self.assertTrue(np.array_equal(res, u.swapaxes(0, 1)))
+            pool.resize(4)
+        u = a[:, 1::3, ::2]
+        self.assertTrue(np.array_equal(utils.copyTransposed(u), u.swapaxes(0, 1)))
+        self.assertTrue(np.array_equal(utils.copy(u, np.zeros_like(u)), u))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import shutil
+import unittest
+import numpy as np
+import h5py
+import tifffile
+
+fname = 'data/test_double_fov.h5'
+prefix = f'tomocupy recon --file-name {fname} --reconstruction-type full --file-type double_fov --rotation-axis 220 --nsino-per-chunk 4'
+disks = [(60, 30, 40, 0.01), (-120, -50, 25, 0.02)]  # x,y wrt the rotation axis, radius, attenuation
+
+
+def gen_data(nproj=720, nz=8, ni=256, center=220):
+    """360 deg scan of disks with the rotation axis close to the detector border"""
+    theta = np.linspace(0, 360, nproj, endpoint=False).astype('float32')
+    th = theta[:, np.newaxis]/180*np.pi
+    s = np.arange(ni)-center
+    proj = np.zeros([nproj, ni], dtype='float32')
+    for x, y, r, mu in disks:
+        p = s-x*np.cos(th)-y*np.sin(th)
+        proj += mu*2*np.sqrt(np.maximum(0, r**2-p**2))
+    data = np.round(1000*np.exp(-proj)).astype('uint16')
+    with h5py.File(fname, 'w') as fid:
+        fid.create_dataset('/exchange/data', data=np.tile(data[:, np.newaxis], [1, nz, 1]))
+        fid.create_dataset('/exchange/data_white', data=np.full([4, nz, ni], 1000, dtype='uint16'))
+        fid.create_dataset('/exchange/data_dark', data=np.zeros([4, nz, ni], dtype='uint16'))
+        fid.create_dataset('/exchange/theta', data=theta)
+
+
+class Tests(unittest.TestCase):
+
+    def test_stitch(self):
+        gen_data()
+        recs = {}
+        for method in ['pad', 'stitch']:
+            shutil.rmtree('data_rec', ignore_errors=True)
+            print(f'TEST {prefix} --double-fov-method {method}')
+            st = os.system(f'{prefix} --double-fov-method {method}')
+            self.assertEqual(st, 0)
+            recs[method] = tifffile.imread('data_rec/test_double_fov_rec/recon_00004.tiff')
+        shutil.rmtree('data_rec', ignore_errors=True)
+        os.remove(fname)
+        rec, res = recs['pad'], recs['stitch']
+        self.assertEqual(res.shape, rec.shape)
+        # compare inside the field of view
+        n = rec.shape[-1]
+        x, y = np.meshgrid(np.arange(n)-n/2, np.arange(n)-n/2)
+        fov = x**2+y**2 < (0.8*n/2)**2
+        err = np.linalg.norm((res-rec)[fov])/np.linalg.norm(rec[fov])
+        print(f'relative difference {err:.3e}')
+        self.assertLess(err, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
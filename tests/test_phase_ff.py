@@ -0,0 +1,37 @@
+import unittest
+import cupy as cp
+
+from tomocupy.processing.retrieve_phase import PhaseRetrieval, make_fresnel_window
+
+
+class Tests(unittest.TestCase):
+
+    def test_ff_projections(self):
+        """dim=2 filters each projection [nz,n] of a chunk [nproj,nz,n]"""
+        nproj, nz, n, p, ratio = 5, 24, 40, 8, 100
+        data = cp.random.random([nproj, nz, n], dtype='float32')
+        window = cp.pad(make_fresnel_window(nz, n, ratio, 2), p, mode='edge')
+        filt = 1/cp.fft.ifftshift(window)
+        ref = cp.empty_like(data)
+        for k in range(nproj):
+            w = cp.fft.fft2(cp.pad(data[k], p, mode='edge'))
+            ref[k] = cp.fft.ifft2(w*filt).real[p:p+nz, p:p+n]
+        res = PhaseRetrieval('FourierFilter', ratio=ratio, dim=2, ff_pad=p, apply_log=False)(data.copy())
+        self.assertTrue(cp.allclose(res, ref, atol=1e-5))
+
+    def test_ff_sinograms(self):
+        """dim=1 filters each sinogram [nproj,n] of a chunk along the detector rows"""
+        nproj, nz, n, p, ratio = 30, 4, 40, 8, 100
+        data = cp.random.random([nproj, nz, n], dtype='float32')
+        window = cp.pad(make_fresnel_window(nproj, n, ratio, 1), ((0, 0), (p, p)), mode='edge')
+        filt = 1/cp.fft.ifftshift(window, axes=1)
+        ref = cp.empty_like(data)
+        for m in range(nz):
+            w = cp.fft.fft(cp.pad(data[:, m], ((0, 0), (p, p)), mode='edge'), axis=-1)
+            ref[:, m] = cp.fft.ifft(w*filt, axis=-1).real[:, p:p+n]
+        res = PhaseRetrieval('FourierFilter', ratio=ratio, dim=1, ff_pad=p, apply_log=False)(data.copy())
+        self.assertTrue(cp.allclose(res, ref, atol=1e-5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+import numpy as np
+
+from tomocupy.utils import PinnedArena
+
+
+class Tests(unittest.TestCase):
+
+    def test_reuse(self):
+        arena = PinnedArena(pinned=False)
+        a = arena.array('data', [2, 4, 8], 'float32', fill=0)
+        self.assertEqual(a.shape, (2, 4, 8))
+        self.assertTrue(np.all(a == 0))
+        # smaller request with another dtype reuses the slab
+        b = arena.array('data', [2, 4, 8], 'uint16')
+        self.assertTrue(np.shares_memory(a, b))
+        self.assertEqual(arena.stats()['allocations'], 1)
+        self.assertEqual(arena.stats()['reuses'], 1)
+
+    def test_grow_and_high_water(self):
+        arena = PinnedArena(pinned=False)
+        arena.array('data', [16], 'float32')
+        arena.array('rec', [8], 'float32')
+        self.assertEqual(arena.nbytes, 96)
+        a = arena.array('data', [32], 'float32', fill=1)
+        self.assertTrue(np.all(a == 1))
+        self.assertEqual(arena.nbytes, 160)
+        self.assertEqual(arena.high_water, 160)
+        arena.release('data')
+        self.assertEqual(arena.nbytes, 32)
+        arena.release()
+        self.assertEqual(arena.stats()['slabs'], 0)
+        self.assertEqual(arena.high_water, 160)
+
+
+if __name__ == '__main__':
+    unittest.main()
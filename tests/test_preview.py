@@ -0,0 +1,31 @@
+import os
+import shutil
+import unittest
+import numpy as np
+import tifffile
+import h5py
+
+with h5py.File('data/test_data.h5', 'r') as fid:
+    nz = fid['/exchange/data'].shape[1]
+id_slice = int(0.5*(nz-1))
+
+prefix = 'tomocupy recon --file-name data/test_data.h5 --rotation-axis 782.5 --nsino-per-chunk 4 --reconstruction-algorithm linerec'
+
+
+class Tests(unittest.TestCase):
+
+    def test_preview(self):
+        shutil.rmtree('data_rec', ignore_errors=True)
+        st = os.system(f'{prefix} --reconstruction-type full')
+        self.assertEqual(st, 0)
+        rec = tifffile.imread(f'data_rec/test_data_rec/recon_{id_slice:05}.tiff')
+
+        # after the last subset the accumulated preview is the full reconstruction
+        st = os.system(f'{prefix} --reconstruction-type preview --nsino 0.5 --preview-subsets 4 --nproj-per-chunk 32')
+        self.assertEqual(st, 0)
+        preview = tifffile.imread(f'data_rec/preview/test_data/recon_slice{id_slice:04d}.tiff')
+        self.assertTrue(np.allclose(preview, rec, atol=1e-3*np.abs(rec).max()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import h5py
+
+from tomocupy import utils
+
+
+class Tests(unittest.TestCase):
+
+    def test_id_ranges(self):
+        self.assertEqual(utils.id_ranges([]), [])
+        self.assertEqual(utils.id_ranges([3, 4, 5, 9, 10, 20]), [(0, 3, 6), (3, 9, 11), (5, 20, 21)])
+        self.assertEqual(utils.id_ranges(np.arange(0, 10, 3)), [(0, 0, 1), (1, 3, 4), (2, 6, 7), (3, 9, 10)])
+
+    def test_read_ids(self):
+        data = np.arange(40*6*8, dtype='uint16').reshape(40, 6, 8)
+        ids = np.r_[0:5, 7:20, 33:40]
+        rows = np.array([0, 2, 3])
+        fname = os.path.join(tempfile.mkdtemp(), 'data.h5')
+        with h5py.File(fname, 'w') as fid:
+            fid.create_dataset('/exchange/data', data=data, chunks=(1, 6, 8))
+        with h5py.File(fname, 'r') as fid:
+            dset = fid['/exchange/data']
+            res = utils.read_ids(dset, ids, (slice(1, 5), slice(2, 7)), 'float32')
+            self.assertEqual(res.dtype, np.float32)
+            self.assertTrue(np.array_equal(res, data[ids, 1:5, 2:7]))
+            res = utils.read_ids(dset, ids, (rows, slice(None)), 'uint16')
+            self.assertTrue(np.array_equal(res, data[ids][:, rows]))
+        os.remove(fname)
+
+    def test_read_ids_mmap(self):
+        data = np.arange(40*6*8, dtype='uint16').reshape(40, 6, 8)
+        ids = np.r_[3:9, 20:40]
+        fname = os.path.join(tempfile.mkdtemp(), 'data.h5')
+        with h5py.File(fname, 'w') as fid:
+            fid.create_dataset('/exchange/data', data=data)
+        with h5py.File(fname, 'r') as fid:
+            dset = fid['/exchange/data']
+            # contiguous layout, raw bytes are mapped as in Reader.dataset
+            mmap = np.memmap(fname, dtype=dset.dtype, mode='r', offset=dset.id.get_offset(), shape=dset.shape)
+            res = utils.read_ids(mmap, ids, (slice(1, 5), slice(2, 7)), 'float32')
+            self.assertTrue(np.array_equal(res, data[ids, 1:5, 2:7]))
+        del mmap
+        os.remove(fname)
+
+
+if __name__ == '__main__':
+    unittest.main()
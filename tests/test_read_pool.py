@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+import threading
+import numpy as np
+import h5py
+
+from tomocupy.dataio.read_pool import ReadPool
+
+
+class Tests(unittest.TestCase):
+
+    def test_read(self):
+        data = np.arange(50*6*8, dtype='uint16').reshape(50, 6, 8)
+        fname = os.path.join(tempfile.mkdtemp(), 'data.h5')
+        with h5py.File(fname, 'w') as fid:
+            fid.create_dataset('/exchange/data', data=data, chunks=(1, 6, 8), compression='gzip')
+        pool = ReadPool(3)
+        with h5py.File(fname, 'r') as fid:
+            dset = fid['/exchange/data']
+            ids = np.r_[0:5, 7:20, 33:50]
+            res = pool.read(dset, ids, (np.array([0, 2, 3]), slice(2, 7)), 'float32')
+            self.assertEqual(res.dtype, np.float32)
+            self.assertTrue(np.array_equal(res, data[ids][:, [0, 2, 3], 2:7]))
+            # a larger read replaces the slab of the thread
+            res = pool.read(dset, np.arange(50), (slice(None), slice(None)), 'uint16', copy=True)
+            self.assertTrue(np.array_equal(res, data))
+
+            # slabs of concurrent threads
+            ok = {}
+
+            def read(k):
+                res = pool.read(dset, np.arange(k, 50), (slice(1, 4), slice(None)), 'uint16', copy=True)
+                ok[k] = np.array_equal(res, data[k:, 1:4])
+            threads = [threading.Thread(target=read, args=(k,)) for k in range(6)]
+            for th in threads:
+                th.start()
+            for th in threads:
+                th.join()
+            self.assertTrue(all(ok.values()) and len(ok) == 6)
+        pool.close()
+        os.remove(fname)
+
+
+if __name__ == '__main__':
+    unittest.main()
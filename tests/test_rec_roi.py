@@ -0,0 +1,30 @@
+import os
+import shutil
+import unittest
+import numpy as np
+import tifffile
+
+prefix = 'tomocupy recon --file-name data/test_data.h5 --reconstruction-type full --rotation-axis 782.5 --nsino-per-chunk 4'
+roi = (100, 400, 50, 300)  # x0,x1,y0,y1
+
+
+class Tests(unittest.TestCase):
+
+    def test_rec_roi(self):
+        x0, x1, y0, y1 = roi
+        for alg in ['fourierrec', 'lprec', 'linerec']:
+            shutil.rmtree('data_rec', ignore_errors=True)
+            st = os.system(f'{prefix} --reconstruction-algorithm {alg}')
+            self.assertEqual(st, 0)
+            rec = tifffile.imread('data_rec/test_data_rec/recon_00010.tiff')
+            shutil.rmtree('data_rec', ignore_errors=True)
+            print(f'TEST {prefix} --reconstruction-algorithm {alg} --rec-roi {x0},{x1},{y0},{y1}')
+            st = os.system(f'{prefix} --reconstruction-algorithm {alg} --rec-roi {x0},{x1},{y0},{y1}')
+            self.assertEqual(st, 0)
+            res = tifffile.imread('data_rec/test_data_rec/recon_00010.tiff')
+            self.assertEqual(res.shape, (y1-y0, x1-x0))
+            self.assertTrue(np.allclose(res, rec[y0:y1, x0:x1], atol=1e-5*np.abs(rec).max()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import cupy as cp
+from tomocupy.processing import remove_stripe as rs
+
+sigma, wname, level = 1, 'sym16', 3
+
+
+def gen_data(nproj, nz, ni, seed):
+    cp.random.seed(seed)
+    data = cp.random.random([nproj, nz, ni], dtype='float32') + 1
+    data[:, :, cp.random.randint(0, ni, 8)] *= 1.2
+    return data
+
+
+class Tests(unittest.TestCase):
+
+    def test_remover(self):
+        """Buffers kept between chunks do not change the result"""
+        remover = rs.FourierWaveletStripeRemover(sigma, wname, level)
+        shapes = [(180, 4, 128)]*3 + [(180, 2, 96)]*2 + [(180, 4, 128)]
+        for seed, shape in enumerate(shapes):
+            data = gen_data(*shape, seed)
+            ref = rs.remove_stripe_fw(data, sigma, wname, level)
+            res = remover.apply(data)
+            print(f'chunk {seed} {shape}: max difference {float(cp.abs(res-ref).max()):.3e}')
+            self.assertEqual(res.shape, shape)
+            self.assertTrue(cp.array_equal(res, ref))
+
+    def test_result_not_shared(self):
+        """The result of a call is not overwritten by the next one"""
+        remover = rs.FourierWaveletStripeRemover(sigma, wname, level)
+        res0 = remover.apply(gen_data(180, 4, 128, 0))
+        ref0 = res0.copy()
+        remover.apply(gen_data(180, 4, 128, 1))
+        self.assertTrue(cp.array_equal(res0, ref0))
+
+
+if __name__ == '__main__':
+    unittest.main()
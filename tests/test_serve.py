@@ -0,0 +1,50 @@
+import tempfile
+import unittest
+from threading import Thread
+
+from tomocupy import config
+from tomocupy import serve
+from tomocupy.global_vars import args
+
+
+class Tests(unittest.TestCase):
+    """Directory queue of tomocupy serve with a stand-in job instead of the GPU reconstruction"""
+
+    def setUp(self):
+        args.__dict__.clear()
+        args.__dict__.update(vars(config.Params(sections=config.SERVE_PARAMS).get_defaults()))
+        args.rotation_axis = 700
+        self.queue_dir = tempfile.mkdtemp()
+
+    def run_server(self, njobs):
+        def run_job(cache):
+            if str(args.file_name) == 'missing.h5':
+                raise RuntimeError('no such file')
+            return {'file_name': str(args.file_name), 'rotation_axis': args.rotation_axis}
+
+        server = serve.Server(self.queue_dir, run_job, poll_interval=0.01)
+        th = Thread(target=server.serve, args=(njobs,))
+        th.start()
+        return th
+
+    def test_jobs(self):
+        names = [serve.submit(self.queue_dir, ['--file-name', 'a.h5', '--rotation-axis', '512']),
+                 serve.submit(self.queue_dir, ['--file-name', 'b.h5']),
+                 serve.submit(self.queue_dir, ['--file-name', 'missing.h5']),
+                 serve.submit(self.queue_dir, ['--nsino-per-chunk', 'wrong'])]
+        th = self.run_server(len(names))
+        res = [serve.wait(self.queue_dir, name, timeout=10) for name in names]
+        th.join()
+        self.assertEqual(res[0]['status'], 'done')
+        self.assertEqual(res[0]['rotation_axis'], 512)
+        # values not given in the job are taken from the server
+        self.assertEqual(res[1]['file_name'], 'b.h5')
+        self.assertEqual(res[1]['rotation_axis'], 700)
+        self.assertEqual(res[2]['status'], 'failed')
+        self.assertEqual(res[3]['status'], 'failed')
+        for r in res:
+            self.assertGreaterEqual(r['latency'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import shutil
+import unittest
+import numpy as np
+import tifffile
+import h5py
+
+with h5py.File('data/test_data.h5', 'r') as fid:
+    nz = fid['/exchange/data'].shape[1]
+
+prefix = 'tomocupy recon --file-name data/test_data.h5 --reconstruction-type full --rotation-axis 782.5 --nsino-per-chunk 4'
+slices_dict = {
+    f'--slices 1:{nz}:5': list(range(1, nz, 5)),
+    f'--slices [3,4,{nz-2}]': [3, 4, nz-2],
+}
+
+
+class Tests(unittest.TestCase):
+
+    def test_slices(self):
+        shutil.rmtree('data_rec', ignore_errors=True)
+        st = os.system(prefix)
+        self.assertEqual(st, 0)
+        rec = {k: tifffile.imread(f'data_rec/test_data_rec/recon_{k:05}.tiff') for k in range(nz)}
+        for opt, ids in slices_dict.items():
+            for save_format in ['tiff', 'h5']:
+                shutil.rmtree('data_rec', ignore_errors=True)
+                print(f'TEST {prefix} {opt} --save-format {save_format}')
+                st = os.system(f'{prefix} {opt} --save-format {save_format}')
+                self.assertEqual(st, 0)
+                if save_format == 'tiff':
+                    files = sorted(os.listdir('data_rec/test_data_rec'))
+                    self.assertEqual(len([f for f in files if f.endswith('.tiff')]), len(ids))
+                    res = [tifffile.imread(f'data_rec/test_data_rec/recon_{k:05}.tiff') for k in ids]
+                else:
+                    with h5py.File('data_rec/test_data_rec.h5', 'r') as fid:
+                        res = [fid['exchange/data'][k] for k in ids]
+                # slices are reconstructed at their true z positions
+                for k, r in zip(ids, res):
+                    self.assertTrue(np.allclose(r, rec[k], atol=1e-5*np.abs(rec[k]).max()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+import os
+import sys
+import time
+import subprocess
+
+# wall time budget for 'tomocupy status --help' [s]
+budget = 3.0
+heavy_modules = ['cupy', 'h5py', 'zarr', 'tifffile', 'cv2', 'torch']
+
+
+class Tests(unittest.TestCase):
+
+    def run_cmd(self, cmd):
+        env = dict(os.environ, CUDA_VISIBLE_DEVICES='')
+        return subprocess.run([sys.executable, *cmd], env=env, capture_output=True, text=True)
+
+    def test_status_help_time(self):
+        t = time.perf_counter()
+        res = self.run_cmd(['-m', 'tomocupy', 'status', '--help'])
+        t = time.perf_counter()-t
+        self.assertEqual(res.returncode, 0, res.stderr)
+        self.assertLess(t, budget)
+
+    def test_no_heavy_imports(self):
+        res = self.run_cmd(['-c', f'import sys, tomocupy.__main__; '
+                            f'print(*[m for m in {heavy_modules} if m in sys.modules])'])
+        self.assertEqual(res.returncode, 0, res.stderr)
+        self.assertEqual(res.stdout.strip(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import shutil
+import inspect
+import subprocess
+import unittest
+import numpy as np
+import tifffile
+import h5py
+
+with h5py.File('data/test_data.h5', 'r') as fid:
+    nproj = fid['/exchange/data'].shape[0]
+
+prefix = 'tomocupy recon --reconstruction-type full --rotation-axis 782.5 --nsino-per-chunk 4 --stream-timeout 30'
+cmd_dict = {
+    # the same result as for the recon from the closed file in test_full.py
+    ('swmr', f'{prefix} --file-name data_stream/test_data.h5 --stream-mode swmr'): 28.307,
+    ('frames', f'{prefix} --file-name data_stream/test_data --stream-mode frames --stream-nproj {nproj}'): 28.307,
+}
+out_dirs = {'swmr': 'data_stream_rec/test_data_rec', 'frames': 'data_stream/test_data_rec'}
+
+
+class Tests(unittest.TestCase):
+
+    def test_stream_recon(self):
+        for (mode, cmd), norm in cmd_dict.items():
+            shutil.rmtree('data_stream', ignore_errors=True)
+            shutil.rmtree('data_stream_rec', ignore_errors=True)
+            print(f'TEST {inspect.stack()[0][3]}: {cmd}')
+            out = 'data_stream/test_data.h5' if mode == 'swmr' else 'data_stream/test_data'
+            # the detector stand-in writes projections while the reconstruction is waiting for them
+            sim = subprocess.Popen(['python', 'simulate_stream.py', 'data/test_data.h5', out, '--mode', mode])
+            st = os.system(cmd)
+            sim.wait()
+            self.assertEqual(st, 0)
+            ssum = 0
+            for k in range(24):
+                try:
+                    ssum += np.linalg.norm(tifffile.imread(f'{out_dirs[mode]}/recon_{k:05}.tiff'))
+                except:
+                    pass
+            self.assertAlmostEqual(ssum, norm, places=0)
+
+
+if __name__ == '__main__':
+    unittest.main()